@@ -0,0 +1,49 @@
+"""Add keyset pagination indexes
+
+Revision ID: 5d2e8b7c41f0
+Revises: a3f1c9d27e54
+Create Date: 2026-10-18 14:05:12.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2e8b7c41f0'
+down_revision: Union[str, None] = 'a3f1c9d27e54'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('idx_municipio_nome_id', 'municipios', ['nome', 'id_municipio'], unique=False)
+    op.create_index('idx_municipio_populacao_id', 'municipios', ['populacao_total_estimada_2022', 'id_municipio'], unique=False)
+    op.create_index('idx_prestador_nome_id', 'prestadores_servico', ['nome', 'id'], unique=False)
+    op.create_index('idx_recursos_volume_produzido_id', 'recursos_hidricos_anuais', ['volume_agua_produzido', 'id'], unique=False)
+    op.create_index('idx_financeiro_receita_id', 'financeiro_anuais', ['receita_operacional_total', 'id'], unique=False)
+
+    # Os índices de indicadores ganham o id como desempate do seek
+    op.create_index('idx_municipio_ano_id', 'indicadores_desempenho_anuais', ['municipio_id', 'ano', 'id'], unique=False)
+    op.create_index('idx_prestador_ano_id', 'indicadores_desempenho_anuais', ['prestador_id', 'ano', 'id'], unique=False)
+    op.create_index('idx_ano_id', 'indicadores_desempenho_anuais', ['ano', 'id'], unique=False)
+    op.drop_index('idx_municipio_ano', table_name='indicadores_desempenho_anuais')
+    op.drop_index('idx_prestador_ano', table_name='indicadores_desempenho_anuais')
+    op.drop_index('idx_ano', table_name='indicadores_desempenho_anuais')
+
+
+def downgrade() -> None:
+    op.create_index('idx_ano', 'indicadores_desempenho_anuais', ['ano'], unique=False)
+    op.create_index('idx_prestador_ano', 'indicadores_desempenho_anuais', ['prestador_id', 'ano'], unique=False)
+    op.create_index('idx_municipio_ano', 'indicadores_desempenho_anuais', ['municipio_id', 'ano'], unique=False)
+    op.drop_index('idx_ano_id', table_name='indicadores_desempenho_anuais')
+    op.drop_index('idx_prestador_ano_id', table_name='indicadores_desempenho_anuais')
+    op.drop_index('idx_municipio_ano_id', table_name='indicadores_desempenho_anuais')
+
+    op.drop_index('idx_financeiro_receita_id', table_name='financeiro_anuais')
+    op.drop_index('idx_recursos_volume_produzido_id', table_name='recursos_hidricos_anuais')
+    op.drop_index('idx_prestador_nome_id', table_name='prestadores_servico')
+    op.drop_index('idx_municipio_populacao_id', table_name='municipios')
+    op.drop_index('idx_municipio_nome_id', table_name='municipios')
@@ -0,0 +1,46 @@
+"""Add ranking_snapshots table
+
+Revision ID: 62860a8afe46
+Revises: 712f2a9adea9
+Create Date: 2026-10-18 09:12:44.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '62860a8afe46'
+down_revision: Union[str, None] = '712f2a9adea9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('ranking_snapshots',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('ano', sa.Integer(), nullable=False),
+    sa.Column('indicador', sa.String(length=50), nullable=False),
+    sa.Column('municipio_id', sa.String(length=7), nullable=False),
+    sa.Column('valor', sa.Float(), nullable=True),
+    sa.Column('posicao', sa.Integer(), nullable=False),
+    sa.Column('posicao_inversa', sa.Integer(), nullable=False),
+    sa.Column('percentil', sa.Float(), nullable=True),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['municipio_id'], ['municipios.id_municipio'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_ranking_snapshots_id'), 'ranking_snapshots', ['id'], unique=False)
+    op.create_index('idx_snapshot_ano_indicador_posicao', 'ranking_snapshots', ['ano', 'indicador', 'posicao'], unique=False)
+    op.create_index('idx_snapshot_ano_indicador_posicao_inversa', 'ranking_snapshots', ['ano', 'indicador', 'posicao_inversa'], unique=False)
+    op.create_index('idx_snapshot_ano_indicador_municipio', 'ranking_snapshots', ['ano', 'indicador', 'municipio_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_snapshot_ano_indicador_municipio', table_name='ranking_snapshots')
+    op.drop_index('idx_snapshot_ano_indicador_posicao_inversa', table_name='ranking_snapshots')
+    op.drop_index('idx_snapshot_ano_indicador_posicao', table_name='ranking_snapshots')
+    op.drop_index(op.f('ix_ranking_snapshots_id'), table_name='ranking_snapshots')
+    op.drop_table('ranking_snapshots')
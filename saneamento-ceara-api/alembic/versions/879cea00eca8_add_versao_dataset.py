@@ -0,0 +1,31 @@
+"""Add versao_dataset table
+
+Revision ID: 879cea00eca8
+Revises: 62860a8afe46
+Create Date: 2026-10-18 10:41:07.552931
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '879cea00eca8'
+down_revision: Union[str, None] = '62860a8afe46'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    versao_dataset = op.create_table('versao_dataset',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('versao', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(versao_dataset, [{'id': 1, 'versao': 0}])
+
+
+def downgrade() -> None:
+    op.drop_table('versao_dataset')
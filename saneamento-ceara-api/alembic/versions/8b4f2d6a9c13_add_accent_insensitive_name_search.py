@@ -0,0 +1,71 @@
+"""Add accent-insensitive name search
+
+Revision ID: 8b4f2d6a9c13
+Revises: 5d2e8b7c41f0
+Create Date: 2026-10-18 16:42:37.904118
+
+"""
+import unicodedata
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b4f2d6a9c13'
+down_revision: Union[str, None] = '5d2e8b7c41f0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABELAS = {
+    'municipios': ('id_municipio', 100, 'idx_municipio_nome_trgm'),
+    'prestadores_servico': ('id', 255, 'idx_prestador_nome_trgm'),
+}
+
+
+def _normalizar(texto):
+    # Mesma regra de app.texto.normalizar, copiada para a migração não depender do app
+    if texto is None:
+        return None
+    decomposto = unicodedata.normalize('NFKD', texto.lower())
+    return ' '.join(''.join(c for c in decomposto if not unicodedata.combining(c)).split())
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+
+    # Coluna-sombra usada pela busca fora do PostgreSQL
+    for tabela, (chave, tamanho, _) in TABELAS.items():
+        op.add_column(tabela, sa.Column('nome_normalizado', sa.String(length=tamanho), nullable=True))
+        linhas = conn.execute(sa.text(f'SELECT {chave}, nome FROM {tabela}')).all()
+        if linhas:
+            conn.execute(
+                sa.text(f'UPDATE {tabela} SET nome_normalizado = :nome_normalizado WHERE {chave} = :chave'),
+                [{'chave': valor, 'nome_normalizado': _normalizar(nome)} for valor, nome in linhas]
+            )
+
+    if conn.dialect.name != 'postgresql':
+        return
+
+    # unaccent() é STABLE (depende do search_path); o wrapper fixa o dicionário
+    # e pode ser declarado IMMUTABLE para ser usado em índices de expressão
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute('CREATE EXTENSION IF NOT EXISTS unaccent')
+    op.execute("""
+        CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT AS
+        $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+    """)
+    for tabela, (_, _, indice) in TABELAS.items():
+        op.execute(f'CREATE INDEX {indice} ON {tabela} USING gin (f_unaccent(lower(nome)) gin_trgm_ops)')
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        for tabela, (_, _, indice) in TABELAS.items():
+            op.execute(f'DROP INDEX IF EXISTS {indice}')
+        op.execute('DROP FUNCTION IF EXISTS f_unaccent(text)')
+
+    for tabela in TABELAS:
+        op.drop_column(tabela, 'nome_normalizado')
@@ -0,0 +1,26 @@
+"""Add hash_conteudo to indicadores_desempenho_anuais
+
+Revision ID: a3f1c9d27e54
+Revises: 879cea00eca8
+Create Date: 2026-10-18 14:05:31.208417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3f1c9d27e54'
+down_revision: Union[str, None] = '879cea00eca8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('indicadores_desempenho_anuais', sa.Column('hash_conteudo', sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('indicadores_desempenho_anuais', 'hash_conteudo')
@@ -0,0 +1,357 @@
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from app import crud, models
+from app.cache import register_dimension_listener, register_invalidation_listener
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Backend das rotas de /analises: "sql" (consultas no banco) ou "memoria"
+ANALISES_ENGINE = os.getenv("ANALISES_ENGINE", "sql").strip().lower()
+
+# Colunas mantidas em memória, na mesma ordem das colunas dos blocos
+CAMPOS = tuple(crud.CAMPOS_DISTRIBUICAO)
+_INDICE_CAMPO = {campo: indice for indice, campo in enumerate(CAMPOS)}
+
+class _BlocoAno:
+    """Linhas de um ano ordenadas por município, com os valores em uma matriz contígua"""
+
+    __slots__ = ("municipio_ids", "valores")
+
+    def __init__(self, municipio_ids: np.ndarray, valores: np.ndarray):
+        self.municipio_ids = municipio_ids
+        self.valores = valores
+
+    def linhas_municipio(self, municipio_id: str) -> slice:
+        inicio = np.searchsorted(self.municipio_ids, municipio_id, side="left")
+        fim = np.searchsorted(self.municipio_ids, municipio_id, side="right")
+        return slice(int(inicio), int(fim))
+
+class AnalyticsEngine:
+    """
+    Mantém indicadores, recursos hídricos e financeiro em arrays NumPy por ano,
+    indexados por (ano, municipio_id), e responde às análises com operações
+    vetorizadas. Os métodos têm as mesmas assinaturas e retornos das funções
+    equivalentes em `crud`.
+
+    A carga é preguiçosa: escritas marcam o ano como sujo e apenas esse ano é
+    relido na próxima consulta; uma invalidação geral força a recarga completa.
+    Escritas de municípios/prestadores só fazem reler os nomes dos municípios.
+    """
+
+    def __init__(self):
+        self._blocos: Dict[int, _BlocoAno] = {}
+        self._municipios: Dict[str, dict] = {}
+        self._carregado = False
+        self._anos_sujos: Set[int] = set()
+        self._municipios_sujos = False
+        self._lock = threading.Lock()
+        self._lock_sujos = threading.Lock()
+
+    # Atualização
+
+    def marcar_sujo(self, ano: Optional[int] = None) -> None:
+        """Marca um ano (ou, com None, todo o dataset) para ser relido"""
+        with self._lock_sujos:
+            if ano is None:
+                self._carregado = False
+                self._anos_sujos.clear()
+            else:
+                self._anos_sujos.add(ano)
+
+    def marcar_municipios_sujos(self) -> None:
+        """Marca os nomes dos municípios para serem relidos"""
+        with self._lock_sujos:
+            self._municipios_sujos = True
+
+    def _atualizar(self, db: Session) -> Dict[int, _BlocoAno]:
+        with self._lock:
+            with self._lock_sujos:
+                carga_completa = not self._carregado
+                anos = set(self._anos_sujos)
+                municipios = self._municipios_sujos
+                self._anos_sujos.clear()
+                self._municipios_sujos = False
+                self._carregado = True
+            try:
+                if carga_completa:
+                    self._carregar(db, None)
+                elif anos:
+                    self._carregar(db, anos)
+                elif municipios:
+                    self._carregar_municipios(db)
+            except Exception:
+                # Mantém pendente o que não foi carregado
+                with self._lock_sujos:
+                    if carga_completa:
+                        self._carregado = False
+                    else:
+                        self._anos_sujos |= anos
+                        self._municipios_sujos |= municipios
+                raise
+            return self._blocos
+
+    def _carregar(self, db: Session, anos: Optional[Set[int]]) -> None:
+        start_time = time.time()
+        query = db.query(
+            models.IndicadoresDesempenhoAnual.ano,
+            models.IndicadoresDesempenhoAnual.municipio_id,
+            *(crud.CAMPOS_DISTRIBUICAO[campo] for campo in CAMPOS)
+        ).select_from(models.IndicadoresDesempenhoAnual)\
+            .outerjoin(models.RecursosHidricosAnual, models.RecursosHidricosAnual.indicador_id == models.IndicadoresDesempenhoAnual.id)\
+            .outerjoin(models.FinanceiroAnual, models.FinanceiroAnual.indicador_id == models.IndicadoresDesempenhoAnual.id)
+        if anos is not None:
+            query = query.filter(models.IndicadoresDesempenhoAnual.ano.in_(anos))
+        linhas = query.order_by(
+            models.IndicadoresDesempenhoAnual.ano,
+            models.IndicadoresDesempenhoAnual.municipio_id,
+            models.IndicadoresDesempenhoAnual.id
+        ).all()
+
+        anos_linhas = np.array([linha[0] for linha in linhas], dtype=np.int64)
+        municipio_ids = np.array([linha[1] for linha in linhas], dtype=object)
+        valores = np.array([linha[2:] for linha in linhas], dtype=np.float64).reshape(len(linhas), len(CAMPOS))
+
+        # Copy-on-write: leitores que já obtiveram o dicionário anterior não são afetados
+        blocos = {} if anos is None else {
+            ano: bloco for ano, bloco in self._blocos.items() if ano not in anos
+        }
+        limites = np.flatnonzero(np.diff(anos_linhas)) + 1
+        for inicio, fim in zip(np.r_[0, limites], np.r_[limites, len(linhas)]):
+            if fim > inicio:
+                blocos[int(anos_linhas[inicio])] = _BlocoAno(
+                    municipio_ids[inicio:fim],
+                    np.ascontiguousarray(valores[inicio:fim])
+                )
+
+        self._carregar_municipios(db)
+        self._blocos = blocos
+
+        descricao = "all years" if anos is None else f"years {sorted(anos)}"
+        logger.info(f"Analytics engine loaded {len(linhas)} rows for {descricao} in {time.time() - start_time:.3f}s")
+
+    def _carregar_municipios(self, db: Session) -> None:
+        self._municipios = {
+            municipio.id_municipio: {
+                "id_municipio": municipio.id_municipio,
+                "nome": municipio.nome,
+                "sigla_uf": municipio.sigla_uf
+            }
+            for municipio in db.query(
+                models.Municipio.id_municipio,
+                models.Municipio.nome,
+                models.Municipio.sigla_uf
+            )
+        }
+
+    # Consultas
+
+    def get_ultimo_ano_dados(self, db: Session) -> int:
+        blocos = self._atualizar(db)
+        return max(blocos) if blocos else 2022
+
+    def get_ranking_indicador(
+        self,
+        db: Session,
+        ano: int,
+        indicador: str,
+        ordem: str,
+        limit: int,
+        municipio_id: Optional[str],
+        empate: str = "row_number",
+        nulos: str = "excluir"
+    ) -> dict:
+        if indicador not in crud.INDICADORES_RANKING:
+            raise HTTPException(status_code=400, detail="Indicador inválido")
+        if empate not in ("rank", "dense_rank", "row_number"):
+            raise HTTPException(status_code=400, detail="Política de empate inválida")
+        if nulos not in ("excluir", "inicio", "fim"):
+            raise HTTPException(status_code=400, detail="Tratamento de nulos inválido")
+
+        blocos = self._atualizar(db)
+        result = {"ano": ano, "indicador": indicador, "ranking": [], "posicao_especifica": None}
+        bloco = blocos.get(ano)
+        if bloco is None:
+            return result
+
+        municipio_ids = bloco.municipio_ids
+        valores = bloco.valores[:, _INDICE_CAMPO[indicador]]
+        nulo = np.isnan(valores)
+        if nulos == "excluir":
+            municipio_ids = municipio_ids[~nulo]
+            valores = valores[~nulo]
+            nulo = nulo[~nulo]
+        total = int(valores.size)
+        if total == 0:
+            return result
+
+        # Chave crescente equivalente à ordenação pedida; nulos vão para o início
+        # ou o fim. A ordenação estável preserva o desempate por município.
+        chave = -valores if ordem == "desc" else valores.copy()
+        chave[nulo] = -np.inf if nulos == "inicio" else np.inf
+        ordenacao = np.argsort(chave, kind="stable")
+        chave_ordenada = chave[ordenacao]
+
+        novo_valor = np.r_[True, chave_ordenada[1:] != chave_ordenada[:-1]]
+        if empate == "row_number":
+            posicoes = np.arange(1, total + 1)
+        elif empate == "rank":
+            posicoes = np.maximum.accumulate(np.where(novo_valor, np.arange(1, total + 1), 0))
+        else:
+            posicoes = np.cumsum(novo_valor)
+
+        ranking = []
+        for i in range(min(limit, total)):
+            linha = ordenacao[i]
+            ranking.append({
+                "posicao": int(posicoes[i]),
+                "municipio": self._municipios.get(municipio_ids[linha], {"id_municipio": municipio_ids[linha]}),
+                "valor": crud._safe_float(valores[linha])
+            })
+        result["ranking"] = ranking
+
+        if municipio_id:
+            encontrados = np.flatnonzero(municipio_ids[ordenacao] == municipio_id)
+            if encontrados.size:
+                i = int(encontrados[0])
+                valor = valores[ordenacao[i]]
+                percentil = None
+                if not np.isnan(valor):
+                    # PERCENT_RANK() OVER (ORDER BY valor ASC), nulos por último
+                    menores = int(np.count_nonzero(valores[~nulo] < valor))
+                    percentil = menores / (total - 1) * 100 if total > 1 else 0.0
+                result["posicao_especifica"] = {
+                    "municipio_id": municipio_id,
+                    "posicao": int(posicoes[i]),
+                    "total": total,
+                    "valor": crud._safe_float(valor),
+                    "percentil": percentil
+                }
+        return result
+
+    def get_evolucao_indicadores(self, db: Session, municipio_id: str, indicadores: Optional[List[str]] = None) -> dict:
+        blocos = self._atualizar(db)
+        if municipio_id not in self._municipios:
+            raise HTTPException(status_code=404, detail="Município não encontrado")
+
+        if indicadores is None:
+            indicadores = ["indice_atendimento_agua", "indice_coleta_esgoto", "indice_tratamento_esgoto", "indice_perda_faturamento"]
+
+        evolucao_por_indicador = {indicador: [] for indicador in indicadores}
+        for ano in sorted(blocos):
+            bloco = blocos[ano]
+            for linha in bloco.valores[bloco.linhas_municipio(municipio_id)]:
+                for indicador in indicadores:
+                    if indicador in _INDICE_CAMPO:
+                        evolucao_por_indicador[indicador].append({
+                            "ano": ano,
+                            "valor": crud._safe_float(linha[_INDICE_CAMPO[indicador]])
+                        })
+        return evolucao_por_indicador
+
+    def get_evolucao_indicadores_lote(
+        self,
+        db: Session,
+        municipio_ids: Optional[List[str]] = None,
+        indicadores: Optional[List[str]] = None
+    ) -> dict:
+        if not indicadores:
+            indicadores = ["indice_atendimento_agua", "indice_coleta_esgoto", "indice_tratamento_esgoto", "indice_perda_faturamento"]
+        invalidos = [ind for ind in indicadores if ind not in crud.INDICADORES_EVOLUCAO]
+        if invalidos:
+            raise HTTPException(status_code=400, detail=f"Indicadores inválidos: {', '.join(invalidos)}")
+
+        blocos = self._atualizar(db)
+        colunas = [_INDICE_CAMPO[ind] for ind in indicadores]
+        filtro = None if municipio_ids is None else np.array(sorted(set(municipio_ids)), dtype=object)
+
+        municipios = {}
+        for ano in sorted(blocos):
+            bloco = blocos[ano]
+            selecionadas = np.arange(bloco.municipio_ids.size) if filtro is None \
+                else np.flatnonzero(np.isin(bloco.municipio_ids, filtro))
+            for linha in selecionadas:
+                municipio_id = bloco.municipio_ids[linha]
+                serie = municipios.get(municipio_id)
+                if serie is None:
+                    serie = municipios[municipio_id] = {"anos": [], "series": {ind: [] for ind in indicadores}}
+                serie["anos"].append(ano)
+                for ind, valor in zip(indicadores, bloco.valores[linha, colunas]):
+                    serie["series"][ind].append(crud._safe_float(valor))
+
+        return {"indicadores": indicadores, "municipios": dict(sorted(municipios.items()))}
+
+    def _medias(self, bloco: _BlocoAno, campos: List[str]) -> List[Optional[float]]:
+        valores = bloco.valores[:, [_INDICE_CAMPO[campo] for campo in campos]]
+        contagens = np.count_nonzero(~np.isnan(valores), axis=0)
+        somas = np.nansum(valores, axis=0)
+        return [float(s / c) if c else None for s, c in zip(somas, contagens)]
+
+    def get_indicadores_principais(self, db: Session, ano: Optional[int] = None) -> dict:
+        if ano is None:
+            ano = self.get_ultimo_ano_dados(db)
+        blocos = self._atualizar(db)
+        bloco = blocos.get(ano)
+        medias = self._medias(bloco, list(crud.INDICADORES_RANKING)) if bloco is not None else [None] * 4
+        return {
+            "media_atendimento_agua": medias[0],
+            "media_coleta_esgoto": medias[1],
+            "media_tratamento_esgoto": medias[2],
+            "media_perda_faturamento": medias[3]
+        }
+
+    def get_evolucao_temporal(self, db: Session) -> dict:
+        blocos = self._atualizar(db)
+        anos = sorted(blocos)
+        medias = [
+            self._medias(blocos[ano], ["indice_atendimento_agua", "indice_coleta_esgoto", "indice_tratamento_esgoto"])
+            for ano in anos
+        ]
+        return {
+            "anos": anos,
+            "atendimento_agua": [m[0] for m in medias],
+            "coleta_esgoto": [m[1] for m in medias],
+            "tratamento_esgoto": [m[2] for m in medias]
+        }
+
+    def get_distribuicao_indicadores(
+        self,
+        db: Session,
+        anos: List[int],
+        campos: Optional[List[str]] = None,
+        bins: int = 10
+    ) -> dict:
+        if not campos:
+            campos = list(CAMPOS)
+        invalidos = [campo for campo in campos if campo not in _INDICE_CAMPO]
+        if invalidos:
+            raise HTTPException(status_code=400, detail=f"Campos inválidos: {', '.join(invalidos)}")
+
+        blocos = self._atualizar(db)
+        vazio = np.empty((0, len(CAMPOS)))
+        distribuicoes = []
+        for ano in sorted(set(anos)):
+            bloco = blocos.get(ano)
+            valores_ano = bloco.valores if bloco is not None else vazio
+            for campo in campos:
+                distribuicoes.append({
+                    "ano": ano,
+                    "campo": campo,
+                    **crud._estatisticas_distribuicao(valores_ano[:, _INDICE_CAMPO[campo]], bins)
+                })
+        return {"anos": sorted(set(anos)), "distribuicoes": distribuicoes}
+
+analytics_engine = AnalyticsEngine()
+register_invalidation_listener(analytics_engine.marcar_sujo)
+register_dimension_listener(analytics_engine.marcar_municipios_sujos)
+
+def get_analises_backend():
+    """Objeto que atende às análises, conforme ANALISES_ENGINE"""
+    return analytics_engine if ANALISES_ENGINE == "memoria" else crud
@@ -0,0 +1,120 @@
+import threading
+from bisect import bisect_left
+from heapq import nsmallest
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app import models
+from app.cache import register_invalidation_listener
+from app.logging_config import get_logger
+from app.texto import normalizar
+
+logger = get_logger(__name__)
+
+# Maior code point possível: `prefixo + FIM` é maior que qualquer chave que
+# comece com `prefixo`
+FIM = "\U0010ffff"
+
+class IndiceAutocomplete:
+    """
+    Índice de prefixos dos nomes de municípios, mantido em memória por
+    processo/worker. Cada início de palavra do nome normalizado (sem acentos,
+    minúsculas) vira uma chave em um array ordenado ("sao goncalo do amarante",
+    "goncalo do amarante", "do amarante", "amarante"); a busca é um par de
+    `bisect` sobre esse array e os resultados são ordenados por população.
+
+    A carga é feita na inicialização (ou na primeira busca). Escritas de
+    municípios feitas por este processo atualizam o índice sem consultar o
+    banco; uma invalidação geral do dataset (escrita feita por outro processo)
+    força a releitura na próxima busca.
+    """
+
+    def __init__(self):
+        self._municipios: Dict[str, dict] = {}
+        # Chaves ordenadas e, na mesma posição, o município correspondente
+        self._indice: Tuple[List[str], List[dict]] = ([], [])
+        self._carregado = False
+        self._lock = threading.Lock()
+
+    # Atualização
+
+    def marcar_sujo(self, ano: Optional[int] = None) -> None:
+        """Invalidação geral (ano None) força a releitura; escritas por ano não afetam nomes"""
+        if ano is None:
+            self._carregado = False
+
+    def carregar(self, db: Session) -> None:
+        linhas = db.query(
+            models.Municipio.id_municipio,
+            models.Municipio.nome,
+            models.Municipio.populacao_total_estimada_2022
+        ).all()
+        with self._lock:
+            self._municipios = {
+                id_municipio: self._entrada(id_municipio, nome, populacao)
+                for id_municipio, nome, populacao in linhas
+            }
+            self._reconstruir()
+            self._carregado = True
+        logger.info(f"Autocomplete index loaded with {len(linhas)} municipalities")
+
+    def atualizar(self, municipio: models.Municipio) -> None:
+        """Inclui ou atualiza um município (chamado depois do commit)"""
+        with self._lock:
+            if not self._carregado:
+                return
+            self._municipios[municipio.id_municipio] = self._entrada(
+                municipio.id_municipio, municipio.nome, municipio.populacao_total_estimada_2022
+            )
+            self._reconstruir()
+
+    def remover(self, id_municipio: str) -> None:
+        with self._lock:
+            if not self._carregado:
+                return
+            if self._municipios.pop(id_municipio, None) is not None:
+                self._reconstruir()
+
+    @staticmethod
+    def _entrada(id_municipio: str, nome: str, populacao: Optional[int]) -> dict:
+        return {
+            "id_municipio": id_municipio,
+            "nome": nome,
+            "populacao_total_estimada_2022": populacao
+        }
+
+    def _reconstruir(self) -> None:
+        # Deve ser chamado com o lock adquirido. O novo índice é montado à parte
+        # e trocado de uma vez, então buscas concorrentes não precisam do lock
+        pares = []
+        for id_municipio, municipio in self._municipios.items():
+            palavras = (normalizar(municipio["nome"]) or "").split()
+            for inicio in range(len(palavras)):
+                pares.append((" ".join(palavras[inicio:]), id_municipio, municipio))
+        pares.sort(key=lambda par: par[:2])
+        self._indice = ([par[0] for par in pares], [par[2] for par in pares])
+
+    # Busca
+
+    def buscar(self, db: Session, termo: str, limite: int = 10) -> List[dict]:
+        """Municípios com alguma palavra do nome começando por `termo`, os mais populosos primeiro"""
+        if not self._carregado:
+            self.carregar(db)
+
+        prefixo = normalizar(termo)
+        if not prefixo:
+            return []
+        chaves, municipios = self._indice
+        inicio = bisect_left(chaves, prefixo)
+        fim = bisect_left(chaves, prefixo + FIM, lo=inicio)
+        # Um município aparece uma vez por palavra que casa com o prefixo
+        encontrados = {municipio["id_municipio"]: municipio for municipio in municipios[inicio:fim]}
+        return nsmallest(
+            limite,
+            encontrados.values(),
+            key=lambda m: (-(m["populacao_total_estimada_2022"] or 0), m["nome"])
+        )
+
+indice_municipios = IndiceAutocomplete()
+register_invalidation_listener(indice_municipios.marcar_sujo)
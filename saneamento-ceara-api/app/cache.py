@@ -0,0 +1,169 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+class ResponseCache:
+    """
+    Cache LRU com TTL para respostas já serializadas (bytes), com invalidação
+    por tags (ex: "ano:2022", "municipio:2304400").
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._itens: "OrderedDict[str, tuple[float, bytes, Set[str]]]" = OrderedDict()
+        self._chaves_por_tag: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expiracoes = 0
+        self.invalidacoes = 0
+
+    @staticmethod
+    def make_key(endpoint: str, **params) -> str:
+        """Gera a chave a partir do endpoint e dos parâmetros normalizados"""
+        normalizados = {}
+        for nome, valor in params.items():
+            if isinstance(valor, str):
+                valor = valor.strip()
+            elif isinstance(valor, (list, tuple, set)):
+                valor = sorted({str(v).strip() for v in valor})
+            normalizados[nome] = valor
+        return f"{endpoint}?{json.dumps(normalizados, sort_keys=True, default=str)}"
+
+    def get(self, chave: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                self.misses += 1
+                return None
+            expira_em, conteudo, _ = item
+            if expira_em < time.monotonic():
+                self._remover(chave)
+                self.expiracoes += 1
+                self.misses += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.hits += 1
+            return conteudo
+
+    def set(self, chave: str, conteudo: bytes, tags: Iterable[str] = ()) -> None:
+        with self._lock:
+            if chave in self._itens:
+                self._remover(chave)
+            tags = set(tags)
+            self._itens[chave] = (time.monotonic() + self.ttl, conteudo, tags)
+            for tag in tags:
+                self._chaves_por_tag.setdefault(tag, set()).add(chave)
+            while len(self._itens) > self.maxsize:
+                chave_antiga = next(iter(self._itens))
+                self._remover(chave_antiga)
+                self.evictions += 1
+
+    def invalidate(self, *tags: str) -> int:
+        """Remove todas as entradas marcadas com qualquer uma das tags"""
+        with self._lock:
+            chaves = set()
+            for tag in tags:
+                chaves |= self._chaves_por_tag.get(tag, set())
+            for chave in chaves:
+                self._remover(chave)
+            self.invalidacoes += len(chaves)
+        if chaves:
+            logger.info(f"Cache invalidated {len(chaves)} entries for tags {sorted(tags)}")
+        return len(chaves)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._itens.clear()
+            self._chaves_por_tag.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entradas": len(self._itens),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else None,
+                "evictions": self.evictions,
+                "expiracoes": self.expiracoes,
+                "invalidacoes": self.invalidacoes,
+                "bytes": sum(len(item[1]) for item in self._itens.values())
+            }
+
+    def _remover(self, chave: str) -> None:
+        # Deve ser chamado com o lock adquirido
+        _, _, tags = self._itens.pop(chave)
+        for tag in tags:
+            chaves = self._chaves_por_tag.get(tag)
+            if chaves is not None:
+                chaves.discard(chave)
+                if not chaves:
+                    del self._chaves_por_tag[tag]
+
+# Funções chamadas a cada escrita com o ano afetado, ou None quando todo o
+# dataset deve ser considerado desatualizado (ex: carga feita por outro processo)
+_ouvintes_invalidacao: List[Callable[[Optional[int]], None]] = []
+
+def register_invalidation_listener(ouvinte: Callable[[Optional[int]], None]) -> None:
+    _ouvintes_invalidacao.append(ouvinte)
+
+# Funções chamadas quando municípios ou prestadores são alterados por este processo
+_ouvintes_dimensoes: List[Callable[[], None]] = []
+
+def register_dimension_listener(ouvinte: Callable[[], None]) -> None:
+    _ouvintes_dimensoes.append(ouvinte)
+
+def _notificar_ouvintes(ano: Optional[int]) -> None:
+    for ouvinte in _ouvintes_invalidacao:
+        try:
+            ouvinte(ano)
+        except Exception as e:
+            logger.error(f"Invalidation listener failed: {e}")
+
+def invalidate_indicadores(ano: int, municipio_id: str, muda_ultimo_ano: bool = False) -> int:
+    """
+    Invalida as respostas de análise afetadas por uma escrita em indicadores.
+    Inserções e remoções podem alterar o ano mais recente (`muda_ultimo_ano`).
+    """
+    tags = [f"ano:{ano}", f"municipio:{municipio_id}", "todos"]
+    if muda_ultimo_ano:
+        tags.append("ultimo_ano")
+    _notificar_ouvintes(ano)
+    return response_cache.invalidate(*tags)
+
+def invalidate_dimensoes() -> None:
+    """
+    Municípios ou prestadores foram alterados por este processo. Os nomes
+    aparecem nas respostas de análise de qualquer ano, então o cache de
+    respostas inteiro é descartado.
+    """
+    response_cache.clear()
+    logger.info("Response cache cleared after a municipio/prestador write")
+    for ouvinte in _ouvintes_dimensoes:
+        try:
+            ouvinte()
+        except Exception as e:
+            logger.error(f"Dimension listener failed: {e}")
+
+def invalidate_dataset() -> None:
+    """Descarta tudo o que foi derivado do dataset neste processo"""
+    response_cache.clear()
+    _notificar_ouvintes(None)
+
+# Cache compartilhado pelos endpoints de /analises (um por processo/worker)
+response_cache = ResponseCache(
+    maxsize=int(os.getenv("ANALISES_CACHE_MAXSIZE", "256")),
+    ttl=float(os.getenv("ANALISES_CACHE_TTL", "300"))
+)
@@ -0,0 +1,86 @@
+"""
+Conjuntos esparsos de campos (`?fields=ano,indice_coleta_esgoto`).
+
+Os campos pedidos limitam tanto o SELECT (`load_only` nas colunas e JOIN apenas
+com os relacionamentos pedidos) quanto a resposta, serializada por um modelo
+Pydantic derivado do schema original com só esses campos. Os objetos ORM
+parcialmente carregados nunca são lidos em atributos fora da seleção, então
+não há carga preguiçosa por linha.
+"""
+
+from functools import lru_cache
+from typing import List, Optional, Tuple, Type
+
+from fastapi import HTTPException, Response
+from pydantic import BaseModel, ConfigDict, TypeAdapter, create_model
+from sqlalchemy import inspect
+from sqlalchemy.orm import joinedload, load_only
+
+from app import paginacao, schemas
+
+def resolver_campos(schema: Type[BaseModel], fields: Optional[str]) -> Optional[List[str]]:
+    """
+    Campos pedidos em `fields` (separados por vírgula), na ordem do schema.
+    None quando o parâmetro não foi informado (resposta completa).
+    """
+    if fields is None:
+        return None
+    pedidos = {campo.strip() for campo in fields.split(",") if campo.strip()}
+    if not pedidos:
+        raise HTTPException(status_code=400, detail="Informe ao menos um campo em fields")
+    invalidos = sorted(pedidos - set(schema.model_fields))
+    if invalidos:
+        raise HTTPException(status_code=400, detail=f"Campos inválidos: {', '.join(invalidos)}")
+    return [campo for campo in schema.model_fields if campo in pedidos]
+
+def carregamento_parcial(model, campos: List[str], ordenacao: Optional[paginacao.Ordenacao] = None) -> list:
+    """
+    Opções de carga que leem apenas as colunas de `campos` (além da chave
+    primária e da coluna de ordenação, usada no cursor) e fazem JOIN só com os
+    relacionamentos pedidos.
+    """
+    mapper = inspect(model)
+    colunas = [getattr(model, campo) for campo in campos if campo in mapper.column_attrs]
+    if ordenacao is not None and not ordenacao.calculada:
+        colunas.append(ordenacao.coluna)
+    if not colunas:
+        # load_only espera atributos do modelo, não as Column da tabela
+        colunas = [getattr(model, mapper.get_property_by_column(coluna).key) for coluna in mapper.primary_key]
+    opcoes = [load_only(*colunas)]
+    opcoes += [joinedload(getattr(model, campo)) for campo in campos if campo in mapper.relationships]
+    return opcoes
+
+@lru_cache(maxsize=256)
+def _modelo_parcial(schema: Type[BaseModel], campos: Tuple[str, ...]) -> Type[BaseModel]:
+    definicoes = {campo: (schema.model_fields[campo].annotation, schema.model_fields[campo]) for campo in campos}
+    return create_model(
+        f"{schema.__name__}Parcial",
+        __config__=ConfigDict(from_attributes=True),
+        **definicoes
+    )
+
+@lru_cache(maxsize=256)
+def _adaptador(schema: Type[BaseModel], campos: Tuple[str, ...], forma: str) -> TypeAdapter:
+    modelo = _modelo_parcial(schema, campos)
+    if forma == "lista":
+        return TypeAdapter(List[modelo])
+    if forma == "pagina":
+        return TypeAdapter(schemas.Pagina[modelo])
+    return TypeAdapter(modelo)
+
+def resposta_parcial(schema: Type[BaseModel], campos: List[str], conteudo, envelope: bool = False) -> Response:
+    """
+    Serializa `conteudo` (objeto, lista ou ResultadoPaginado) só com `campos`.
+    O cabeçalho do cursor é copiado, pois a resposta é montada aqui.
+    """
+    if isinstance(conteudo, list):
+        forma = "pagina" if envelope else "lista"
+    else:
+        forma = "objeto"
+    adaptador = _adaptador(schema, tuple(campos), forma)
+    dados = paginacao.pagina(conteudo) if forma == "pagina" else conteudo
+    valor = adaptador.validate_python(dados, from_attributes=True)
+    response = Response(content=adaptador.dump_json(valor), media_type="application/json")
+    if isinstance(conteudo, paginacao.ResultadoPaginado):
+        paginacao.definir_cabecalho(response, conteudo)
+    return response
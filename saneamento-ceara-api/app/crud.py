@@ -1,12 +1,19 @@
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func, desc, asc
+from sqlalchemy import func, desc, asc, select, insert, literal
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import postgresql, sqlite
 from typing import List, Optional
 from fastapi import HTTPException
-from app import models, schemas
+from app import models, paginacao, schemas
+from app.autocomplete import indice_municipios
+from app.campos import carregamento_parcial
+from app.texto import busca_por_nome
 from app.logging_config import get_logger, log_database_operation
+from app.cache import invalidate_dimensoes, invalidate_indicadores
+from app.versioning import bump_dataset_version, publish_dataset_version
 import math
 import time
+import numpy as np
 
 logger = get_logger(__name__)
 
@@ -17,11 +24,35 @@ def _log_db_operation(operation: str, table: str, start_time: float, success: bo
     if error:
         logger.error(f"DB {operation} on {table} failed: {error}")
 
+def _invalidate_por_indicador(db: Session, indicador_id: int):
+    """Invalida o cache de análises para o ano/município de um indicador"""
+    _invalidate_por_indicadores(db, [indicador_id])
+
+def _invalidate_por_indicadores(db: Session, indicador_ids: List[int]):
+    """Invalida o cache de análises para os anos/municípios de vários indicadores"""
+    if not indicador_ids:
+        return
+    pares = db.query(
+        models.IndicadoresDesempenhoAnual.ano,
+        models.IndicadoresDesempenhoAnual.municipio_id
+    ).filter(models.IndicadoresDesempenhoAnual.id.in_(indicador_ids)).distinct().all()
+    for ano, municipio_id in pares:
+        invalidate_indicadores(ano, municipio_id)
+
+def _commit_write(db: Session):
+    """Confirma uma escrita incrementando a versão do dataset na mesma transação"""
+    versao = bump_dataset_version(db)
+    db.commit()
+    publish_dataset_version(versao)
+
 # Funções para Municípios
-def get_municipio(db: Session, id_municipio: str) -> Optional[models.Municipio]:
+def get_municipio(db: Session, id_municipio: str, campos: Optional[List[str]] = None) -> Optional[models.Municipio]:
     start_time = time.time()
     try:
-        result = db.query(models.Municipio).filter(models.Municipio.id_municipio == id_municipio).first()
+        query = db.query(models.Municipio)
+        if campos:
+            query = query.options(*carregamento_parcial(models.Municipio, campos))
+        result = query.filter(models.Municipio.id_municipio == id_municipio).first()
         _log_db_operation("SELECT", "municipios", start_time, success=True)
         return result
     except Exception as e:
@@ -36,33 +67,33 @@ def get_municipios(
     populacao_min: Optional[int] = None,
     populacao_max: Optional[int] = None,
     order_by: Optional[str] = None,
-    order_direction: str = "asc"
+    order_direction: str = "asc",
+    cursor: Optional[str] = None,
+    contar: bool = False,
+    campos: Optional[List[str]] = None
 ) -> List[models.Municipio]:
     start_time = time.time()
     try:
         query = db.query(models.Municipio)
         
+        relevancia = None
         if nome:
-            query = query.filter(models.Municipio.nome.ilike(f"%{nome}%"))
+            filtro, relevancia = busca_por_nome(
+                db.get_bind().dialect.name, models.Municipio.nome, models.Municipio.nome_normalizado, nome
+            )
+            query = query.filter(filtro)
         if populacao_min is not None:
             query = query.filter(models.Municipio.populacao_total_estimada_2022 >= populacao_min)
         if populacao_max is not None:
             query = query.filter(models.Municipio.populacao_total_estimada_2022 <= populacao_max)
 
-        # Ordenação
-        if order_by:
-            if hasattr(models.Municipio, order_by):
-                if order_direction == "desc":
-                    query = query.order_by(desc(getattr(models.Municipio, order_by)))
-                else:
-                    query = query.order_by(asc(getattr(models.Municipio, order_by)))
-            else:
-                # Ordenação padrão se o campo não existir
-                query = query.order_by(models.Municipio.nome)
-        else:
-            query = query.order_by(models.Municipio.nome)
-
-        result = query.offset(skip).limit(limit).all()
+        ordenacao = paginacao.resolver_ordenacao(
+            models.Municipio, order_by, order_direction, padrao="nome", padrao_descendente=False,
+            relevancia=relevancia
+        )
+        if campos:
+            query = query.options(*carregamento_parcial(models.Municipio, campos, ordenacao))
+        result = paginacao.paginar(query, ordenacao, skip, limit, cursor, contar)
         _log_db_operation("SELECT", "municipios", start_time, success=True)
         logger.info(f"Retrieved {len(result)} municipalities (skip={skip}, limit={limit})")
         return result
@@ -75,8 +106,10 @@ def create_municipio(db: Session, municipio: schemas.MunicipioCreate) -> models.
     try:
         db_municipio = models.Municipio(**municipio.dict())
         db.add(db_municipio)
-        db.commit()
+        _commit_write(db)
+        invalidate_dimensoes()
         db.refresh(db_municipio)
+        indice_municipios.atualizar(db_municipio)
         _log_db_operation("INSERT", "municipios", start_time, success=True)
         logger.info(f"Created municipality: {db_municipio.nome} ({db_municipio.id_municipio})")
         return db_municipio
@@ -94,8 +127,10 @@ def update_municipio(db: Session, id_municipio: str, municipio: schemas.Municipi
             for field, value in update_data.items():
                 setattr(db_municipio, field, value)
             db.add(db_municipio)
-            db.commit()
+            _commit_write(db)
+            invalidate_dimensoes()
             db.refresh(db_municipio)
+            indice_municipios.atualizar(db_municipio)
             _log_db_operation("UPDATE", "municipios", start_time, success=True)
             logger.info(f"Updated municipality: {db_municipio.nome} ({id_municipio})")
         return db_municipio
@@ -110,7 +145,9 @@ def delete_municipio(db: Session, id_municipio: str) -> bool:
         db_municipio = db.query(models.Municipio).filter(models.Municipio.id_municipio == id_municipio).first()
         if db_municipio:
             db.delete(db_municipio)
-            db.commit()
+            _commit_write(db)
+            invalidate_dimensoes()
+            indice_municipios.remover(id_municipio)
             _log_db_operation("DELETE", "municipios", start_time, success=True)
             logger.info(f"Deleted municipality: {db_municipio.nome} ({id_municipio})")
             return True
@@ -121,10 +158,13 @@ def delete_municipio(db: Session, id_municipio: str) -> bool:
         raise
 
 # Funções para Prestadores de Serviço
-def get_prestador(db: Session, prestador_id: int) -> Optional[models.PrestadorServico]:
+def get_prestador(db: Session, prestador_id: int, campos: Optional[List[str]] = None) -> Optional[models.PrestadorServico]:
     start_time = time.time()
     try:
-        result = db.query(models.PrestadorServico).filter(models.PrestadorServico.id == prestador_id).first()
+        query = db.query(models.PrestadorServico)
+        if campos:
+            query = query.options(*carregamento_parcial(models.PrestadorServico, campos))
+        result = query.filter(models.PrestadorServico.id == prestador_id).first()
         _log_db_operation("SELECT", "prestadores_servico", start_time, success=True)
         return result
     except Exception as e:
@@ -149,32 +189,33 @@ def get_prestadores(
     sigla: Optional[str] = None,
     natureza_juridica: Optional[str] = None,
     order_by: Optional[str] = None,
-    order_direction: str = "asc"
+    order_direction: str = "asc",
+    cursor: Optional[str] = None,
+    contar: bool = False,
+    campos: Optional[List[str]] = None
 ) -> List[models.PrestadorServico]:
     start_time = time.time()
     try:
         query = db.query(models.PrestadorServico)
         
+        relevancia = None
         if nome:
-            query = query.filter(models.PrestadorServico.nome.ilike(f"%{nome}%"))
+            filtro, relevancia = busca_por_nome(
+                db.get_bind().dialect.name, models.PrestadorServico.nome, models.PrestadorServico.nome_normalizado, nome
+            )
+            query = query.filter(filtro)
         if sigla:
             query = query.filter(models.PrestadorServico.sigla.ilike(f"%{sigla}%"))
         if natureza_juridica:
             query = query.filter(models.PrestadorServico.natureza_juridica.ilike(f"%{natureza_juridica}%"))
 
-        # Ordenação
-        if order_by:
-            if hasattr(models.PrestadorServico, order_by):
-                if order_direction == "desc":
-                    query = query.order_by(desc(getattr(models.PrestadorServico, order_by)))
-                else:
-                    query = query.order_by(asc(getattr(models.PrestadorServico, order_by)))
-            else:
-                query = query.order_by(models.PrestadorServico.nome)
-        else:
-            query = query.order_by(models.PrestadorServico.nome)
-
-        result = query.offset(skip).limit(limit).all()
+        ordenacao = paginacao.resolver_ordenacao(
+            models.PrestadorServico, order_by, order_direction, padrao="nome", padrao_descendente=False,
+            relevancia=relevancia
+        )
+        if campos:
+            query = query.options(*carregamento_parcial(models.PrestadorServico, campos, ordenacao))
+        result = paginacao.paginar(query, ordenacao, skip, limit, cursor, contar)
         _log_db_operation("SELECT", "prestadores_servico", start_time, success=True)
         logger.info(f"Retrieved {len(result)} service providers (skip={skip}, limit={limit})")
         return result
@@ -187,7 +228,8 @@ def create_prestador(db: Session, prestador: schemas.PrestadorServicoCreate) ->
     try:
         db_prestador = models.PrestadorServico(**prestador.dict())
         db.add(db_prestador)
-        db.commit()
+        _commit_write(db)
+        invalidate_dimensoes()
         db.refresh(db_prestador)
         _log_db_operation("INSERT", "prestadores_servico", start_time, success=True)
         logger.info(f"Created service provider: {db_prestador.nome} ({db_prestador.sigla})")
@@ -206,7 +248,8 @@ def update_prestador(db: Session, prestador_id: int, prestador: schemas.Prestado
             for field, value in update_data.items():
                 setattr(db_prestador, field, value)
             db.add(db_prestador)
-            db.commit()
+            _commit_write(db)
+            invalidate_dimensoes()
             db.refresh(db_prestador)
             _log_db_operation("UPDATE", "prestadores_servico", start_time, success=True)
             logger.info(f"Updated service provider: {db_prestador.nome} (ID: {prestador_id})")
@@ -222,7 +265,8 @@ def delete_prestador(db: Session, prestador_id: int) -> bool:
         db_prestador = db.query(models.PrestadorServico).filter(models.PrestadorServico.id == prestador_id).first()
         if db_prestador:
             db.delete(db_prestador)
-            db.commit()
+            _commit_write(db)
+            invalidate_dimensoes()
             _log_db_operation("DELETE", "prestadores_servico", start_time, success=True)
             logger.info(f"Deleted service provider: {db_prestador.nome} (ID: {prestador_id})")
             return True
@@ -233,17 +277,20 @@ def delete_prestador(db: Session, prestador_id: int) -> bool:
         raise
 
 # Funções para Indicadores de Desempenho
-def get_indicador(db: Session, indicador_id: int) -> Optional[models.IndicadoresDesempenhoAnual]:
+def get_indicador(db: Session, indicador_id: int, campos: Optional[List[str]] = None) -> Optional[models.IndicadoresDesempenhoAnual]:
     start_time = time.time()
     try:
-        result = db.query(models.IndicadoresDesempenhoAnual)\
-            .options(
+        query = db.query(models.IndicadoresDesempenhoAnual)
+        if campos:
+            query = query.options(*carregamento_parcial(models.IndicadoresDesempenhoAnual, campos))
+        else:
+            query = query.options(
                 joinedload(models.IndicadoresDesempenhoAnual.municipio),
                 joinedload(models.IndicadoresDesempenhoAnual.prestador),
                 joinedload(models.IndicadoresDesempenhoAnual.recursos_hidricos),
                 joinedload(models.IndicadoresDesempenhoAnual.financeiro)
-            )\
-            .filter(models.IndicadoresDesempenhoAnual.id == indicador_id).first()
+            )
+        result = query.filter(models.IndicadoresDesempenhoAnual.id == indicador_id).first()
         _log_db_operation("SELECT", "indicadores_desempenho_anuais", start_time, success=True)
         return result
     except Exception as e:
@@ -259,15 +306,30 @@ def get_indicadores(
     municipio_id: Optional[str] = None,
     prestador_id: Optional[int] = None,
     order_by: Optional[str] = None,
-    order_direction: str = "asc"
+    order_direction: str = "asc",
+    completo: bool = False,
+    cursor: Optional[str] = None,
+    contar: bool = False,
+    campos: Optional[List[str]] = None
 ) -> List[models.IndicadoresDesempenhoAnual]:
+    """
+    Lista indicadores com município e prestador carregados no mesmo SELECT.
+    Com `completo`, recursos hídricos e financeiro (um por indicador) também
+    entram no JOIN, de modo que a listagem é sempre uma única consulta.
+    """
     start_time = time.time()
     try:
-        query = db.query(models.IndicadoresDesempenhoAnual)\
-            .options(
+        query = db.query(models.IndicadoresDesempenhoAnual)
+        if campos is None:
+            query = query.options(
                 joinedload(models.IndicadoresDesempenhoAnual.municipio),
                 joinedload(models.IndicadoresDesempenhoAnual.prestador)
             )
+        if completo:
+            query = query.options(
+                joinedload(models.IndicadoresDesempenhoAnual.recursos_hidricos),
+                joinedload(models.IndicadoresDesempenhoAnual.financeiro)
+            )
         
         if ano_inicio is not None:
             query = query.filter(models.IndicadoresDesempenhoAnual.ano >= ano_inicio)
@@ -278,19 +340,12 @@ def get_indicadores(
         if prestador_id:
             query = query.filter(models.IndicadoresDesempenhoAnual.prestador_id == prestador_id)
 
-        # Ordenação
-        if order_by:
-            if hasattr(models.IndicadoresDesempenhoAnual, order_by):
-                if order_direction == "desc":
-                    query = query.order_by(desc(getattr(models.IndicadoresDesempenhoAnual, order_by)))
-                else:
-                    query = query.order_by(asc(getattr(models.IndicadoresDesempenhoAnual, order_by)))
-            else:
-                query = query.order_by(models.IndicadoresDesempenhoAnual.ano.desc())
-        else:
-            query = query.order_by(models.IndicadoresDesempenhoAnual.ano.desc())
-
-        result = query.offset(skip).limit(limit).all()
+        ordenacao = paginacao.resolver_ordenacao(
+            models.IndicadoresDesempenhoAnual, order_by, order_direction, padrao="ano", padrao_descendente=True
+        )
+        if campos:
+            query = query.options(*carregamento_parcial(models.IndicadoresDesempenhoAnual, campos, ordenacao))
+        result = paginacao.paginar(query, ordenacao, skip, limit, cursor, contar)
         _log_db_operation("SELECT", "indicadores_desempenho_anuais", start_time, success=True)
         logger.info(f"Retrieved {len(result)} performance indicators (skip={skip}, limit={limit})")
         return result
@@ -319,13 +374,25 @@ def get_indicadores_municipio(db: Session, municipio_id: str) -> List[models.Ind
         _log_db_operation("SELECT", "indicadores_desempenho_anuais", start_time, success=False, error=str(e))
         raise
 
-def create_indicadores(db: Session, indicadores: schemas.IndicadoresDesempenhoCreate) -> models.IndicadoresDesempenhoAnual:
+def create_indicadores(
+    db: Session,
+    indicadores: schemas.IndicadoresDesempenhoCreate,
+    reconstruir_snapshots: bool = True
+) -> models.IndicadoresDesempenhoAnual:
+    """
+    Cria um indicador. O ranking pré-calculado do ano é refeito na mesma
+    transação; cargas que gravam linha a linha passam `reconstruir_snapshots=False`
+    (o snapshot do ano é só descartado) e reconstroem uma vez ao final.
+    """
     start_time = time.time()
     try:
         db_indicadores = models.IndicadoresDesempenhoAnual(**indicadores.dict())
         db.add(db_indicadores)
-        db.commit()
+        db.flush()
+        _atualizar_ranking_snapshots(db, db_indicadores.ano, reconstruir_snapshots)
+        _commit_write(db)
         db.refresh(db_indicadores)
+        invalidate_indicadores(db_indicadores.ano, db_indicadores.municipio_id, muda_ultimo_ano=True)
         _log_db_operation("INSERT", "indicadores_desempenho_anuais", start_time, success=True)
         logger.info(f"Created performance indicator: ID {db_indicadores.id} for municipality {db_indicadores.municipio_id}")
         return db_indicadores
@@ -334,17 +401,30 @@ def create_indicadores(db: Session, indicadores: schemas.IndicadoresDesempenhoCr
         _log_db_operation("INSERT", "indicadores_desempenho_anuais", start_time, success=False, error=str(e))
         raise
 
-def update_indicadores(db: Session, indicador_id: int, indicadores: schemas.IndicadoresDesempenhoUpdate) -> Optional[models.IndicadoresDesempenhoAnual]:
+def update_indicadores(
+    db: Session,
+    indicador_id: int,
+    indicadores: schemas.IndicadoresDesempenhoUpdate,
+    reconstruir_snapshots: bool = True
+) -> Optional[models.IndicadoresDesempenhoAnual]:
     start_time = time.time()
     try:
         db_indicadores = db.query(models.IndicadoresDesempenhoAnual).filter(models.IndicadoresDesempenhoAnual.id == indicador_id).first()
         if db_indicadores:
+            ano_anterior = db_indicadores.ano
             update_data = indicadores.dict(exclude_unset=True)
             for field, value in update_data.items():
                 setattr(db_indicadores, field, value)
             db.add(db_indicadores)
-            db.commit()
+            db.flush()
+            _atualizar_ranking_snapshots(db, db_indicadores.ano, reconstruir_snapshots)
+            if ano_anterior != db_indicadores.ano:
+                _atualizar_ranking_snapshots(db, ano_anterior, reconstruir_snapshots)
+            _commit_write(db)
             db.refresh(db_indicadores)
+            invalidate_indicadores(db_indicadores.ano, db_indicadores.municipio_id)
+            if ano_anterior != db_indicadores.ano:
+                invalidate_indicadores(ano_anterior, db_indicadores.municipio_id, muda_ultimo_ano=True)
             _log_db_operation("UPDATE", "indicadores_desempenho_anuais", start_time, success=True)
             logger.info(f"Updated performance indicator: ID {indicador_id}")
         return db_indicadores
@@ -353,13 +433,18 @@ def update_indicadores(db: Session, indicador_id: int, indicadores: schemas.Indi
         _log_db_operation("UPDATE", "indicadores_desempenho_anuais", start_time, success=False, error=str(e))
         raise
 
-def delete_indicadores(db: Session, indicador_id: int) -> bool:
+def delete_indicadores(db: Session, indicador_id: int, reconstruir_snapshots: bool = True) -> bool:
     start_time = time.time()
     try:
         db_indicadores = db.query(models.IndicadoresDesempenhoAnual).filter(models.IndicadoresDesempenhoAnual.id == indicador_id).first()
         if db_indicadores:
+            ano = db_indicadores.ano
+            municipio_id = db_indicadores.municipio_id
             db.delete(db_indicadores)
-            db.commit()
+            db.flush()
+            _atualizar_ranking_snapshots(db, ano, reconstruir_snapshots)
+            _commit_write(db)
+            invalidate_indicadores(ano, municipio_id, muda_ultimo_ano=True)
             _log_db_operation("DELETE", "indicadores_desempenho_anuais", start_time, success=True)
             logger.info(f"Deleted performance indicator: ID {indicador_id}")
             return True
@@ -370,10 +455,13 @@ def delete_indicadores(db: Session, indicador_id: int) -> bool:
         raise
 
 # Funções para Recursos Hídricos
-def get_recursos_hidricos(db: Session, recursos_id: int) -> Optional[models.RecursosHidricosAnual]:
+def get_recursos_hidricos(db: Session, recursos_id: int, campos: Optional[List[str]] = None) -> Optional[models.RecursosHidricosAnual]:
     start_time = time.time()
     try:
-        result = db.query(models.RecursosHidricosAnual).filter(models.RecursosHidricosAnual.id == recursos_id).first()
+        query = db.query(models.RecursosHidricosAnual)
+        if campos:
+            query = query.options(*carregamento_parcial(models.RecursosHidricosAnual, campos))
+        result = query.filter(models.RecursosHidricosAnual.id == recursos_id).first()
         _log_db_operation("SELECT", "recursos_hidricos_anuais", start_time, success=True)
         return result
     except Exception as e:
@@ -398,7 +486,10 @@ def get_recursos_hidricos_list(
     volume_min: Optional[float] = None,
     volume_max: Optional[float] = None,
     order_by: Optional[str] = None,
-    order_direction: str = "asc"
+    order_direction: str = "asc",
+    cursor: Optional[str] = None,
+    contar: bool = False,
+    campos: Optional[List[str]] = None
 ) -> List[models.RecursosHidricosAnual]:
     start_time = time.time()
     try:
@@ -411,19 +502,12 @@ def get_recursos_hidricos_list(
         if volume_max is not None:
             query = query.filter(models.RecursosHidricosAnual.volume_agua_produzido <= volume_max)
 
-        # Ordenação
-        if order_by:
-            if hasattr(models.RecursosHidricosAnual, order_by):
-                if order_direction == "desc":
-                    query = query.order_by(desc(getattr(models.RecursosHidricosAnual, order_by)))
-                else:
-                    query = query.order_by(asc(getattr(models.RecursosHidricosAnual, order_by)))
-            else:
-                query = query.order_by(models.RecursosHidricosAnual.id)
-        else:
-            query = query.order_by(models.RecursosHidricosAnual.id)
-
-        result = query.offset(skip).limit(limit).all()
+        ordenacao = paginacao.resolver_ordenacao(
+            models.RecursosHidricosAnual, order_by, order_direction, padrao="id", padrao_descendente=False
+        )
+        if campos:
+            query = query.options(*carregamento_parcial(models.RecursosHidricosAnual, campos, ordenacao))
+        result = paginacao.paginar(query, ordenacao, skip, limit, cursor, contar)
         _log_db_operation("SELECT", "recursos_hidricos_anuais", start_time, success=True)
         logger.info(f"Retrieved {len(result)} water resources records (skip={skip}, limit={limit})")
         return result
@@ -436,8 +520,9 @@ def create_recursos_hidricos(db: Session, recursos: schemas.RecursosHidricosCrea
     try:
         db_recursos = models.RecursosHidricosAnual(**recursos.dict())
         db.add(db_recursos)
-        db.commit()
+        _commit_write(db)
         db.refresh(db_recursos)
+        _invalidate_por_indicador(db, db_recursos.indicador_id)
         _log_db_operation("INSERT", "recursos_hidricos_anuais", start_time, success=True)
         logger.info(f"Created water resources record: ID {db_recursos.id} for indicator {db_recursos.indicador_id}")
         return db_recursos
@@ -455,8 +540,9 @@ def update_recursos_hidricos(db: Session, recursos_id: int, recursos: schemas.Re
             for field, value in update_data.items():
                 setattr(db_recursos, field, value)
             db.add(db_recursos)
-            db.commit()
+            _commit_write(db)
             db.refresh(db_recursos)
+            _invalidate_por_indicador(db, db_recursos.indicador_id)
             _log_db_operation("UPDATE", "recursos_hidricos_anuais", start_time, success=True)
             logger.info(f"Updated water resources record: ID {recursos_id}")
         return db_recursos
@@ -470,8 +556,10 @@ def delete_recursos_hidricos(db: Session, recursos_id: int) -> bool:
     try:
         db_recursos = db.query(models.RecursosHidricosAnual).filter(models.RecursosHidricosAnual.id == recursos_id).first()
         if db_recursos:
+            indicador_id = db_recursos.indicador_id
             db.delete(db_recursos)
-            db.commit()
+            _commit_write(db)
+            _invalidate_por_indicador(db, indicador_id)
             _log_db_operation("DELETE", "recursos_hidricos_anuais", start_time, success=True)
             logger.info(f"Deleted water resources record: ID {recursos_id}")
             return True
@@ -482,10 +570,13 @@ def delete_recursos_hidricos(db: Session, recursos_id: int) -> bool:
         raise
 
 # Funções para Financeiro
-def get_financeiro(db: Session, financeiro_id: int) -> Optional[models.FinanceiroAnual]:
+def get_financeiro(db: Session, financeiro_id: int, campos: Optional[List[str]] = None) -> Optional[models.FinanceiroAnual]:
     start_time = time.time()
     try:
-        result = db.query(models.FinanceiroAnual).filter(models.FinanceiroAnual.id == financeiro_id).first()
+        query = db.query(models.FinanceiroAnual)
+        if campos:
+            query = query.options(*carregamento_parcial(models.FinanceiroAnual, campos))
+        result = query.filter(models.FinanceiroAnual.id == financeiro_id).first()
         _log_db_operation("SELECT", "financeiro_anuais", start_time, success=True)
         return result
     except Exception as e:
@@ -510,7 +601,10 @@ def get_financeiro_list(
     receita_min: Optional[float] = None,
     receita_max: Optional[float] = None,
     order_by: Optional[str] = None,
-    order_direction: str = "asc"
+    order_direction: str = "asc",
+    cursor: Optional[str] = None,
+    contar: bool = False,
+    campos: Optional[List[str]] = None
 ) -> List[models.FinanceiroAnual]:
     start_time = time.time()
     try:
@@ -523,19 +617,12 @@ def get_financeiro_list(
         if receita_max is not None:
             query = query.filter(models.FinanceiroAnual.receita_operacional_total <= receita_max)
 
-        # Ordenação
-        if order_by:
-            if hasattr(models.FinanceiroAnual, order_by):
-                if order_direction == "desc":
-                    query = query.order_by(desc(getattr(models.FinanceiroAnual, order_by)))
-                else:
-                    query = query.order_by(asc(getattr(models.FinanceiroAnual, order_by)))
-            else:
-                query = query.order_by(models.FinanceiroAnual.id)
-        else:
-            query = query.order_by(models.FinanceiroAnual.id)
-
-        result = query.offset(skip).limit(limit).all()
+        ordenacao = paginacao.resolver_ordenacao(
+            models.FinanceiroAnual, order_by, order_direction, padrao="id", padrao_descendente=False
+        )
+        if campos:
+            query = query.options(*carregamento_parcial(models.FinanceiroAnual, campos, ordenacao))
+        result = paginacao.paginar(query, ordenacao, skip, limit, cursor, contar)
         _log_db_operation("SELECT", "financeiro_anuais", start_time, success=True)
         logger.info(f"Retrieved {len(result)} financial records (skip={skip}, limit={limit})")
         return result
@@ -548,8 +635,9 @@ def create_financeiro(db: Session, financeiro: schemas.FinanceiroCreate) -> mode
     try:
         db_financeiro = models.FinanceiroAnual(**financeiro.dict())
         db.add(db_financeiro)
-        db.commit()
+        _commit_write(db)
         db.refresh(db_financeiro)
+        _invalidate_por_indicador(db, db_financeiro.indicador_id)
         _log_db_operation("INSERT", "financeiro_anuais", start_time, success=True)
         logger.info(f"Created financial record: ID {db_financeiro.id} for indicator {db_financeiro.indicador_id}")
         return db_financeiro
@@ -567,8 +655,9 @@ def update_financeiro(db: Session, financeiro_id: int, financeiro: schemas.Finan
             for field, value in update_data.items():
                 setattr(db_financeiro, field, value)
             db.add(db_financeiro)
-            db.commit()
+            _commit_write(db)
             db.refresh(db_financeiro)
+            _invalidate_por_indicador(db, db_financeiro.indicador_id)
             _log_db_operation("UPDATE", "financeiro_anuais", start_time, success=True)
             logger.info(f"Updated financial record: ID {financeiro_id}")
         return db_financeiro
@@ -582,8 +671,10 @@ def delete_financeiro(db: Session, financeiro_id: int) -> bool:
     try:
         db_financeiro = db.query(models.FinanceiroAnual).filter(models.FinanceiroAnual.id == financeiro_id).first()
         if db_financeiro:
+            indicador_id = db_financeiro.indicador_id
             db.delete(db_financeiro)
-            db.commit()
+            _commit_write(db)
+            _invalidate_por_indicador(db, indicador_id)
             _log_db_operation("DELETE", "financeiro_anuais", start_time, success=True)
             logger.info(f"Deleted financial record: ID {financeiro_id}")
             return True
@@ -593,6 +684,174 @@ def delete_financeiro(db: Session, financeiro_id: int) -> bool:
         _log_db_operation("DELETE", "financeiro_anuais", start_time, success=False, error=str(e))
         raise
 
+# Funções de upsert (inserção idempotente via ON CONFLICT)
+CHAVE_INDICADORES = ("ano", "municipio_id", "prestador_id")
+
+# INSERT com on_conflict_do_update/do_nothing de cada dialeto aceito em
+# app.database (outros bancos são recusados ao criar o engine)
+_INSERT_POR_DIALETO = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert
+}
+
+def _insert_dialeto(db: Session, model):
+    """INSERT específico do dialeto, que oferece on_conflict_do_update/do_nothing"""
+    return _INSERT_POR_DIALETO[db.get_bind().dialect.name](model)
+
+def _on_conflict(stmt, alvo: dict, colunas_atualizaveis, atualizar: bool):
+    if not atualizar:
+        return stmt.on_conflict_do_nothing(**alvo)
+    return stmt.on_conflict_do_update(
+        **alvo,
+        set_={coluna: stmt.excluded[coluna] for coluna in colunas_atualizaveis}
+    )
+
+def _alvo_indicadores(db: Session) -> dict:
+    # O SQLite não aceita ON CONFLICT ON CONSTRAINT; usa as colunas do índice único
+    if db.get_bind().dialect.name == "postgresql":
+        return {"constraint": "uq_ano_municipio_prestador"}
+    return {"index_elements": list(CHAVE_INDICADORES)}
+
+def _sem_chaves_repetidas(registros: List[dict], chave) -> List[dict]:
+    """Mantém a última ocorrência de cada chave (um DO UPDATE não pode tocar a mesma linha duas vezes)"""
+    unicos = {}
+    for registro in registros:
+        unicos[tuple(registro[campo] for campo in chave)] = registro
+    return list(unicos.values())
+
+def upsert_indicadores(
+    db: Session,
+    indicadores: schemas.IndicadoresDesempenhoCreate,
+    atualizar: bool = True,
+    reconstruir_snapshots: bool = True
+) -> Optional[models.IndicadoresDesempenhoAnual]:
+    """
+    Insere o indicador ou, se já houver um para (ano, município, prestador),
+    atualiza seus valores (`atualizar=True`) ou não faz nada e retorna None,
+    sem commit nem rollback. `reconstruir_snapshots` funciona como em
+    `create_indicadores`.
+    """
+    start_time = time.time()
+    try:
+        valores = indicadores.dict()
+        stmt = _on_conflict(
+            _insert_dialeto(db, models.IndicadoresDesempenhoAnual).values(**valores),
+            _alvo_indicadores(db),
+            [campo for campo in valores if campo not in CHAVE_INDICADORES],
+            atualizar
+        )
+        db_indicadores = db.scalars(
+            stmt.returning(models.IndicadoresDesempenhoAnual),
+            execution_options={"populate_existing": True}
+        ).first()
+        if db_indicadores is None:
+            # Nada foi gravado; a transação (e o que o chamador ainda não
+            # confirmou nela) continua aberta
+            _log_db_operation("INSERT", "indicadores_desempenho_anuais", start_time, success=True)
+            logger.info(f"Performance indicator already exists for {valores['ano']}/{valores['municipio_id']}/{valores['prestador_id']}")
+            return None
+
+        _atualizar_ranking_snapshots(db, db_indicadores.ano, reconstruir_snapshots)
+        _commit_write(db)
+        db.refresh(db_indicadores)
+        invalidate_indicadores(db_indicadores.ano, db_indicadores.municipio_id, muda_ultimo_ano=True)
+        _log_db_operation("UPSERT", "indicadores_desempenho_anuais", start_time, success=True)
+        logger.info(f"Upserted performance indicator: ID {db_indicadores.id} for municipality {db_indicadores.municipio_id}")
+        return db_indicadores
+    except Exception as e:
+        db.rollback()
+        _log_db_operation("UPSERT", "indicadores_desempenho_anuais", start_time, success=False, error=str(e))
+        raise
+
+def upsert_indicadores_lote(
+    db: Session,
+    registros: List[dict],
+    atualizar: bool = True,
+    commit: bool = True
+) -> List[dict]:
+    """
+    Upsert de vários indicadores em um único INSERT ... ON CONFLICT.
+    Retorna id, ano, municipio_id e prestador_id das linhas inseridas ou
+    atualizadas; com `atualizar=False`, as já existentes não são retornadas.
+    Com `commit=False` a transação fica a cargo de quem chama (ex: cargas).
+    """
+    start_time = time.time()
+    try:
+        if not registros:
+            return []
+        if atualizar:
+            registros = _sem_chaves_repetidas(registros, CHAVE_INDICADORES)
+
+        # Tabela Core (não a classe ORM) para evitar o caminho de bulk insert do ORM,
+        # que emite uma instrução por linha quando há RETURNING
+        tabela = models.IndicadoresDesempenhoAnual.__table__
+        stmt = _on_conflict(
+            _insert_dialeto(db, tabela),
+            _alvo_indicadores(db),
+            [campo for campo in registros[0] if campo not in CHAVE_INDICADORES],
+            atualizar
+        )
+        # executemany com RETURNING: o SQLAlchemy agrupa os registros em
+        # INSERTs de múltiplas linhas ("insertmanyvalues")
+        linhas = db.execute(
+            stmt.returning(tabela.c.id, tabela.c.ano, tabela.c.municipio_id, tabela.c.prestador_id),
+            registros
+        ).mappings().all()
+        afetados = [dict(linha) for linha in linhas]
+
+        if commit:
+            for ano in sorted({linha["ano"] for linha in afetados}):
+                _rebuild_ranking_snapshots(db, ano)
+            _commit_write(db)
+            for ano, municipio_id in {(linha["ano"], linha["municipio_id"]) for linha in afetados}:
+                invalidate_indicadores(ano, municipio_id, muda_ultimo_ano=True)
+
+        _log_db_operation("UPSERT", "indicadores_desempenho_anuais", start_time, success=True)
+        logger.info(f"Upserted {len(afetados)}/{len(registros)} performance indicators")
+        return afetados
+    except Exception as e:
+        if commit:
+            db.rollback()
+        _log_db_operation("UPSERT", "indicadores_desempenho_anuais", start_time, success=False, error=str(e))
+        raise
+
+def _upsert_filhos_lote(db: Session, model, registros: List[dict], atualizar: bool, commit: bool) -> int:
+    """Upsert das tabelas 1:1 com o indicador, usando a unicidade de indicador_id"""
+    start_time = time.time()
+    tabela = model.__tablename__
+    try:
+        if not registros:
+            return 0
+        if atualizar:
+            registros = _sem_chaves_repetidas(registros, ("indicador_id",))
+
+        stmt = _on_conflict(
+            _insert_dialeto(db, model.__table__),
+            {"index_elements": ["indicador_id"]},
+            [campo for campo in registros[0] if campo != "indicador_id"],
+            atualizar
+        )
+        indicador_ids = db.execute(stmt.returning(model.__table__.c.indicador_id), registros).scalars().all()
+
+        if commit:
+            _commit_write(db)
+            _invalidate_por_indicadores(db, indicador_ids)
+
+        _log_db_operation("UPSERT", tabela, start_time, success=True)
+        logger.info(f"Upserted {len(indicador_ids)}/{len(registros)} rows into {tabela}")
+        return len(indicador_ids)
+    except Exception as e:
+        if commit:
+            db.rollback()
+        _log_db_operation("UPSERT", tabela, start_time, success=False, error=str(e))
+        raise
+
+def upsert_recursos_hidricos_lote(db: Session, registros: List[dict], atualizar: bool = True, commit: bool = True) -> int:
+    return _upsert_filhos_lote(db, models.RecursosHidricosAnual, registros, atualizar, commit)
+
+def upsert_financeiro_lote(db: Session, registros: List[dict], atualizar: bool = True, commit: bool = True) -> int:
+    return _upsert_filhos_lote(db, models.FinanceiroAnual, registros, atualizar, commit)
+
 # Funções de Análise (mantidas do código original)
 def get_ultimo_ano_dados(db: Session) -> int:
     start_time = time.time()
@@ -609,54 +868,235 @@ def _safe_float(value):
         return None
     return float(value)
 
-def get_ranking_indicador(db: Session, ano: int, indicador: str, ordem: str, limit: int, municipio_id: Optional[str]) -> dict:
+# Indicadores que podem ser ranqueados
+INDICADORES_RANKING = {
+    "indice_atendimento_agua": models.IndicadoresDesempenhoAnual.indice_atendimento_agua,
+    "indice_coleta_esgoto": models.IndicadoresDesempenhoAnual.indice_coleta_esgoto,
+    "indice_tratamento_esgoto": models.IndicadoresDesempenhoAnual.indice_tratamento_esgoto,
+    "indice_perda_faturamento": models.IndicadoresDesempenhoAnual.indice_perda_faturamento
+}
+
+def _rebuild_ranking_snapshots(db: Session, ano: int) -> None:
+    """
+    Recalcula os snapshots de ranking de um ano dentro da transação corrente.
+    Não faz commit; quem chama decide quando confirmar.
+    """
+    db.query(models.RankingSnapshot).filter(models.RankingSnapshot.ano == ano)\
+        .delete(synchronize_session=False)
+
+    for indicador, coluna in INDICADORES_RANKING.items():
+        origem = select(
+            literal(ano),
+            literal(indicador),
+            models.IndicadoresDesempenhoAnual.municipio_id,
+            coluna,
+            func.row_number().over(
+                order_by=(desc(coluna), models.IndicadoresDesempenhoAnual.municipio_id)
+            ),
+            func.row_number().over(
+                order_by=(asc(coluna), models.IndicadoresDesempenhoAnual.municipio_id)
+            ),
+            func.percent_rank().over(order_by=asc(coluna).nulls_last()) * 100,
+            func.count().over()
+        ).where(
+            models.IndicadoresDesempenhoAnual.ano == ano,
+            coluna.isnot(None)
+        )
+        db.execute(
+            insert(models.RankingSnapshot).from_select(
+                ["ano", "indicador", "municipio_id", "valor", "posicao",
+                 "posicao_inversa", "percentil", "total"],
+                origem
+            )
+        )
+
+def _atualizar_ranking_snapshots(db: Session, ano: int, reconstruir: bool) -> None:
+    """
+    Refaz o ranking pré-calculado do ano ou, sem `reconstruir`, apenas o
+    descarta: até a próxima reconstrução, o ranking do ano vem da consulta com
+    funções de janela em vez de um snapshot desatualizado.
+    """
+    if reconstruir:
+        _rebuild_ranking_snapshots(db, ano)
+    else:
+        db.query(models.RankingSnapshot).filter(models.RankingSnapshot.ano == ano)\
+            .delete(synchronize_session=False)
+
+def rebuild_ranking_snapshots(db: Session, ano: int) -> None:
     start_time = time.time()
     try:
-        indicador_map = {
-            "indice_atendimento_agua": models.IndicadoresDesempenhoAnual.indice_atendimento_agua,
-            "indice_coleta_esgoto": models.IndicadoresDesempenhoAnual.indice_coleta_esgoto,
-            "indice_tratamento_esgoto": models.IndicadoresDesempenhoAnual.indice_tratamento_esgoto,
-            "indice_perda_faturamento": models.IndicadoresDesempenhoAnual.indice_perda_faturamento
+        _rebuild_ranking_snapshots(db, ano)
+        db.commit()
+        _log_db_operation("INSERT", "ranking_snapshots", start_time, success=True)
+        logger.info(f"Rebuilt ranking snapshots for year {ano}")
+    except Exception as e:
+        db.rollback()
+        _log_db_operation("INSERT", "ranking_snapshots", start_time, success=False, error=str(e))
+        raise
+
+def _get_ranking_snapshot(db: Session, ano: int, indicador: str, ordem: str, limit: int, municipio_id: Optional[str]) -> Optional[dict]:
+    """
+    Lê o ranking pré-calculado. Retorna None se o ano ainda não tem snapshot.
+    """
+    coluna_posicao = models.RankingSnapshot.posicao if ordem == "desc" else models.RankingSnapshot.posicao_inversa
+
+    top = db.query(
+        models.RankingSnapshot.municipio_id,
+        models.Municipio.nome,
+        models.Municipio.sigla_uf,
+        models.RankingSnapshot.valor,
+        coluna_posicao.label("posicao")
+    ).join(models.Municipio).filter(
+        models.RankingSnapshot.ano == ano,
+        models.RankingSnapshot.indicador == indicador
+    ).order_by(coluna_posicao).limit(limit).all()
+
+    if not top:
+        return None
+
+    ranking = [
+        {
+            "posicao": linha.posicao,
+            "municipio": {
+                "id_municipio": linha.municipio_id,
+                "nome": linha.nome,
+                "sigla_uf": linha.sigla_uf
+            },
+            "valor": _safe_float(linha.valor)
         }
-        if indicador not in indicador_map:
+        for linha in top
+    ]
+
+    posicao_especifica = None
+    if municipio_id:
+        linha = db.query(
+            coluna_posicao.label("posicao"),
+            models.RankingSnapshot.total,
+            models.RankingSnapshot.valor,
+            models.RankingSnapshot.percentil
+        ).filter(
+            models.RankingSnapshot.ano == ano,
+            models.RankingSnapshot.indicador == indicador,
+            models.RankingSnapshot.municipio_id == municipio_id
+        ).order_by(coluna_posicao).first()
+        if linha:
+            posicao_especifica = {
+                "municipio_id": municipio_id,
+                "posicao": linha.posicao,
+                "total": linha.total,
+                "valor": _safe_float(linha.valor),
+                "percentil": _safe_float(linha.percentil)
+            }
+
+    return {
+        "ano": ano,
+        "indicador": indicador,
+        "ranking": ranking,
+        "posicao_especifica": posicao_especifica
+    }
+
+def get_ranking_indicador(
+    db: Session,
+    ano: int,
+    indicador: str,
+    ordem: str,
+    limit: int,
+    municipio_id: Optional[str],
+    empate: str = "row_number",
+    nulos: str = "excluir"
+) -> dict:
+    """
+    Gera o ranking de um indicador usando funções de janela no banco.
+
+    Com a política padrão (row_number, nulos excluídos) o ranking é lido de
+    `ranking_snapshots`. Nas demais, o banco calcula a posição com
+    RANK/DENSE_RANK/ROW_NUMBER (conforme `empate`) e o total com COUNT(*) OVER();
+    apenas as `limit` primeiras linhas e a linha do município são transferidas.
+    """
+    start_time = time.time()
+    try:
+        if indicador not in INDICADORES_RANKING:
             raise HTTPException(status_code=400, detail="Indicador inválido")
 
-        coluna = indicador_map[indicador]
+        funcoes_empate = {
+            "rank": func.rank,
+            "dense_rank": func.dense_rank,
+            "row_number": func.row_number
+        }
+        if empate not in funcoes_empate:
+            raise HTTPException(status_code=400, detail="Política de empate inválida")
+        if nulos not in ("excluir", "inicio", "fim"):
+            raise HTTPException(status_code=400, detail="Tratamento de nulos inválido")
+
+        # A política padrão é servida pelos snapshots pré-calculados
+        if empate == "row_number" and nulos == "excluir":
+            result = _get_ranking_snapshot(db, ano, indicador, ordem, limit, municipio_id)
+            if result is not None:
+                _log_db_operation("SELECT", "ranking_snapshots", start_time, success=True)
+                logger.info(f"Served ranking for {indicador} in {ano} from snapshot: {len(result['ranking'])} municipalities")
+                return result
+
+        coluna = INDICADORES_RANKING[indicador]
         order_func = desc if ordem == "desc" else asc
-        
+
+        ordenacao = order_func(coluna)
+        if nulos == "inicio":
+            ordenacao = ordenacao.nulls_first()
+        elif nulos == "fim":
+            ordenacao = ordenacao.nulls_last()
+
+        # ROW_NUMBER precisa de um desempate determinístico; RANK e DENSE_RANK
+        # devem enxergar apenas o valor do indicador para que empates se repitam
+        criterios_janela = [ordenacao]
+        if empate == "row_number":
+            criterios_janela.append(models.IndicadoresDesempenhoAnual.municipio_id)
+
         query = db.query(
-            models.IndicadoresDesempenhoAnual, models.Municipio
-        ).join(models.Municipio).filter(
-            models.IndicadoresDesempenhoAnual.ano == ano,
-            coluna.isnot(None)
-        ).order_by(order_func(coluna))
+            models.IndicadoresDesempenhoAnual.municipio_id.label("municipio_id"),
+            models.Municipio.nome.label("nome"),
+            models.Municipio.sigla_uf.label("sigla_uf"),
+            coluna.label("valor"),
+            funcoes_empate[empate]().over(order_by=criterios_janela).label("posicao"),
+            func.count().over().label("total"),
+            # Nulos por último em qualquer banco (SQLite os põe primeiro por padrão)
+            (func.percent_rank().over(order_by=asc(coluna).nulls_last()) * 100).label("percentil")
+        ).join(models.Municipio).filter(models.IndicadoresDesempenhoAnual.ano == ano)
 
-        all_results = query.all()
-        
-        ranking = []
-        for i, (indicador_obj, municipio_obj) in enumerate(all_results, 1):
-            if i <= limit:
-                ranking.append({
-                    "posicao": i,
-                    "municipio": {
-                        "id_municipio": municipio_obj.id_municipio,
-                        "nome": municipio_obj.nome,
-                        "sigla_uf": municipio_obj.sigla_uf
-                    },
-                    "valor": _safe_float(getattr(indicador_obj, indicador))
-                })
+        if nulos == "excluir":
+            query = query.filter(coluna.isnot(None))
+
+        ranqueados = query.subquery()
+
+        top = db.query(ranqueados)\
+            .order_by(ranqueados.c.posicao, ranqueados.c.municipio_id)\
+            .limit(limit).all()
+
+        ranking = [
+            {
+                "posicao": linha.posicao,
+                "municipio": {
+                    "id_municipio": linha.municipio_id,
+                    "nome": linha.nome,
+                    "sigla_uf": linha.sigla_uf
+                },
+                "valor": _safe_float(linha.valor)
+            }
+            for linha in top
+        ]
 
         posicao_especifica = None
         if municipio_id:
-            for i, (indicador_obj, municipio_obj) in enumerate(all_results, 1):
-                if municipio_obj.id_municipio == municipio_id:
-                    posicao_especifica = {
-                        "municipio_id": municipio_id,
-                        "posicao": i,
-                        "total": len(all_results),
-                        "valor": _safe_float(getattr(indicador_obj, indicador))
-                    }
-                    break
+            linha = db.query(ranqueados)\
+                .filter(ranqueados.c.municipio_id == municipio_id)\
+                .order_by(ranqueados.c.posicao).first()
+            if linha:
+                posicao_especifica = {
+                    "municipio_id": municipio_id,
+                    "posicao": linha.posicao,
+                    "total": linha.total,
+                    "valor": _safe_float(linha.valor),
+                    "percentil": _safe_float(linha.percentil) if linha.valor is not None else None
+                }
 
         result = {
             "ano": ano,
@@ -709,6 +1149,307 @@ def get_evolucao_indicadores(db: Session, municipio_id: str, indicadores: Option
         _log_db_operation("SELECT", "indicadores_desempenho_anuais", start_time, success=False, error=str(e))
         raise
 
+# Colunas de indicadores disponíveis para séries temporais
+INDICADORES_EVOLUCAO = (
+    "populacao_atendida_agua",
+    "populacao_atendida_esgoto",
+    "indice_atendimento_agua",
+    "indice_coleta_esgoto",
+    "indice_tratamento_esgoto",
+    "indice_perda_faturamento"
+)
+
+def get_evolucao_indicadores_lote(
+    db: Session,
+    municipio_ids: Optional[List[str]] = None,
+    indicadores: Optional[List[str]] = None
+) -> dict:
+    """
+    Busca a evolução de vários municípios em uma única consulta, selecionando
+    apenas as colunas pedidas. `municipio_ids=None` retorna todos os municípios.
+    """
+    start_time = time.time()
+    try:
+        if not indicadores:
+            indicadores = ["indice_atendimento_agua", "indice_coleta_esgoto", "indice_tratamento_esgoto", "indice_perda_faturamento"]
+        invalidos = [ind for ind in indicadores if ind not in INDICADORES_EVOLUCAO]
+        if invalidos:
+            raise HTTPException(status_code=400, detail=f"Indicadores inválidos: {', '.join(invalidos)}")
+
+        colunas = [getattr(models.IndicadoresDesempenhoAnual, ind) for ind in indicadores]
+        query = db.query(
+            models.IndicadoresDesempenhoAnual.municipio_id,
+            models.IndicadoresDesempenhoAnual.ano,
+            *colunas
+        )
+        if municipio_ids is not None:
+            query = query.filter(models.IndicadoresDesempenhoAnual.municipio_id.in_(municipio_ids))
+
+        # Mesma ordem de idx_municipio_ano_id
+        linhas = query.order_by(
+            models.IndicadoresDesempenhoAnual.municipio_id,
+            models.IndicadoresDesempenhoAnual.ano
+        ).all()
+
+        municipios = {}
+        for linha in linhas:
+            serie = municipios.get(linha[0])
+            if serie is None:
+                serie = municipios[linha[0]] = {"anos": [], "series": {ind: [] for ind in indicadores}}
+            serie["anos"].append(linha[1])
+            for ind, valor in zip(indicadores, linha[2:]):
+                serie["series"][ind].append(_safe_float(valor))
+
+        result = {"indicadores": indicadores, "municipios": municipios}
+
+        _log_db_operation("SELECT", "indicadores_desempenho_anuais", start_time, success=True)
+        logger.info(f"Generated batch evolution data: {len(municipios)} municipalities, {len(linhas)} rows, {len(indicadores)} indicators")
+        return result
+    except Exception as e:
+        _log_db_operation("SELECT", "indicadores_desempenho_anuais", start_time, success=False, error=str(e))
+        raise
+
+# Colunas disponíveis para o comparativo entre municípios
+CAMPOS_COMPARATIVO = {
+    "prestador_id": models.IndicadoresDesempenhoAnual.prestador_id,
+    "populacao_atendida_agua": models.IndicadoresDesempenhoAnual.populacao_atendida_agua,
+    "populacao_atendida_esgoto": models.IndicadoresDesempenhoAnual.populacao_atendida_esgoto,
+    "indice_atendimento_agua": models.IndicadoresDesempenhoAnual.indice_atendimento_agua,
+    "indice_coleta_esgoto": models.IndicadoresDesempenhoAnual.indice_coleta_esgoto,
+    "indice_tratamento_esgoto": models.IndicadoresDesempenhoAnual.indice_tratamento_esgoto,
+    "indice_perda_faturamento": models.IndicadoresDesempenhoAnual.indice_perda_faturamento,
+    "volume_agua_produzido": models.RecursosHidricosAnual.volume_agua_produzido,
+    "volume_agua_consumido": models.RecursosHidricosAnual.volume_agua_consumido,
+    "volume_agua_faturado": models.RecursosHidricosAnual.volume_agua_faturado,
+    "volume_esgoto_coletado": models.RecursosHidricosAnual.volume_esgoto_coletado,
+    "volume_esgoto_tratado": models.RecursosHidricosAnual.volume_esgoto_tratado,
+    "consumo_eletrico_sistemas_agua": models.RecursosHidricosAnual.consumo_eletrico_sistemas_agua,
+    "receita_operacional_total": models.FinanceiroAnual.receita_operacional_total,
+    "despesa_exploracao": models.FinanceiroAnual.despesa_exploracao,
+    "despesa_pessoal": models.FinanceiroAnual.despesa_pessoal,
+    "despesa_energia": models.FinanceiroAnual.despesa_energia,
+    "despesa_total_servicos": models.FinanceiroAnual.despesa_total_servicos,
+    "investimento_total_prestador": models.FinanceiroAnual.investimento_total_prestador,
+    "credito_a_receber": models.FinanceiroAnual.credito_a_receber
+}
+
+def get_municipios_comparacao(
+    db: Session,
+    ano: int,
+    municipio_ids: Optional[List[str]] = None,
+    campos: Optional[List[str]] = None,
+    skip: int = 0,
+    limit: int = 100
+) -> dict:
+    """
+    Compara municípios em um ano com uma única consulta sobre municípios,
+    indicadores, recursos hídricos e financeiro, projetando apenas `campos`.
+    O total vem de COUNT(*) OVER() na mesma consulta; numa página além do fim,
+    de uma contagem à parte, em cache por versão do dataset.
+    """
+    start_time = time.time()
+    try:
+        if not campos:
+            campos = list(CAMPOS_COMPARATIVO)
+        invalidos = [campo for campo in campos if campo not in CAMPOS_COMPARATIVO]
+        if invalidos:
+            raise HTTPException(status_code=400, detail=f"Campos inválidos: {', '.join(invalidos)}")
+
+        colunas_municipio = (
+            models.Municipio.id_municipio,
+            models.Municipio.nome,
+            models.Municipio.sigla_uf,
+            models.Municipio.populacao_total_estimada_2022,
+            models.Municipio.quantidade_sedes_agua,
+            models.Municipio.quantidade_sedes_esgoto,
+            models.Municipio.nome_prestador_predominante
+        )
+
+        query = db.query(
+            *colunas_municipio,
+            *(CAMPOS_COMPARATIVO[campo].label(campo) for campo in campos)
+        ).select_from(models.IndicadoresDesempenhoAnual)\
+            .join(models.Municipio, models.IndicadoresDesempenhoAnual.municipio_id == models.Municipio.id_municipio)\
+            .outerjoin(models.RecursosHidricosAnual, models.RecursosHidricosAnual.indicador_id == models.IndicadoresDesempenhoAnual.id)\
+            .outerjoin(models.FinanceiroAnual, models.FinanceiroAnual.indicador_id == models.IndicadoresDesempenhoAnual.id)\
+            .filter(models.IndicadoresDesempenhoAnual.ano == ano)
+
+        if municipio_ids:
+            query = query.filter(models.IndicadoresDesempenhoAnual.municipio_id.in_(municipio_ids))
+
+        linhas = query.add_columns(func.count().over().label("total"))\
+            .order_by(models.Municipio.nome, models.IndicadoresDesempenhoAnual.id)\
+            .offset(skip).limit(limit).all()
+        if linhas:
+            total = linhas[0].total
+        else:
+            total = paginacao.contar_total(query) if skip > 0 else 0
+
+        municipios = []
+        for linha in linhas:
+            dados = linha._mapping
+            municipios.append({
+                "municipio": {coluna.key: dados[coluna.key] for coluna in colunas_municipio},
+                "indicadores": {campo: dados[campo] for campo in campos}
+            })
+
+        result = {
+            "ano": ano,
+            "total": total,
+            "skip": skip,
+            "limit": limit,
+            "municipios": municipios
+        }
+
+        _log_db_operation("SELECT", "indicadores_desempenho_anuais", start_time, success=True)
+        logger.info(f"Generated comparison for {ano}: {len(municipios)} municipalities, {len(campos)} fields")
+        return result
+    except Exception as e:
+        _log_db_operation("SELECT", "indicadores_desempenho_anuais", start_time, success=False, error=str(e))
+        raise
+
+# Colunas numéricas disponíveis para estatísticas de distribuição
+CAMPOS_DISTRIBUICAO = {
+    campo: coluna for campo, coluna in CAMPOS_COMPARATIVO.items() if campo != "prestador_id"
+}
+
+QUANTIS_DISTRIBUICAO = (10, 20, 25, 30, 40, 50, 60, 70, 75, 80, 90)
+
+def _estatisticas_distribuicao(valores: np.ndarray, bins: int) -> dict:
+    """Resume um vetor (com NaN para nulos) em quantis, extremos, desvio e histograma"""
+    presentes = valores[~np.isnan(valores)]
+    total = int(valores.size)
+    resumo = {
+        "total": total,
+        "nulos": total - int(presentes.size),
+        "minimo": None,
+        "maximo": None,
+        "media": None,
+        "desvio_padrao": None,
+        "quantis": {f"p{q}": None for q in QUANTIS_DISTRIBUICAO},
+        "histograma": None
+    }
+    if presentes.size == 0:
+        return resumo
+
+    # Interpolação linear, equivalente a percentile_cont do PostgreSQL
+    quantis = np.percentile(presentes, QUANTIS_DISTRIBUICAO)
+    contagens, limites = np.histogram(presentes, bins=bins)
+    resumo.update({
+        "minimo": float(presentes.min()),
+        "maximo": float(presentes.max()),
+        "media": float(presentes.mean()),
+        "desvio_padrao": float(presentes.std(ddof=1)) if presentes.size > 1 else None,
+        "quantis": {f"p{q}": float(v) for q, v in zip(QUANTIS_DISTRIBUICAO, quantis)},
+        "histograma": {"limites": limites.tolist(), "contagens": contagens.tolist()}
+    })
+    return resumo
+
+def get_distribuicao_indicadores(
+    db: Session,
+    anos: List[int],
+    campos: Optional[List[str]] = None,
+    bins: int = 10
+) -> dict:
+    """
+    Calcula quantis (p10 a p90), mínimo/máximo, média, desvio padrão, nulos e
+    histograma de faixas fixas por ano e campo. Uma única consulta traz apenas
+    as colunas pedidas; as estatísticas são calculadas em memória com NumPy.
+    """
+    start_time = time.time()
+    try:
+        if not campos:
+            campos = list(CAMPOS_DISTRIBUICAO)
+        invalidos = [campo for campo in campos if campo not in CAMPOS_DISTRIBUICAO]
+        if invalidos:
+            raise HTTPException(status_code=400, detail=f"Campos inválidos: {', '.join(invalidos)}")
+
+        linhas = db.query(
+            models.IndicadoresDesempenhoAnual.ano,
+            *(CAMPOS_DISTRIBUICAO[campo].label(campo) for campo in campos)
+        ).select_from(models.IndicadoresDesempenhoAnual)\
+            .outerjoin(models.RecursosHidricosAnual, models.RecursosHidricosAnual.indicador_id == models.IndicadoresDesempenhoAnual.id)\
+            .outerjoin(models.FinanceiroAnual, models.FinanceiroAnual.indicador_id == models.IndicadoresDesempenhoAnual.id)\
+            .filter(models.IndicadoresDesempenhoAnual.ano.in_(anos))\
+            .all()
+
+        anos_linhas = np.array([linha[0] for linha in linhas], dtype=np.int64)
+        # Nulos viram NaN ao converter para float
+        matriz = np.array([linha[1:] for linha in linhas], dtype=np.float64).reshape(len(linhas), len(campos))
+
+        distribuicoes = []
+        for ano in sorted(set(anos)):
+            valores_ano = matriz[anos_linhas == ano]
+            for indice, campo in enumerate(campos):
+                distribuicoes.append({
+                    "ano": ano,
+                    "campo": campo,
+                    **_estatisticas_distribuicao(valores_ano[:, indice], bins)
+                })
+
+        result = {"anos": sorted(set(anos)), "distribuicoes": distribuicoes}
+
+        _log_db_operation("SELECT", "indicadores_desempenho_anuais", start_time, success=True)
+        logger.info(f"Generated distributions for {len(campos)} fields over {len(result['anos'])} years ({len(linhas)} rows)")
+        return result
+    except Exception as e:
+        _log_db_operation("SELECT", "indicadores_desempenho_anuais", start_time, success=False, error=str(e))
+        raise
+
+def get_analise_eficiencia_hidrica(db: Session, ano: int, limit: int = 10) -> dict:
+    """
+    Calcula no banco a eficiência (volume faturado / produzido, em %) e a perda
+    de cada município no ano, trazendo apenas os `limit` mais e menos eficientes.
+    """
+    start_time = time.time()
+    try:
+        eficiencia = (
+            models.RecursosHidricosAnual.volume_agua_faturado * 100.0
+            / models.RecursosHidricosAnual.volume_agua_produzido
+        )
+
+        query = db.query(
+            models.Municipio,
+            models.RecursosHidricosAnual.volume_agua_produzido.label("volume_produzido"),
+            models.RecursosHidricosAnual.volume_agua_faturado.label("volume_faturado"),
+            eficiencia.label("eficiencia"),
+            (100.0 - eficiencia).label("indice_perda")
+        ).select_from(models.RecursosHidricosAnual)\
+            .join(models.IndicadoresDesempenhoAnual, models.RecursosHidricosAnual.indicador_id == models.IndicadoresDesempenhoAnual.id)\
+            .join(models.Municipio, models.IndicadoresDesempenhoAnual.municipio_id == models.Municipio.id_municipio)\
+            .filter(
+                models.IndicadoresDesempenhoAnual.ano == ano,
+                models.RecursosHidricosAnual.volume_agua_produzido > 0,
+                models.RecursosHidricosAnual.volume_agua_faturado.isnot(None)
+            )
+
+        def _montar(linhas):
+            return [
+                {
+                    "municipio": linha.Municipio,
+                    "indice_perda": _safe_float(linha.indice_perda),
+                    "volume_produzido": _safe_float(linha.volume_produzido),
+                    "volume_faturado": _safe_float(linha.volume_faturado),
+                    "eficiencia": _safe_float(linha.eficiencia)
+                }
+                for linha in linhas
+            ]
+
+        mais_eficientes = query.order_by(desc(eficiencia), models.Municipio.id_municipio).limit(limit).all()
+        menos_eficientes = query.order_by(asc(eficiencia), models.Municipio.id_municipio).limit(limit).all()
+
+        result = {
+            "mais_eficientes": _montar(mais_eficientes),
+            "menos_eficientes": _montar(menos_eficientes)
+        }
+
+        _log_db_operation("SELECT", "recursos_hidricos_anuais", start_time, success=True)
+        logger.info(f"Generated water efficiency analysis for {ano} (top {limit})")
+        return result
+    except Exception as e:
+        _log_db_operation("SELECT", "recursos_hidricos_anuais", start_time, success=False, error=str(e))
+        raise
+
 def get_indicadores_principais(db: Session, ano: Optional[int] = None) -> dict:
     start_time = time.time()
     try:
@@ -21,7 +21,15 @@ engine_kwargs = {
     "max_overflow": 20
 }
 
+# Os upserts (INSERT ... ON CONFLICT) de app.crud existem só nestes dialetos
+DIALETOS_SUPORTADOS = ("postgresql", "sqlite")
+
 engine = create_engine(DATABASE_URL, **engine_kwargs)
+if engine.dialect.name not in DIALETOS_SUPORTADOS:
+    raise RuntimeError(
+        f"Banco de dados não suportado: {engine.dialect.name} "
+        f"(use um de: {', '.join(DIALETOS_SUPORTADOS)})"
+    )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
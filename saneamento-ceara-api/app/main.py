@@ -1,9 +1,13 @@
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 import time
 import uuid
-from app.database import engine
+from app.database import engine, SessionLocal
 from app import models
+from app.versioning import get_dataset_version, make_etag, etag_matches, etag_matches_any
+from app.analytics import ANALISES_ENGINE, analytics_engine
+from app.autocomplete import indice_municipios
 from app.routers import municipios, analises, prestadores, indicadores, recursos_hidricos, financeiro
 from app.logging_config import setup_logging, get_logger, log_request
 
@@ -48,12 +52,37 @@ else:
     # Em desenvolvimento, permitir todos os domínios
     allowed_origins = ["*"]
 
+# Middleware de ETag baseado na versão do dataset. Registrado antes do CORS para
+# que as respostas 304 também recebam os cabeçalhos de CORS.
+@app.middleware("http")
+async def etag_requests(request: Request, call_next):
+    path = request.url.path
+    if request.method != "GET" or not path.startswith("/api/v1/") or path.startswith("/api/v1/analises/cache"):
+        return await call_next(request)
+
+    versao = await run_in_threadpool(get_dataset_version)
+    if versao is None:
+        return await call_next(request)
+
+    etag = make_etag(versao, path, request.url.query)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        # Nada mudou desde a última resposta: nenhuma sessão de banco é aberta
+        return Response(status_code=304, headers={"ETag": etag})
+
+    response = await call_next(request)
+    if response.status_code == 200:
+        if etag_matches_any(request.headers.get("if-none-match")):
+            return Response(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+    return response
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allowed_origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Proximo-Cursor"],
 )
 
 # Middleware para logging de requisições
@@ -158,6 +187,24 @@ async def startup_event():
     logger.info("   - Análises: /api/v1/analises")
     logger.info("📚 Documentação: /docs")
 
+    db = SessionLocal()
+    try:
+        indice_municipios.carregar(db)
+    except Exception as e:
+        logger.warning(f"Não foi possível carregar o índice de autocomplete: {e}")
+    finally:
+        db.close()
+
+    if ANALISES_ENGINE == "memoria":
+        # Carrega o motor analítico antes da primeira requisição
+        db = SessionLocal()
+        try:
+            analytics_engine.get_ultimo_ano_dados(db)
+        except Exception as e:
+            logger.warning(f"Não foi possível carregar o motor analítico: {e}")
+        finally:
+            db.close()
+
 @app.on_event("shutdown")
 async def shutdown_event():
     """
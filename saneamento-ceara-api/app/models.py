@@ -1,13 +1,20 @@
-from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey, UniqueConstraint, Index
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Date, ForeignKey, UniqueConstraint, Index
+from sqlalchemy.orm import relationship, validates
 from sqlalchemy.ext.declarative import declarative_base
 from app.database import Base
+from app.texto import normalizar
+
+def _nome_normalizado(context):
+    # Default para inserções em lote (Core), que não passam pelo @validates
+    return normalizar(context.get_current_parameters().get("nome"))
 
 class Municipio(Base):
     __tablename__ = "municipios"
     
     id_municipio = Column(String(7), primary_key=True, index=True)
     nome = Column(String(100), nullable=False)
+    # Nome sem acentos e em minúsculas para a busca fora do PostgreSQL (ver app/texto.py)
+    nome_normalizado = Column(String(100), default=_nome_normalizado)
     sigla_uf = Column(String(2), nullable=False, default="CE")
     populacao_urbana_estimada_2022 = Column(Integer)
     populacao_total_estimada_2022 = Column(Integer)
@@ -17,6 +24,19 @@ class Municipio(Base):
     
     # Relacionamentos
     indicadores = relationship("IndicadoresDesempenhoAnual", back_populates="municipio")
+    
+    # Índices (coluna de ordenação, chave) para a paginação por cursor. Os
+    # índices de trigramas da busca por nome são só do PostgreSQL e ficam na
+    # migração 8b4f2d6a9c13
+    __table_args__ = (
+        Index('idx_municipio_nome_id', 'nome', 'id_municipio'),
+        Index('idx_municipio_populacao_id', 'populacao_total_estimada_2022', 'id_municipio'),
+    )
+
+    @validates('nome')
+    def _atualizar_nome_normalizado(self, chave, nome):
+        self.nome_normalizado = normalizar(nome)
+        return nome
 
 class PrestadorServico(Base):
     __tablename__ = "prestadores_servico"
@@ -24,6 +44,7 @@ class PrestadorServico(Base):
     id = Column(Integer, primary_key=True, index=True)
     sigla = Column(String(20), unique=True, nullable=False)
     nome = Column(String(255), nullable=False)
+    nome_normalizado = Column(String(255), default=_nome_normalizado)
     natureza_juridica = Column(String(100))
     total_investido_historico = Column(Float)
     media_arrecadacao_anual = Column(Float)
@@ -32,6 +53,16 @@ class PrestadorServico(Base):
     
     # Relacionamentos
     indicadores = relationship("IndicadoresDesempenhoAnual", back_populates="prestador")
+    
+    # Índices (coluna de ordenação, chave) para a paginação por cursor
+    __table_args__ = (
+        Index('idx_prestador_nome_id', 'nome', 'id'),
+    )
+
+    @validates('nome')
+    def _atualizar_nome_normalizado(self, chave, nome):
+        self.nome_normalizado = normalizar(nome)
+        return nome
 
 class IndicadoresDesempenhoAnual(Base):
     __tablename__ = "indicadores_desempenho_anuais"
@@ -50,6 +81,10 @@ class IndicadoresDesempenhoAnual(Base):
     indice_coleta_esgoto = Column(Float)
     indice_tratamento_esgoto = Column(Float)
     indice_perda_faturamento = Column(Float)
+
+    # Hash do conteúdo da linha de origem (indicadores, recursos e financeiro),
+    # usado pela carga incremental para detectar alterações
+    hash_conteudo = Column(String(64))
     
     # Relacionamentos
     municipio = relationship("Municipio", back_populates="indicadores")
@@ -59,9 +94,10 @@ class IndicadoresDesempenhoAnual(Base):
     
     # Índices para otimização
     __table_args__ = (
-        Index('idx_municipio_ano', 'municipio_id', 'ano'),
-        Index('idx_prestador_ano', 'prestador_id', 'ano'),
-        Index('idx_ano', 'ano'),
+        # O id no fim serve de desempate para a paginação por cursor
+        Index('idx_municipio_ano_id', 'municipio_id', 'ano', 'id'),
+        Index('idx_prestador_ano_id', 'prestador_id', 'ano', 'id'),
+        Index('idx_ano_id', 'ano', 'id'),
         UniqueConstraint('ano', 'municipio_id', 'prestador_id', name='uq_ano_municipio_prestador')
     )
 
@@ -85,6 +121,10 @@ class RecursosHidricosAnual(Base):
     
     # Relacionamentos
     indicador = relationship("IndicadoresDesempenhoAnual", back_populates="recursos_hidricos")
+    
+    __table_args__ = (
+        Index('idx_recursos_volume_produzido_id', 'volume_agua_produzido', 'id'),
+    )
 
 class FinanceiroAnual(Base):
     __tablename__ = "financeiro_anuais"
@@ -108,4 +148,41 @@ class FinanceiroAnual(Base):
     credito_a_receber = Column(Float)
     
     # Relacionamentos
-    indicador = relationship("IndicadoresDesempenhoAnual", back_populates="financeiro") 
\ No newline at end of file
+    indicador = relationship("IndicadoresDesempenhoAnual", back_populates="financeiro")
+    
+    __table_args__ = (
+        Index('idx_financeiro_receita_id', 'receita_operacional_total', 'id'),
+    )
+
+class RankingSnapshot(Base):
+    __tablename__ = "ranking_snapshots"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    ano = Column(Integer, nullable=False)
+    indicador = Column(String(50), nullable=False)
+    municipio_id = Column(String(7), ForeignKey("municipios.id_municipio"), nullable=False)
+    
+    # Posições pré-calculadas (ROW_NUMBER, nulos excluídos)
+    valor = Column(Float)
+    posicao = Column(Integer, nullable=False)
+    posicao_inversa = Column(Integer, nullable=False)
+    percentil = Column(Float)
+    total = Column(Integer, nullable=False)
+    
+    # Relacionamentos
+    municipio = relationship("Municipio")
+    
+    # Índices para leitura por faixa de posição e busca pontual por município
+    __table_args__ = (
+        Index('idx_snapshot_ano_indicador_posicao', 'ano', 'indicador', 'posicao'),
+        Index('idx_snapshot_ano_indicador_posicao_inversa', 'ano', 'indicador', 'posicao_inversa'),
+        Index('idx_snapshot_ano_indicador_municipio', 'ano', 'indicador', 'municipio_id'),
+    )
+
+
+class VersaoDataset(Base):
+    __tablename__ = "versao_dataset"
+    
+    # Linha única (id = 1) incrementada a cada escrita no dataset
+    id = Column(Integer, primary_key=True)
+    versao = Column(BigInteger, nullable=False, default=0)
@@ -0,0 +1,286 @@
+"""
+Paginação por cursor (keyset) das listagens.
+
+O cursor é um token opaco (JSON em base64 url-safe) com a coluna e a direção
+da ordenação, o valor dessa coluna na última linha entregue e a chave primária
+dessa linha como desempate. A página seguinte é lida com um seek
+`WHERE (coluna, chave) > (valor, id)` sobre índices (coluna, chave), em vez de
+percorrer e descartar as linhas anteriores como no OFFSET.
+
+Quando o total é pedido (envelope `Pagina`), ele vem de `COUNT(*) OVER()` na
+própria consulta da primeira página e fica em cache por versão do dataset, de
+modo que as páginas seguintes não voltam a contar a tabela. O cursor também
+leva o total e a versão em que foi contado: enquanto a versão não muda, ele
+vale mesmo num processo que não tem o total em cache.
+"""
+
+import base64
+import binascii
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, List, Optional, Tuple
+
+from fastapi import HTTPException, Response
+from sqlalchemy import and_, asc, desc, func, or_, tuple_
+from sqlalchemy.orm import Query
+
+from app.cache import register_invalidation_listener
+from app.versioning import get_dataset_version
+
+CABECALHO_PROXIMO_CURSOR = "X-Proximo-Cursor"
+
+# Totais por (versão do dataset, consulta filtrada); descartados a cada escrita
+CONTAGENS_MAXSIZE = 512
+_contagens: "OrderedDict[Tuple[int, str], int]" = OrderedDict()
+_contagens_lock = threading.Lock()
+
+@dataclass(frozen=True)
+class Ordenacao:
+    coluna: Any
+    chave: Any
+    descendente: bool = False
+    # Nome da ordenação calculada (ex: "relevancia"); None para colunas do modelo
+    nome: Optional[str] = None
+
+    @property
+    def calculada(self) -> bool:
+        return self.nome is not None
+
+    @property
+    def nome_coluna(self) -> str:
+        return self.nome or self.coluna.key
+
+    @property
+    def anulavel(self) -> bool:
+        if self.calculada:
+            return False
+        return bool(self.coluna.nullable) and not self.coluna.primary_key
+
+class ResultadoPaginado(list):
+    """
+    Lista de resultados com o cursor da página seguinte (None na última página)
+    e, quando pedido, o total de registros que atendem aos filtros.
+    """
+
+    def __init__(self, itens, proximo_cursor: Optional[str] = None, total: Optional[int] = None):
+        super().__init__(itens)
+        self.proximo_cursor = proximo_cursor
+        self.total = total
+
+    @property
+    def tem_mais(self) -> bool:
+        return self.proximo_cursor is not None
+
+def resolver_ordenacao(model, order_by: Optional[str], order_direction: str,
+                       padrao: str, padrao_descendente: bool = False,
+                       relevancia=None) -> Ordenacao:
+    """
+    Coluna de ordenação pedida (se for uma coluna do modelo) ou a padrão, com a
+    chave primária como desempate. Havendo uma expressão de `relevancia` (busca
+    textual), ela é a ordenação padrão, decrescente.
+    """
+    tabela = model.__table__
+    chave = getattr(model, tabela.primary_key.columns.values()[0].key)
+    if order_by and order_by in tabela.columns:
+        return Ordenacao(getattr(model, order_by), chave, order_direction == "desc")
+    if relevancia is not None:
+        return Ordenacao(relevancia, chave, True, nome="relevancia")
+    return Ordenacao(getattr(model, padrao), chave, padrao_descendente)
+
+def codificar_cursor(ordenacao: Ordenacao, valor, chave, total: Optional[int] = None) -> str:
+    conteudo = {
+        "c": ordenacao.nome_coluna,
+        "d": int(ordenacao.descendente),
+        "v": valor,
+        "k": chave
+    }
+    versao = get_dataset_version() if total is not None else None
+    if versao is not None:
+        conteudo.update({"t": total, "s": versao})
+    texto = json.dumps(conteudo, separators=(",", ":"), ensure_ascii=False)
+    return base64.urlsafe_b64encode(texto.encode("utf-8")).decode("ascii").rstrip("=")
+
+def _ler_cursor(cursor: str) -> dict:
+    try:
+        texto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        conteudo = json.loads(texto)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    if not isinstance(conteudo, dict):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return conteudo
+
+def decodificar_cursor(cursor: str, ordenacao: Ordenacao):
+    """Valor e chave da última linha da página anterior"""
+    conteudo = _ler_cursor(cursor)
+    try:
+        coluna, descendente, valor, chave = conteudo["c"], conteudo["d"], conteudo["v"], conteudo["k"]
+    except KeyError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    if coluna != ordenacao.nome_coluna or bool(descendente) != ordenacao.descendente:
+        raise HTTPException(status_code=400, detail="Cursor não corresponde à ordenação pedida")
+    if not _valor_valido(valor, ordenacao) or not _do_tipo(chave, ordenacao.chave.type.python_type):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return valor, chave
+
+def _valor_valido(valor, ordenacao: Ordenacao) -> bool:
+    """Valor do tipo da coluna de ordenação; nulo só se ela for anulável"""
+    if valor is None:
+        return ordenacao.anulavel
+    try:
+        tipo = ordenacao.coluna.type.python_type
+    except NotImplementedError:
+        return isinstance(valor, (str, int, float)) and not isinstance(valor, bool)
+    return _do_tipo(valor, tipo)
+
+def _do_tipo(valor, tipo: type) -> bool:
+    if isinstance(valor, bool):
+        return False
+    if tipo is float:
+        return isinstance(valor, (int, float))
+    return isinstance(valor, tipo)
+
+def total_do_cursor(cursor: str) -> Optional[int]:
+    """Total levado pelo cursor, se contado na versão atual do dataset"""
+    conteudo = _ler_cursor(cursor)
+    total, versao = conteudo.get("t"), conteudo.get("s")
+    if not _do_tipo(total, int) or total < 0:
+        return None
+    if versao is None or versao != get_dataset_version():
+        return None
+    return total
+
+def _seek(ordenacao: Ordenacao, valor, chave):
+    coluna, pk = ordenacao.coluna, ordenacao.chave
+    if not ordenacao.anulavel:
+        if ordenacao.descendente:
+            return tuple_(coluna, pk) < tuple_(valor, chave)
+        return tuple_(coluna, pk) > tuple_(valor, chave)
+
+    # Colunas anuláveis: nulos ficam no fim nas duas direções, então a
+    # comparação de tuplas (que não trata NULL) é expandida
+    depois_da_chave = pk < chave if ordenacao.descendente else pk > chave
+    if valor is None:
+        return and_(coluna.is_(None), depois_da_chave)
+    depois_do_valor = coluna < valor if ordenacao.descendente else coluna > valor
+    return or_(depois_do_valor, and_(coluna == valor, depois_da_chave), coluna.is_(None))
+
+def aplicar(query: Query, ordenacao: Ordenacao, cursor: Optional[str] = None) -> Query:
+    """Aplica a ordenação (com desempate pela chave) e, havendo cursor, o seek"""
+    if cursor:
+        query = query.filter(_seek(ordenacao, *decodificar_cursor(cursor, ordenacao)))
+    direcao = desc if ordenacao.descendente else asc
+    ordem_coluna = direcao(ordenacao.coluna)
+    if ordenacao.anulavel:
+        ordem_coluna = ordem_coluna.nulls_last()
+    return query.order_by(ordem_coluna, direcao(ordenacao.chave))
+
+def _chave_contagem(query: Query) -> Optional[Tuple[int, str]]:
+    versao = get_dataset_version()
+    if versao is None:
+        return None
+    compilada = query.statement.compile()
+    parametros = json.dumps(compilada.params, sort_keys=True, default=str)
+    return versao, f"{compilada}|{parametros}"
+
+def _contagem_em_cache(chave: Optional[Tuple[int, str]]) -> Optional[int]:
+    if chave is None:
+        return None
+    with _contagens_lock:
+        total = _contagens.get(chave)
+        if total is not None:
+            _contagens.move_to_end(chave)
+        return total
+
+def _guardar_contagem(chave: Optional[Tuple[int, str]], total: int) -> None:
+    if chave is None:
+        return
+    with _contagens_lock:
+        _contagens[chave] = total
+        while len(_contagens) > CONTAGENS_MAXSIZE:
+            _contagens.popitem(last=False)
+
+def contar_total(query: Query) -> int:
+    """Total de linhas da consulta, em cache por versão do dataset"""
+    chave = _chave_contagem(query)
+    total = _contagem_em_cache(chave)
+    if total is None:
+        total = query.order_by(None).count()
+        _guardar_contagem(chave, total)
+    return total
+
+def limpar_contagens(ano: Optional[int] = None) -> None:
+    with _contagens_lock:
+        _contagens.clear()
+
+register_invalidation_listener(limpar_contagens)
+
+def paginar(query: Query, ordenacao: Ordenacao, skip: int, limit: int,
+            cursor: Optional[str] = None, contar: bool = False) -> ResultadoPaginado:
+    """
+    Executa a listagem lendo uma linha além do limite para saber se existe
+    página seguinte. `skip` continua aceito (aplicado depois do seek).
+
+    Com `contar`, o total vem do cache de contagens, do próprio cursor (se
+    contado na versão atual do dataset) ou, na primeira página, de
+    `COUNT(*) OVER()` na mesma consulta. Só quando nada disso é possível
+    (cursor de outra versão ou `skip` além do fim sem total em cache) é
+    feita uma contagem à parte, guardada para as páginas seguintes.
+    """
+    paginada = aplicar(query, ordenacao, cursor)
+    total = None
+    if contar:
+        chave = _chave_contagem(query)
+        total = _contagem_em_cache(chave)
+        if total is None and cursor:
+            total = total_do_cursor(cursor)
+
+    # Colunas extras lidas junto com as entidades: o valor da ordenação
+    # calculada (para o cursor) e o total da janela
+    extras = []
+    if ordenacao.calculada:
+        extras.append(ordenacao.coluna)
+    contar_na_consulta = contar and total is None and not cursor
+    if contar_na_consulta:
+        extras.append(func.count().over())
+
+    if extras:
+        linhas_com_extras = paginada.add_columns(*extras).offset(skip).limit(limit + 1).all()
+        linhas: List = [linha[0] for linha in linhas_com_extras]
+        valores = [linha[1] for linha in linhas_com_extras] if ordenacao.calculada else None
+        if contar_na_consulta:
+            if linhas_com_extras:
+                total = linhas_com_extras[0][-1]
+            elif skip == 0:
+                total = 0
+    else:
+        linhas = paginada.offset(skip).limit(limit + 1).all()
+        valores = None
+
+    if contar and total is None:
+        total = query.order_by(None).count()
+    if contar:
+        _guardar_contagem(chave, total)
+
+    if len(linhas) <= limit:
+        return ResultadoPaginado(linhas, total=total)
+    itens = linhas[:limit]
+    ultimo = itens[-1]
+    valor = valores[limit - 1] if valores is not None else getattr(ultimo, ordenacao.coluna.key)
+    proximo = codificar_cursor(ordenacao, valor, getattr(ultimo, ordenacao.chave.key), total)
+    return ResultadoPaginado(itens, proximo, total)
+
+def pagina(resultado: ResultadoPaginado) -> dict:
+    """Envelope `schemas.Pagina` de um resultado obtido com `contar=True`"""
+    return {
+        "itens": resultado,
+        "total": resultado.total,
+        "proximo_cursor": resultado.proximo_cursor,
+        "tem_mais": resultado.tem_mais
+    }
+
+def definir_cabecalho(response: Response, resultado: ResultadoPaginado) -> None:
+    if resultado.proximo_cursor:
+        response.headers[CABECALHO_PROXIMO_CURSOR] = resultado.proximo_cursor
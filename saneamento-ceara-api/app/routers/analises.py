@@ -1,11 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.encoders import jsonable_encoder
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Callable, Iterable, List, Optional
+import json
 from app import crud, schemas
+from app.analytics import get_analises_backend
+from app.cache import response_cache
 from app.database import get_db
 
 router = APIRouter(prefix="/analises", tags=["analises"])
 
+def _resposta_cacheada(chave: str, tags: Iterable[str], produzir: Callable[[], object]) -> Response:
+    """
+    Devolve a resposta serializada do cache ou a produz, serializa e armazena.
+    `produzir` só é chamado em caso de miss e deve retornar um objeto serializável.
+    """
+    conteudo = response_cache.get(chave)
+    if conteudo is None:
+        conteudo = json.dumps(jsonable_encoder(produzir()), ensure_ascii=False).encode("utf-8")
+        response_cache.set(chave, conteudo, tags)
+    return Response(content=conteudo, media_type="application/json")
+
 @router.get("/ranking", response_model=schemas.RankingResponse)
 def obter_ranking(
     indicador: str = Query(..., description="Indicador para ranking (ex: indice_atendimento_agua)"),
@@ -13,6 +28,8 @@ def obter_ranking(
     ordem: str = Query("desc", description="Ordem do ranking (asc/desc)"),
     limit: int = Query(10, ge=1, le=100, description="Número de posições no ranking"),
     municipio_id: Optional[str] = Query(None, description="ID do município para buscar posição específica"),
+    empate: str = Query("row_number", pattern="^(rank|dense_rank|row_number)$", description="Política de empate (rank/dense_rank/row_number)"),
+    nulos: str = Query("excluir", pattern="^(excluir|inicio|fim)$", description="Tratamento de valores nulos (excluir/inicio/fim)"),
     db: Session = Depends(get_db)
 ):
     """
@@ -23,21 +40,38 @@ def obter_ranking(
     - indice_coleta_esgoto: Índice de coleta de esgoto (%)
     - indice_tratamento_esgoto: Índice de tratamento de esgoto (%)
     - indice_perda_faturamento: Índice de perda de faturamento (%)
+
+    Políticas de empate:
+    - row_number: posições únicas, desempate pelo código do município
+    - rank: empatados dividem a posição e a seguinte é pulada
+    - dense_rank: empatados dividem a posição sem pular a seguinte
     """
-    try:
-        if ano is None:
-            ano = crud.get_ultimo_ano_dados(db)
-        
-        ranking_data = crud.get_ranking_indicador(
+    chave = response_cache.make_key(
+        "ranking", indicador=indicador, ano=ano, ordem=ordem, limit=limit,
+        municipio_id=municipio_id, empate=empate, nulos=nulos
+    )
+
+    # Sem ano explícito a resposta depende do ano mais recente
+    tags = ["ultimo_ano"] if ano is None else []
+
+    def produzir():
+        backend = get_analises_backend()
+        ano_referencia = ano if ano is not None else backend.get_ultimo_ano_dados(db)
+        tags.append(f"ano:{ano_referencia}")
+        ranking_data = backend.get_ranking_indicador(
             db=db,
-            ano=ano,
+            ano=ano_referencia,
             indicador=indicador,
             ordem=ordem,
             limit=limit,
-            municipio_id=municipio_id
+            municipio_id=municipio_id,
+            empate=empate,
+            nulos=nulos
         )
-        
-        return ranking_data
+        return schemas.RankingResponse(**ranking_data)
+
+    try:
+        return _resposta_cacheada(chave, tags, produzir)
     except HTTPException:
         raise
     except Exception as e:
@@ -58,27 +92,74 @@ def obter_evolucao_indicadores(
     - indice_tratamento_esgoto: Índice de tratamento de esgoto (%)
     - indice_perda_faturamento: Índice de perda de faturamento (%)
     """
-    # Verificar se o município existe
-    municipio = crud.get_municipio(db=db, id_municipio=municipio_id)
-    if not municipio:
-        raise HTTPException(status_code=404, detail="Município não encontrado")
-    
     # Converter string de indicadores em lista
     indicadores_list = None
     if indicadores:
         indicadores_list = [ind.strip() for ind in indicadores.split(",")]
+
+    chave = response_cache.make_key("evolucao", municipio_id=municipio_id, indicadores=indicadores_list)
+    conteudo = response_cache.get(chave)
+    if conteudo is not None:
+        return Response(content=conteudo, media_type="application/json")
+
+    # Verificar se o município existe
+    municipio = crud.get_municipio(db=db, id_municipio=municipio_id)
+    if not municipio:
+        raise HTTPException(status_code=404, detail="Município não encontrado")
     
     try:
-        evolucao_data = crud.get_evolucao_indicadores(
+        evolucao_data = get_analises_backend().get_evolucao_indicadores(
             db=db,
             municipio_id=municipio_id,
             indicadores=indicadores_list
         )
         
-        return schemas.EvolucaoResponse(
+        resposta = schemas.EvolucaoResponse(
             municipio=municipio,
             indicadores=evolucao_data
         )
+        return _resposta_cacheada(chave, [f"municipio:{municipio_id}"], lambda: resposta)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
+
+@router.get("/evolucao/lote", response_model=schemas.EvolucaoLoteResponse)
+def obter_evolucao_lote(
+    municipio_ids: str = Query(..., description="Códigos IBGE separados por vírgula, ou 'todos'"),
+    indicadores: Optional[str] = Query(None, description="Lista de indicadores separados por vírgula"),
+    db: Session = Depends(get_db)
+):
+    """
+    Retorna a evolução de indicadores para vários municípios em uma única consulta.
+
+    A resposta é um mapa por município com a lista de anos e uma série de
+    valores (alinhada aos anos) para cada indicador.
+    """
+    ids_list = None
+    if municipio_ids.strip().lower() != "todos":
+        ids_list = sorted({codigo.strip() for codigo in municipio_ids.split(",") if codigo.strip()})
+        if not ids_list:
+            raise HTTPException(status_code=400, detail="Informe ao menos um município")
+
+    indicadores_list = None
+    if indicadores:
+        # Sem repetições, na ordem pedida (que é a ordem das séries na resposta)
+        indicadores_list = list(dict.fromkeys(ind.strip() for ind in indicadores.split(",") if ind.strip()))
+
+    # make_key ordena listas; a ordem dos indicadores faz parte da resposta
+    chave = response_cache.make_key(
+        "evolucao-lote",
+        municipio_ids=ids_list,
+        indicadores=",".join(indicadores_list) if indicadores_list else None
+    )
+    tags = ["todos"] if ids_list is None else [f"municipio:{codigo}" for codigo in ids_list]
+    try:
+        return _resposta_cacheada(
+            chave,
+            tags,
+            lambda: get_analises_backend().get_evolucao_indicadores_lote(db=db, municipio_ids=ids_list, indicadores=indicadores_list)
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
 
@@ -90,8 +171,17 @@ def obter_indicadores_principais(
     """
     Retorna as médias dos indicadores principais para um ano específico.
     """
+    chave = response_cache.make_key("indicadores-principais", ano=ano)
+    tags = ["ultimo_ano"] if ano is None else []
+
+    def produzir():
+        backend = get_analises_backend()
+        ano_referencia = ano if ano is not None else backend.get_ultimo_ano_dados(db)
+        tags.append(f"ano:{ano_referencia}")
+        return backend.get_indicadores_principais(db=db, ano=ano_referencia)
+
     try:
-        return crud.get_indicadores_principais(db=db, ano=ano)
+        return _resposta_cacheada(chave, tags, produzir)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
 
@@ -100,39 +190,95 @@ def obter_evolucao_temporal(db: Session = Depends(get_db)):
     """
     Retorna a evolução temporal dos indicadores médios ao longo dos anos.
     """
+    chave = response_cache.make_key("evolucao-temporal")
     try:
-        return crud.get_evolucao_temporal(db=db)
+        return _resposta_cacheada(chave, ["todos"], lambda: get_analises_backend().get_evolucao_temporal(db=db))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
 
-# Endpoints comentados - funções não implementadas no CRUD
-# @router.get("/comparativo", response_model=schemas.ComparativoResponse)
-# def obter_comparativo_municipios(
-#     ano: Optional[int] = Query(None, description="Ano de referência (padrão: mais recente)"),
-#     ids_municipios: Optional[str] = Query(None, description="Lista de códigos IBGE dos municípios separados por vírgula"),
-#     db: Session = Depends(get_db)
-# ):
-#     """
-#     Compara os dados de múltiplos municípios em um ano específico.
-#     """
-#     try:
-#         if ano is None:
-#             ano = crud.get_ultimo_ano_dados(db)
-#         
-#         if ids_municipios:
-#             ids_list = [id.strip() for id in ids_municipios.split(",")]
-#             # Implementar filtro por municípios específicos se necessário
-#             pass
-#         
-#         municipios_data = crud.get_municipios_comparacao(db=db, ano=ano)
-#         
-#         return schemas.ComparativoResponse(
-#             ano=ano,
-#             municipios=municipios_data
-#         )
-#     except Exception as e:
-#         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
+@router.get("/cache/estatisticas")
+def obter_estatisticas_cache():
+    """
+    Retorna os contadores do cache de respostas das análises (hits, misses, evictions).
+    """
+    return response_cache.stats()
+
+@router.get("/comparativo", response_model=schemas.ComparativoResponse)
+def obter_comparativo_municipios(
+    ano: Optional[int] = Query(None, description="Ano de referência (padrão: mais recente)"),
+    ids_municipios: Optional[str] = Query(None, description="Lista de códigos IBGE dos municípios separados por vírgula"),
+    campos: Optional[str] = Query(None, description="Colunas de indicadores, recursos hídricos e financeiro separadas por vírgula"),
+    skip: int = Query(0, ge=0, description="Número de registros para pular"),
+    limit: int = Query(100, ge=1, le=1000, description="Número máximo de registros a retornar"),
+    db: Session = Depends(get_db)
+):
+    """
+    Compara os dados de múltiplos municípios em um ano específico.
+    """
+    try:
+        if ano is None:
+            ano = crud.get_ultimo_ano_dados(db)
+        
+        ids_list = None
+        if ids_municipios:
+            ids_list = [id.strip() for id in ids_municipios.split(",") if id.strip()]
+
+        campos_list = None
+        if campos:
+            campos_list = [campo.strip() for campo in campos.split(",") if campo.strip()]
+        
+        return crud.get_municipios_comparacao(
+            db=db,
+            ano=ano,
+            municipio_ids=ids_list,
+            campos=campos_list,
+            skip=skip,
+            limit=limit
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
+
+@router.get("/distribuicao", response_model=schemas.DistribuicaoResponse)
+def obter_distribuicao(
+    anos: Optional[str] = Query(None, description="Anos separados por vírgula (padrão: mais recente)"),
+    campos: Optional[str] = Query(None, description="Colunas de indicadores, recursos hídricos e financeiro separadas por vírgula"),
+    bins: int = Query(10, ge=1, le=100, description="Número de faixas do histograma"),
+    db: Session = Depends(get_db)
+):
+    """
+    Retorna estatísticas de distribuição (quantis, mínimo/máximo, desvio padrão,
+    nulos e histograma) de cada campo em cada ano.
+    """
+    try:
+        anos_list = None
+        if anos:
+            try:
+                anos_list = sorted({int(ano.strip()) for ano in anos.split(",") if ano.strip()})
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Anos devem ser números inteiros")
+
+        campos_list = None
+        if campos:
+            campos_list = [campo.strip() for campo in campos.split(",") if campo.strip()]
+
+        chave = response_cache.make_key("distribuicao", anos=anos_list, campos=campos_list, bins=bins)
+        tags = ["ultimo_ano"] if not anos_list else [f"ano:{ano}" for ano in anos_list]
+
+        def produzir():
+            backend = get_analises_backend()
+            anos_referencia = anos_list or [backend.get_ultimo_ano_dados(db)]
+            tags.extend(f"ano:{ano}" for ano in anos_referencia)
+            return backend.get_distribuicao_indicadores(db=db, anos=anos_referencia, campos=campos_list, bins=bins)
+
+        return _resposta_cacheada(chave, tags, produzir)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
 
+# Endpoints comentados - funções não implementadas no CRUD
 # @router.get("/sustentabilidade-financeira", response_model=schemas.SustentabilidadeResponse)
 # def obter_sustentabilidade_financeira(
 #     ano: Optional[int] = Query(None, description="Ano de referência (padrão: mais recente)"),
@@ -155,24 +301,34 @@ def obter_evolucao_temporal(db: Session = Depends(get_db)):
 #     except Exception as e:
 #         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
 
-# @router.get("/eficiencia-hidrica", response_model=schemas.EficienciaHidricaResponse)
-# def obter_eficiencia_hidrica(
-#     ano: Optional[int] = Query(None, description="Ano de referência (padrão: mais recente)"),
-#     db: Session = Depends(get_db)
-# ):
-#     """
-#     Retorna análise de eficiência hídrica dos municípios.
-#     """
-#     try:
-#         if ano is None:
-#             ano = crud.get_ultimo_ano_dados(db)
-#         
-#         dados = crud.get_analise_eficiencia_hidrica(db=db, ano=ano)
-#         
-#         return schemas.EficienciaHidricaResponse(
-#             ano=ano,
-#             mais_eficientes=dados["mais_eficientes"],
-#             menos_eficientes=dados["menos_eficientes"]
-#         )
-#     except Exception as e:
-#         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}") 
\ No newline at end of file
+@router.get("/eficiencia-hidrica", response_model=schemas.EficienciaHidricaResponse)
+def obter_eficiencia_hidrica(
+    ano: Optional[int] = Query(None, description="Ano de referência (padrão: mais recente)"),
+    limit: int = Query(10, ge=1, le=100, description="Número de municípios em cada lista"),
+    db: Session = Depends(get_db)
+):
+    """
+    Retorna análise de eficiência hídrica dos municípios.
+
+    A eficiência é o percentual do volume produzido que foi faturado; a perda
+    é o complemento (100 - eficiência).
+    """
+    chave = response_cache.make_key("eficiencia-hidrica", ano=ano, limit=limit)
+    tags = ["ultimo_ano"] if ano is None else []
+
+    def produzir():
+        ano_referencia = ano if ano is not None else crud.get_ultimo_ano_dados(db)
+        tags.append(f"ano:{ano_referencia}")
+        dados = crud.get_analise_eficiencia_hidrica(db=db, ano=ano_referencia, limit=limit)
+        return schemas.EficienciaHidricaResponse(
+            ano=ano_referencia,
+            mais_eficientes=dados["mais_eficientes"],
+            menos_eficientes=dados["menos_eficientes"]
+        )
+
+    try:
+        return _resposta_cacheada(chave, tags, produzir)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
@@ -1,13 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Union
 from app.database import get_db
-from app import crud, schemas
+from app import crud, paginacao, schemas
+from app.campos import resolver_campos, resposta_parcial
 
 router = APIRouter(prefix="/financeiro", tags=["financeiro"])
 
-@router.get("/", response_model=List[schemas.FinanceiroList])
+@router.get("/", response_model=Union[schemas.Pagina[schemas.FinanceiroList], List[schemas.FinanceiroList]])
 def read_financeiro(
+    response: Response,
     skip: int = Query(0, ge=0, description="Número de registros para pular"),
     limit: int = Query(100, ge=1, le=1000, description="Número máximo de registros a retornar"),
     indicador_id: Optional[int] = Query(None, gt=0, description="ID do indicador"),
@@ -15,11 +17,15 @@ def read_financeiro(
     receita_max: Optional[float] = Query(None, ge=0, description="Receita máxima"),
     order_by: Optional[str] = Query(None, description="Campo para ordenação"),
     order_direction: str = Query("asc", pattern="^(asc|desc)$", description="Direção da ordenação"),
+    cursor: Optional[str] = Query(None, description="Cursor da próxima página (cabeçalho X-Proximo-Cursor da resposta anterior)"),
+    envelope: bool = Query(False, description="Retorna {itens, total, proximo_cursor, tem_mais} em vez da lista"),
+    fields: Optional[str] = Query(None, description="Campos a retornar, separados por vírgula (ex: ano,indice_coleta_esgoto)"),
     db: Session = Depends(get_db)
 ):
     """
     Lista todos os registros financeiros com filtros opcionais.
     """
+    campos = resolver_campos(schemas.FinanceiroList, fields)
     financeiro = crud.get_financeiro_list(
         db,
         skip=skip,
@@ -28,18 +34,33 @@ def read_financeiro(
         receita_min=receita_min,
         receita_max=receita_max,
         order_by=order_by,
-        order_direction=order_direction
+        order_direction=order_direction,
+        cursor=cursor,
+        contar=envelope,
+        campos=campos
     )
+    if campos:
+        return resposta_parcial(schemas.FinanceiroList, campos, financeiro, envelope)
+    paginacao.definir_cabecalho(response, financeiro)
+    if envelope:
+        return paginacao.pagina(financeiro)
     return financeiro
 
 @router.get("/{financeiro_id}", response_model=schemas.Financeiro)
-def read_financeiro_by_id(financeiro_id: int, db: Session = Depends(get_db)):
+def read_financeiro_by_id(
+    financeiro_id: int,
+    fields: Optional[str] = Query(None, description="Campos a retornar, separados por vírgula"),
+    db: Session = Depends(get_db)
+):
     """
     Obtém um registro financeiro específico por ID.
     """
-    financeiro = crud.get_financeiro(db, financeiro_id=financeiro_id)
+    campos = resolver_campos(schemas.Financeiro, fields)
+    financeiro = crud.get_financeiro(db, financeiro_id=financeiro_id, campos=campos)
     if financeiro is None:
         raise HTTPException(status_code=404, detail="Registro financeiro não encontrado")
+    if campos:
+        return resposta_parcial(schemas.Financeiro, campos, financeiro)
     return financeiro
 
 @router.get("/indicador/{indicador_id}", response_model=schemas.Financeiro)
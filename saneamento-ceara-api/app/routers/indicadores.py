@@ -1,13 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Union
 from app.database import get_db
-from app import crud, schemas
+from app import crud, paginacao, schemas
+from app.campos import resolver_campos, resposta_parcial
 
 router = APIRouter(prefix="/indicadores", tags=["indicadores"])
 
-@router.get("/", response_model=List[schemas.IndicadoresDesempenhoList])
+@router.get("/", response_model=Union[schemas.Pagina[schemas.IndicadoresDesempenhoList], List[schemas.IndicadoresDesempenhoList]])
 def read_indicadores(
+    response: Response,
     skip: int = Query(0, ge=0, description="Número de registros para pular"),
     limit: int = Query(100, ge=1, le=1000, description="Número máximo de registros a retornar"),
     ano_inicio: Optional[int] = Query(None, ge=1900, le=2100, description="Ano inicial"),
@@ -16,11 +18,15 @@ def read_indicadores(
     prestador_id: Optional[int] = Query(None, gt=0, description="ID do prestador"),
     order_by: Optional[str] = Query(None, description="Campo para ordenação"),
     order_direction: str = Query("desc", pattern="^(asc|desc)$", description="Direção da ordenação"),
+    cursor: Optional[str] = Query(None, description="Cursor da próxima página (cabeçalho X-Proximo-Cursor da resposta anterior)"),
+    envelope: bool = Query(False, description="Retorna {itens, total, proximo_cursor, tem_mais} em vez da lista"),
+    fields: Optional[str] = Query(None, description="Campos a retornar, separados por vírgula (ex: ano,indice_coleta_esgoto)"),
     db: Session = Depends(get_db)
 ):
     """
     Lista todos os indicadores de desempenho com filtros opcionais.
     """
+    campos = resolver_campos(schemas.IndicadoresDesempenhoList, fields)
     indicadores = crud.get_indicadores(
         db,
         skip=skip,
@@ -30,18 +36,33 @@ def read_indicadores(
         municipio_id=municipio_id,
         prestador_id=prestador_id,
         order_by=order_by,
-        order_direction=order_direction
+        order_direction=order_direction,
+        cursor=cursor,
+        contar=envelope,
+        campos=campos
     )
+    if campos:
+        return resposta_parcial(schemas.IndicadoresDesempenhoList, campos, indicadores, envelope)
+    paginacao.definir_cabecalho(response, indicadores)
+    if envelope:
+        return paginacao.pagina(indicadores)
     return indicadores
 
 @router.get("/{indicador_id}", response_model=schemas.IndicadoresCompleto)
-def read_indicador(indicador_id: int, db: Session = Depends(get_db)):
+def read_indicador(
+    indicador_id: int,
+    fields: Optional[str] = Query(None, description="Campos a retornar, separados por vírgula"),
+    db: Session = Depends(get_db)
+):
     """
     Obtém um indicador de desempenho específico por ID, incluindo dados de recursos hídricos e financeiro.
     """
-    indicador = crud.get_indicador(db, indicador_id=indicador_id)
+    campos = resolver_campos(schemas.IndicadoresCompleto, fields)
+    indicador = crud.get_indicador(db, indicador_id=indicador_id, campos=campos)
     if indicador is None:
         raise HTTPException(status_code=404, detail="Indicador de desempenho não encontrado")
+    if campos:
+        return resposta_parcial(schemas.IndicadoresCompleto, campos, indicador)
     
     # Os dados relacionados já foram carregados via joinedload na função get_indicador
     # Apenas precisamos criar a resposta usando os dados já carregados
@@ -69,20 +90,15 @@ def create_indicador(indicador: schemas.IndicadoresDesempenhoCreate, db: Session
     """
     Cria um novo indicador de desempenho.
     """
-    # Verificar se já existe um indicador para o mesmo ano, município e prestador
-    existing = db.query(crud.models.IndicadoresDesempenhoAnual).filter(
-        crud.models.IndicadoresDesempenhoAnual.ano == indicador.ano,
-        crud.models.IndicadoresDesempenhoAnual.municipio_id == indicador.municipio_id,
-        crud.models.IndicadoresDesempenhoAnual.prestador_id == indicador.prestador_id
-    ).first()
-    
-    if existing:
+    # INSERT ... ON CONFLICT DO NOTHING: a unicidade (ano, município, prestador)
+    # é verificada pelo banco na mesma instrução
+    db_indicador = crud.upsert_indicadores(db=db, indicadores=indicador, atualizar=False)
+    if db_indicador is None:
         raise HTTPException(
             status_code=400, 
             detail="Já existe um indicador para este ano, município e prestador"
         )
-    
-    return crud.create_indicadores(db=db, indicadores=indicador)
+    return db_indicador
 
 @router.put("/{indicador_id}", response_model=schemas.IndicadoresDesempenho)
 def update_indicador(
@@ -1,25 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Union
 from app.database import get_db
-from app import crud, schemas
+from app import crud, paginacao, schemas
+from app.campos import resolver_campos, resposta_parcial
+from app.autocomplete import indice_municipios
 
 router = APIRouter(prefix="/municipios", tags=["municipios"])
 
-@router.get("/", response_model=List[schemas.MunicipioList])
+@router.get("/", response_model=Union[schemas.Pagina[schemas.MunicipioList], List[schemas.MunicipioList]])
 def read_municipios(
+    response: Response,
     skip: int = Query(0, ge=0, description="Número de registros para pular"),
     limit: int = Query(100, ge=1, le=1000, description="Número máximo de registros a retornar"),
-    nome: Optional[str] = Query(None, description="Filtrar por nome do município"),
+    nome: Optional[str] = Query(None, description="Buscar por nome do município (ignora acentos; sem order_by, ordena por relevância)"),
     populacao_min: Optional[int] = Query(None, ge=0, description="População mínima"),
     populacao_max: Optional[int] = Query(None, ge=0, description="População máxima"),
     order_by: Optional[str] = Query(None, description="Campo para ordenação"),
     order_direction: str = Query("asc", pattern="^(asc|desc)$", description="Direção da ordenação"),
+    cursor: Optional[str] = Query(None, description="Cursor da próxima página (cabeçalho X-Proximo-Cursor da resposta anterior)"),
+    envelope: bool = Query(False, description="Retorna {itens, total, proximo_cursor, tem_mais} em vez da lista"),
+    fields: Optional[str] = Query(None, description="Campos a retornar, separados por vírgula (ex: ano,indice_coleta_esgoto)"),
     db: Session = Depends(get_db)
 ):
     """
     Lista todos os municípios com filtros opcionais.
     """
+    campos = resolver_campos(schemas.MunicipioList, fields)
     municipios = crud.get_municipios(
         db, 
         skip=skip, 
@@ -28,18 +35,45 @@ def read_municipios(
         populacao_min=populacao_min,
         populacao_max=populacao_max,
         order_by=order_by,
-        order_direction=order_direction
+        order_direction=order_direction,
+        cursor=cursor,
+        contar=envelope,
+        campos=campos
     )
+    if campos:
+        return resposta_parcial(schemas.MunicipioList, campos, municipios, envelope)
+    paginacao.definir_cabecalho(response, municipios)
+    if envelope:
+        return paginacao.pagina(municipios)
     return municipios
 
+@router.get("/autocomplete", response_model=List[schemas.MunicipioAutocomplete])
+def autocomplete_municipios(
+    q: str = Query(..., min_length=1, max_length=100, description="Início de qualquer palavra do nome (ignora acentos)"),
+    limite: int = Query(10, ge=1, le=50, description="Número máximo de sugestões"),
+    db: Session = Depends(get_db)
+):
+    """
+    Sugestões de municípios para campos de busca, servidas de um índice em
+    memória (sem consulta ao banco), ordenadas por população.
+    """
+    return indice_municipios.buscar(db, q, limite)
+
 @router.get("/{id_municipio}", response_model=schemas.Municipio)
-def read_municipio(id_municipio: str, db: Session = Depends(get_db)):
+def read_municipio(
+    id_municipio: str,
+    fields: Optional[str] = Query(None, description="Campos a retornar, separados por vírgula"),
+    db: Session = Depends(get_db)
+):
     """
     Obtém um município específico por ID.
     """
-    municipio = crud.get_municipio(db, id_municipio=id_municipio)
+    campos = resolver_campos(schemas.Municipio, fields)
+    municipio = crud.get_municipio(db, id_municipio=id_municipio, campos=campos)
     if municipio is None:
         raise HTTPException(status_code=404, detail="Município não encontrado")
+    if campos:
+        return resposta_parcial(schemas.Municipio, campos, municipio)
     return municipio
 
 @router.post("/", response_model=schemas.Municipio, status_code=201)
@@ -77,12 +111,14 @@ def delete_municipio(id_municipio: str, db: Session = Depends(get_db)):
 
 @router.get("/{id_municipio}/indicadores", response_model=List[schemas.IndicadoresCompleto])
 def read_indicadores_municipio(
+    response: Response,
     id_municipio: str,
     ano_inicio: Optional[int] = Query(None, ge=1900, le=2100, description="Ano inicial"),
     ano_fim: Optional[int] = Query(None, ge=1900, le=2100, description="Ano final"),
     prestador_id: Optional[int] = Query(None, gt=0, description="ID do prestador"),
     order_by: Optional[str] = Query(None, description="Campo para ordenação"),
     order_direction: str = Query("desc", pattern="^(asc|desc)$", description="Direção da ordenação"),
+    cursor: Optional[str] = Query(None, description="Cursor da próxima página (cabeçalho X-Proximo-Cursor da resposta anterior)"),
     db: Session = Depends(get_db)
 ):
     """
@@ -93,7 +129,7 @@ def read_indicadores_municipio(
     if municipio is None:
         raise HTTPException(status_code=404, detail="Município não encontrado")
     
-    # Buscar indicadores com filtros
+    # Indicadores, recursos hídricos e financeiro em uma única consulta
     indicadores = crud.get_indicadores(
         db,
         municipio_id=id_municipio,
@@ -101,20 +137,10 @@ def read_indicadores_municipio(
         ano_fim=ano_fim,
         prestador_id=prestador_id,
         order_by=order_by,
-        order_direction=order_direction
+        order_direction=order_direction,
+        completo=True,
+        cursor=cursor
     )
     
-    # Converter para IndicadoresCompleto
-    indicadores_completos = []
-    for indicador in indicadores:
-        recursos_hidricos = crud.get_recursos_hidricos_by_indicador(db, indicador.id)
-        financeiro = crud.get_financeiro_by_indicador(db, indicador.id)
-        
-        indicador_completo = schemas.IndicadoresCompleto(
-            **indicador.__dict__,
-            recursos_hidricos=recursos_hidricos,
-            financeiro=financeiro
-        )
-        indicadores_completos.append(indicador_completo)
-    
-    return indicadores_completos 
\ No newline at end of file
+    paginacao.definir_cabecalho(response, indicadores)
+    return indicadores 
\ No newline at end of file
@@ -1,25 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Union
 from app.database import get_db
-from app import crud, schemas
+from app import crud, paginacao, schemas
+from app.campos import resolver_campos, resposta_parcial
 
 router = APIRouter(prefix="/prestadores", tags=["prestadores"])
 
-@router.get("/", response_model=List[schemas.PrestadorServicoList])
+@router.get("/", response_model=Union[schemas.Pagina[schemas.PrestadorServicoList], List[schemas.PrestadorServicoList]])
 def read_prestadores(
+    response: Response,
     skip: int = Query(0, ge=0, description="Número de registros para pular"),
     limit: int = Query(100, ge=1, le=1000, description="Número máximo de registros a retornar"),
-    nome: Optional[str] = Query(None, description="Filtrar por nome do prestador"),
+    nome: Optional[str] = Query(None, description="Buscar por nome do prestador (ignora acentos; sem order_by, ordena por relevância)"),
     sigla: Optional[str] = Query(None, description="Filtrar por sigla"),
     natureza_juridica: Optional[str] = Query(None, description="Filtrar por natureza jurídica"),
     order_by: Optional[str] = Query(None, description="Campo para ordenação"),
     order_direction: str = Query("asc", pattern="^(asc|desc)$", description="Direção da ordenação"),
+    cursor: Optional[str] = Query(None, description="Cursor da próxima página (cabeçalho X-Proximo-Cursor da resposta anterior)"),
+    envelope: bool = Query(False, description="Retorna {itens, total, proximo_cursor, tem_mais} em vez da lista"),
+    fields: Optional[str] = Query(None, description="Campos a retornar, separados por vírgula (ex: ano,indice_coleta_esgoto)"),
     db: Session = Depends(get_db)
 ):
     """
     Lista todos os prestadores de serviço com filtros opcionais.
     """
+    campos = resolver_campos(schemas.PrestadorServicoList, fields)
     prestadores = crud.get_prestadores(
         db,
         skip=skip,
@@ -28,18 +34,33 @@ def read_prestadores(
         sigla=sigla,
         natureza_juridica=natureza_juridica,
         order_by=order_by,
-        order_direction=order_direction
+        order_direction=order_direction,
+        cursor=cursor,
+        contar=envelope,
+        campos=campos
     )
+    if campos:
+        return resposta_parcial(schemas.PrestadorServicoList, campos, prestadores, envelope)
+    paginacao.definir_cabecalho(response, prestadores)
+    if envelope:
+        return paginacao.pagina(prestadores)
     return prestadores
 
 @router.get("/{prestador_id}", response_model=schemas.PrestadorServico)
-def read_prestador(prestador_id: int, db: Session = Depends(get_db)):
+def read_prestador(
+    prestador_id: int,
+    fields: Optional[str] = Query(None, description="Campos a retornar, separados por vírgula"),
+    db: Session = Depends(get_db)
+):
     """
     Obtém um prestador de serviço específico por ID.
     """
-    prestador = crud.get_prestador(db, prestador_id=prestador_id)
+    campos = resolver_campos(schemas.PrestadorServico, fields)
+    prestador = crud.get_prestador(db, prestador_id=prestador_id, campos=campos)
     if prestador is None:
         raise HTTPException(status_code=404, detail="Prestador de serviço não encontrado")
+    if campos:
+        return resposta_parcial(schemas.PrestadorServico, campos, prestador)
     return prestador
 
 @router.get("/sigla/{sigla}", response_model=schemas.PrestadorServico)
@@ -88,12 +109,14 @@ def delete_prestador(prestador_id: int, db: Session = Depends(get_db)):
 
 @router.get("/{prestador_id}/indicadores", response_model=List[schemas.IndicadoresDesempenhoList])
 def read_indicadores_prestador(
+    response: Response,
     prestador_id: int,
     ano_inicio: Optional[int] = Query(None, ge=1900, le=2100, description="Ano inicial"),
     ano_fim: Optional[int] = Query(None, ge=1900, le=2100, description="Ano final"),
     municipio_id: Optional[str] = Query(None, description="ID do município"),
     order_by: Optional[str] = Query(None, description="Campo para ordenação"),
     order_direction: str = Query("desc", pattern="^(asc|desc)$", description="Direção da ordenação"),
+    cursor: Optional[str] = Query(None, description="Cursor da próxima página (cabeçalho X-Proximo-Cursor da resposta anterior)"),
     db: Session = Depends(get_db)
 ):
     """
@@ -112,7 +135,9 @@ def read_indicadores_prestador(
         ano_fim=ano_fim,
         municipio_id=municipio_id,
         order_by=order_by,
-        order_direction=order_direction
+        order_direction=order_direction,
+        cursor=cursor
     )
     
+    paginacao.definir_cabecalho(response, indicadores)
     return indicadores 
\ No newline at end of file
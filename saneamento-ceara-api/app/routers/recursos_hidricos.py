@@ -1,13 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Union
 from app.database import get_db
-from app import crud, schemas
+from app import crud, paginacao, schemas
+from app.campos import resolver_campos, resposta_parcial
 
 router = APIRouter(prefix="/recursos-hidricos", tags=["recursos-hidricos"])
 
-@router.get("/", response_model=List[schemas.RecursosHidricosList])
+@router.get("/", response_model=Union[schemas.Pagina[schemas.RecursosHidricosList], List[schemas.RecursosHidricosList]])
 def read_recursos_hidricos(
+    response: Response,
     skip: int = Query(0, ge=0, description="Número de registros para pular"),
     limit: int = Query(100, ge=1, le=1000, description="Número máximo de registros a retornar"),
     indicador_id: Optional[int] = Query(None, gt=0, description="ID do indicador"),
@@ -15,11 +17,15 @@ def read_recursos_hidricos(
     volume_max: Optional[float] = Query(None, ge=0, description="Volume máximo de água produzida"),
     order_by: Optional[str] = Query(None, description="Campo para ordenação"),
     order_direction: str = Query("asc", pattern="^(asc|desc)$", description="Direção da ordenação"),
+    cursor: Optional[str] = Query(None, description="Cursor da próxima página (cabeçalho X-Proximo-Cursor da resposta anterior)"),
+    envelope: bool = Query(False, description="Retorna {itens, total, proximo_cursor, tem_mais} em vez da lista"),
+    fields: Optional[str] = Query(None, description="Campos a retornar, separados por vírgula (ex: ano,indice_coleta_esgoto)"),
     db: Session = Depends(get_db)
 ):
     """
     Lista todos os registros de recursos hídricos com filtros opcionais.
     """
+    campos = resolver_campos(schemas.RecursosHidricosList, fields)
     recursos_hidricos = crud.get_recursos_hidricos_list(
         db,
         skip=skip,
@@ -28,18 +34,33 @@ def read_recursos_hidricos(
         volume_min=volume_min,
         volume_max=volume_max,
         order_by=order_by,
-        order_direction=order_direction
+        order_direction=order_direction,
+        cursor=cursor,
+        contar=envelope,
+        campos=campos
     )
+    if campos:
+        return resposta_parcial(schemas.RecursosHidricosList, campos, recursos_hidricos, envelope)
+    paginacao.definir_cabecalho(response, recursos_hidricos)
+    if envelope:
+        return paginacao.pagina(recursos_hidricos)
     return recursos_hidricos
 
 @router.get("/{recursos_id}", response_model=schemas.RecursosHidricos)
-def read_recursos_hidricos_by_id(recursos_id: int, db: Session = Depends(get_db)):
+def read_recursos_hidricos_by_id(
+    recursos_id: int,
+    fields: Optional[str] = Query(None, description="Campos a retornar, separados por vírgula"),
+    db: Session = Depends(get_db)
+):
     """
     Obtém um registro específico de recursos hídricos por ID.
     """
-    recursos_hidricos = crud.get_recursos_hidricos(db, recursos_id=recursos_id)
+    campos = resolver_campos(schemas.RecursosHidricos, fields)
+    recursos_hidricos = crud.get_recursos_hidricos(db, recursos_id=recursos_id, campos=campos)
     if recursos_hidricos is None:
         raise HTTPException(status_code=404, detail="Recursos hídricos não encontrados")
+    if campos:
+        return resposta_parcial(schemas.RecursosHidricos, campos, recursos_hidricos)
     return recursos_hidricos
 
 @router.get("/indicador/{indicador_id}", response_model=schemas.RecursosHidricos)
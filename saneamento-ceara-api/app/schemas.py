@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, validator
-from typing import Optional, List
+from typing import Generic, Optional, List, TypeVar, Union
 from datetime import date
 
 # Schemas para Municípios
@@ -46,6 +46,11 @@ class MunicipioList(BaseModel):
     class Config:
         from_attributes = True
 
+class MunicipioAutocomplete(BaseModel):
+    id_municipio: str
+    nome: str
+    populacao_total_estimada_2022: Optional[int]
+
 # Schemas para Prestadores de Serviço
 class PrestadorServicoBase(BaseModel):
     sigla: str = Field(..., min_length=1, max_length=20, description="Sigla do prestador")
@@ -247,6 +252,7 @@ class PosicaoEspecifica(BaseModel):
     posicao: Optional[int] = None
     total: int
     valor: Optional[float] = None
+    percentil: Optional[float] = None
 
 class RankingItem(BaseModel):
     posicao: int
@@ -267,14 +273,45 @@ class EvolucaoResponse(BaseModel):
     municipio: Municipio
     indicadores: dict[str, List[EvolucaoIndicador]]
 
+class SerieMunicipio(BaseModel):
+    anos: List[int]
+    series: dict[str, List[Optional[float]]]
+
+class EvolucaoLoteResponse(BaseModel):
+    indicadores: List[str]
+    municipios: dict[str, SerieMunicipio]
+
 class ComparativoItem(BaseModel):
-    municipio: Municipio
-    indicadores: IndicadoresCompleto
+    municipio: MunicipioList
+    indicadores: dict[str, Union[int, float, None]]
 
 class ComparativoResponse(BaseModel):
     ano: int
+    total: int
+    skip: int
+    limit: int
     municipios: List[ComparativoItem]
 
+class Histograma(BaseModel):
+    limites: List[float]
+    contagens: List[int]
+
+class DistribuicaoCampo(BaseModel):
+    ano: int
+    campo: str
+    total: int
+    nulos: int
+    minimo: Optional[float] = None
+    maximo: Optional[float] = None
+    media: Optional[float] = None
+    desvio_padrao: Optional[float] = None
+    quantis: dict[str, Optional[float]]
+    histograma: Optional[Histograma] = None
+
+class DistribuicaoResponse(BaseModel):
+    anos: List[int]
+    distribuicoes: List[DistribuicaoCampo]
+
 class SustentabilidadeFinanceira(BaseModel):
     municipio: Municipio
     receita: float
@@ -305,6 +342,14 @@ class PaginationParams(BaseModel):
     skip: int = Field(0, ge=0, description="Número de registros para pular")
     limit: int = Field(100, ge=1, le=1000, description="Número máximo de registros a retornar")
 
+T = TypeVar("T")
+
+class Pagina(BaseModel, Generic[T]):
+    itens: List[T]
+    total: int = Field(..., ge=0, description="Total de registros que atendem aos filtros")
+    proximo_cursor: Optional[str] = Field(None, description="Cursor da próxima página")
+    tem_mais: bool = Field(..., description="Indica se existe página seguinte")
+
 class MunicipioFilters(BaseModel):
     nome: Optional[str] = Field(None, description="Filtrar por nome do município")
     populacao_min: Optional[int] = Field(None, ge=0, description="População mínima")
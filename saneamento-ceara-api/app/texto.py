@@ -0,0 +1,53 @@
+"""
+Normalização de nomes e busca textual tolerante a acentos.
+
+No PostgreSQL a busca usa índices GIN de trigramas (pg_trgm) sobre a expressão
+`f_unaccent(lower(nome))`, criados pela migração 8b4f2d6a9c13: `LIKE '%termo%'`
+e o operador de similaridade de palavras `%>` (`nome %> termo`) são
+respondidos pelo índice, e os resultados podem ser ordenados por
+`word_similarity`. Nos demais bancos (SQLite nos testes) a busca usa a
+coluna-sombra `nome_normalizado`, mantida pelos modelos com `normalizar`, e
+uma relevância aproximada (igual > prefixo > início de palavra > trecho).
+"""
+
+import unicodedata
+from typing import Optional, Tuple
+
+from sqlalchemy import Float, case, cast, func, or_
+
+def normalizar(texto: Optional[str]) -> Optional[str]:
+    """Minúsculas, sem acentos e sem espaços repetidos ("São  Gonçalo" -> "sao goncalo")"""
+    if texto is None:
+        return None
+    decomposto = unicodedata.normalize("NFKD", texto.lower())
+    sem_acentos = "".join(c for c in decomposto if not unicodedata.combining(c))
+    return " ".join(sem_acentos.split())
+
+def _escapar_like(texto: str) -> str:
+    return texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def busca_por_nome(dialeto: str, coluna, coluna_normalizada, termo: str) -> Tuple:
+    """
+    Filtro e expressão de relevância (0 a 1, maior é melhor) para buscar
+    `termo` em `coluna` sem diferenciar acentos e maiúsculas.
+    """
+    termo = normalizar(termo)
+    padrao = f"%{_escapar_like(termo)}%"
+
+    if dialeto == "postgresql":
+        expressao = func.f_unaccent(func.lower(coluna))
+        filtro = or_(expressao.like(padrao, escape="\\"), expressao.op("%>")(termo))
+        # double precision: o valor volta sem perda no cursor da paginação
+        relevancia = cast(func.word_similarity(termo, expressao), Float)
+        return filtro, relevancia
+
+    prefixo = f"{_escapar_like(termo)}%"
+    inicio_palavra = f"% {_escapar_like(termo)}%"
+    filtro = coluna_normalizada.like(padrao, escape="\\")
+    relevancia = case(
+        (coluna_normalizada == termo, 1.0),
+        (coluna_normalizada.like(prefixo, escape="\\"), 0.75),
+        (coluna_normalizada.like(inicio_palavra, escape="\\"), 0.5),
+        else_=0.25
+    )
+    return filtro, relevancia
@@ -0,0 +1,112 @@
+import hashlib
+import os
+import threading
+import time
+from typing import Optional
+from urllib.parse import parse_qsl
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app import models
+from app.cache import invalidate_dataset
+from app.database import engine
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Intervalo máximo (segundos) entre leituras da versão no banco; escritas feitas
+# por este processo atualizam a versão local imediatamente
+DATASET_VERSION_TTL = float(os.getenv("DATASET_VERSION_TTL", "2"))
+
+_lock = threading.Lock()
+_versao_local: Optional[int] = None
+_lida_em = 0.0
+
+def bump_dataset_version(db: Session) -> int:
+    """
+    Incrementa a versão do dataset dentro da transação corrente (sem commit).
+    Depois do commit, chame `publish_dataset_version` com o valor retornado.
+    """
+    versao = db.execute(
+        update(models.VersaoDataset)
+        .where(models.VersaoDataset.id == 1)
+        .values(versao=models.VersaoDataset.versao + 1)
+        .returning(models.VersaoDataset.versao)
+    ).scalar()
+    if versao is None:
+        db.add(models.VersaoDataset(id=1, versao=1))
+        db.flush()
+        versao = 1
+    return versao
+
+def bump_dataset_version_if_changed(db: Session, escritas: int = 0) -> Optional[int]:
+    """
+    Incrementa a versão do dataset (sem commit) apenas se a sessão tem objetos
+    novos, removidos ou com valores alterados, ou se `escritas` (linhas gravadas
+    fora do ORM) for maior que zero. Retorna a nova versão ou None.
+    """
+    alterada = bool(db.new or db.deleted) or any(db.is_modified(obj) for obj in db.dirty)
+    if not (alterada or escritas):
+        return None
+    return bump_dataset_version(db)
+
+def publish_dataset_version(versao: int) -> None:
+    """Registra localmente uma versão já confirmada no banco"""
+    global _versao_local, _lida_em
+    with _lock:
+        if _versao_local is None or versao > _versao_local:
+            _versao_local = versao
+            _lida_em = time.monotonic()
+
+def get_dataset_version() -> Optional[int]:
+    """
+    Retorna a versão atual do dataset, relendo o banco no máximo a cada
+    DATASET_VERSION_TTL segundos. Retorna None se a versão não puder ser lida.
+    """
+    global _versao_local, _lida_em
+    with _lock:
+        if _versao_local is not None and time.monotonic() - _lida_em < DATASET_VERSION_TTL:
+            return _versao_local
+
+    try:
+        with engine.connect() as conn:
+            versao = conn.execute(
+                select(models.VersaoDataset.versao).where(models.VersaoDataset.id == 1)
+            ).scalar() or 0
+    except Exception as e:
+        logger.warning(f"Não foi possível ler a versão do dataset: {e}")
+        return None
+
+    with _lock:
+        if _versao_local is not None and versao > _versao_local:
+            # Escrita feita por outro processo (outro worker ou carga de dados):
+            # as respostas em cache deste processo podem estar desatualizadas
+            invalidate_dataset()
+            logger.info(f"Dataset version changed to {versao}; response cache cleared")
+        if _versao_local is None or versao >= _versao_local:
+            _versao_local = versao
+        _lida_em = time.monotonic()
+        return _versao_local
+
+def make_etag(versao: int, path: str, query: str) -> str:
+    """ETag derivado da versão do dataset e dos parâmetros normalizados da requisição"""
+    parametros = "&".join(f"{k}={v}" for k, v in sorted(parse_qsl(query, keep_blank_values=True)))
+    digest = hashlib.sha1(f"{path}?{parametros}".encode("utf-8")).hexdigest()[:16]
+    return f'"v{versao}-{digest}"'
+
+def _candidatos(if_none_match: Optional[str]) -> list:
+    if not if_none_match:
+        return []
+    return [valor.strip() for valor in if_none_match.split(",")]
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # Comparação fraca (RFC 9110): ignora o prefixo W/
+    return any(c.removeprefix("W/") == etag for c in _candidatos(if_none_match))
+
+def etag_matches_any(if_none_match: Optional[str]) -> bool:
+    """
+    `If-None-Match: *`: vale para qualquer representação atual, então só pode
+    ser avaliado depois que a rota respondeu com sucesso (RFC 9110).
+    """
+    return "*" in _candidatos(if_none_match)
@@ -4,6 +4,9 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 from datetime import datetime
 import warnings
+
+from dataset import caminho_padrao, ler_dataset
+from limpeza import limpar
 warnings.filterwarnings('ignore')
 
 # Configurações para melhor visualização
@@ -15,10 +18,10 @@ pd.set_option('display.width', None)
 class AnalisadorSNISCeara:
     def __init__(self, arquivo_csv):
         """
-        Inicializa o analisador com o arquivo CSV dos dados do SNIS do Ceará
+        Inicializa o analisador com o dataset dos dados do SNIS do Ceará
         
         Args:
-            arquivo_csv (str): Caminho para o arquivo CSV
+            arquivo_csv (str): Caminho para o dataset Parquet ou o arquivo CSV
         """
         self.arquivo_csv = arquivo_csv
         self.dados_originais = None
@@ -26,10 +29,10 @@ class AnalisadorSNISCeara:
         self.relatorio_limpeza = {}
         
     def carregar_dados(self):
-        """Carrega os dados do arquivo CSV"""
-        print("Carregando dados do arquivo CSV...")
+        """Carrega os dados do dataset (Parquet ou CSV)"""
+        print("Carregando dados do dataset...")
         try:
-            self.dados_originais = pd.read_csv(self.arquivo_csv)
+            self.dados_originais = ler_dataset(self.arquivo_csv)
             print(f"Dados carregados com sucesso!")
             print(f"Shape: {self.dados_originais.shape}")
             print(f"Colunas: {len(self.dados_originais.columns)}")
@@ -128,64 +131,33 @@ class AnalisadorSNISCeara:
         return problemas
     
     def limpar_dados(self):
-        """Realiza a limpeza dos dados"""
+        """Realiza a limpeza dos dados com o pipeline de scripts/limpeza.py"""
         print("\n=== LIMPEZA DOS DADOS ===")
         
-        self.dados_limpos = self.dados_originais.copy()
-        registros_antes = len(self.dados_limpos)
+        self.dados_limpos, relatorio = limpar(self.dados_originais)
+        self.relatorio_limpeza = relatorio
+        registros_antes = relatorio["registros_antes"]
+        registros_depois = relatorio["registros_depois"]
         
-        # 1. Remover valores negativos em campos que não deveriam ser negativos
-        colunas_positivas = [
-            'populacao_atendida_agua', 'populacao_atentida_esgoto',
-            'populacao_urbana', 'extensao_rede_agua', 'extensao_rede_esgoto',
-            'quantidade_ligacao_ativa_agua', 'quantidade_ligacao_ativa_esgoto',
-            'volume_agua_produzido', 'volume_agua_consumido'
-        ]
+        # 1. Valores negativos em campos que não deveriam ser negativos
+        for col, negativos in relatorio["negativos"].items():
+            print(f"Convertidos {negativos} valores negativos para NaN em {col}")
         
-        for col in colunas_positivas:
-            if col in self.dados_limpos.columns:
-                negativos_antes = (self.dados_limpos[col] < 0).sum()
-                self.dados_limpos.loc[self.dados_limpos[col] < 0, col] = np.nan
-                print(f"Convertidos {negativos_antes} valores negativos para NaN em {col}")
-        
-        # 2. Tratar valores extremos (outliers) usando winsorização
-        colunas_numericas = self.dados_limpos.select_dtypes(include=[np.number]).columns
-        for col in colunas_numericas[:15]:  # Primeiras 15 colunas numéricas
-            if col in self.dados_limpos.columns and self.dados_limpos[col].notna().sum() > 0:
-                Q1 = self.dados_limpos[col].quantile(0.01)
-                Q99 = self.dados_limpos[col].quantile(0.99)
-                outliers_antes = ((self.dados_limpos[col] < Q1) | (self.dados_limpos[col] > Q99)).sum()
-                self.dados_limpos[col] = self.dados_limpos[col].clip(lower=Q1, upper=Q99)
-                print(f"Tratados {outliers_antes} outliers em {col}")
-        
-        # 3. Preencher valores nulos com estratégias apropriadas
-        # Para valores populacionais, usar média por município
-        colunas_populacao = ['populacao_atendida_agua', 'populacao_atentida_esgoto', 'populacao_urbana']
-        for col in colunas_populacao:
-            if col in self.dados_limpos.columns:
-                nulos_antes = self.dados_limpos[col].isnull().sum()
-                self.dados_limpos[col] = self.dados_limpos.groupby('id_municipio')[col].transform(
-                    lambda x: x.fillna(x.mean())
-                )
-                print(f"Preenchidos {nulos_antes} valores nulos em {col}")
-        
-        # 4. Remover registros com muitos valores nulos
-        threshold_nulos = 0.8  # 80% de valores nulos
-        registros_com_muitos_nulos = (self.dados_limpos.isnull().sum(axis=1) / len(self.dados_limpos.columns)) > threshold_nulos
-        self.dados_limpos = self.dados_limpos[~registros_com_muitos_nulos]
-        
-        registros_depois = len(self.dados_limpos)
-        print(f"\nRegistros removidos por excesso de valores nulos: {registros_antes - registros_depois}")
-        
-        # 5. Verificar e corrigir inconsistências
-        # Se população atendida > população urbana, ajustar
-        if 'populacao_atendida_agua' in self.dados_limpos.columns and 'populacao_urbana' in self.dados_limpos.columns:
-            inconsistencia = (self.dados_limpos['populacao_atendida_agua'] > self.dados_limpos['populacao_urbana']).sum()
-            if inconsistencia > 0:
-                print(f"Corrigidas {inconsistencia} inconsistências de população")
-                self.dados_limpos['populacao_atendida_agua'] = self.dados_limpos['populacao_atendida_agua'].clip(
-                    upper=self.dados_limpos['populacao_urbana']
-                )
+        # 2. Valores extremos (outliers) tratados por winsorização
+        for col, outliers in relatorio["outliers"].items():
+            if outliers > 0:
+                print(f"Tratados {outliers} outliers em {col}")
+        
+        # 3. Nulos populacionais preenchidos com a média por município
+        for col, preenchidos in relatorio["nulos_preenchidos"].items():
+            print(f"Preenchidos {preenchidos} valores nulos em {col}")
+        
+        # 4. Registros com muitos valores nulos
+        print(f"\nRegistros removidos por excesso de valores nulos: {relatorio['linhas_removidas']}")
+        
+        # 5. Inconsistências (população atendida > população urbana)
+        if relatorio["inconsistencias_populacao"] > 0:
+            print(f"Corrigidas {relatorio['inconsistencias_populacao']} inconsistências de população")
         
         print(f"\nLimpeza concluída!")
         print(f"Registros antes: {registros_antes}")
@@ -276,7 +248,7 @@ def main():
     print("="*50)
     
     # Inicializar analisador
-    arquivo_csv = "../data/dados_snis_ceara_limpos.csv"
+    arquivo_csv = caminho_padrao()
     analisador = AnalisadorSNISCeara(arquivo_csv)
     
     # Carregar dados
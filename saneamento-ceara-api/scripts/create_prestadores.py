@@ -12,6 +12,7 @@ import logging
 sys.path.append(str(Path(__file__).parent.parent))
 
 from app.database import engine
+from app.versioning import bump_dataset_version_if_changed
 from app import models, crud, schemas
 
 # Configurar logging
@@ -123,6 +124,7 @@ def create_prestadores():
                 logger.error(f"Erro ao criar prestador {prestador_data['sigla']}: {e}")
                 continue
         
+        bump_dataset_version_if_changed(db)
         db.commit()
         logger.info("Prestadores criados com sucesso!")
         
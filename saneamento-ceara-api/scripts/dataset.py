@@ -0,0 +1,80 @@
+"""
+Leitura e escrita do conjunto de dados intermediário do SNIS.
+
+O formato canônico é um dataset Parquet particionado por `ano`
+(data/dados_snis_ceara.parquet/ano=AAAA/*.parquet): tipado, comprimido por
+coluna e lido apenas nas colunas e anos pedidos. O CSV continua disponível
+como exportação e ainda é aceito na leitura.
+"""
+
+import os
+import shutil
+from pathlib import Path
+from typing import Iterable, Optional
+
+import pandas as pd
+
+DIRETORIO_DADOS = Path(__file__).parent.parent / "data"
+PARQUET_PADRAO = str(DIRETORIO_DADOS / "dados_snis_ceara.parquet")
+CSV_PADRAO = str(DIRETORIO_DADOS / "dados_snis_ceara_limpos.csv")
+
+def caminho_padrao() -> str:
+    """Dataset Parquet, se já tiver sido gerado; senão o CSV legado"""
+    return PARQUET_PADRAO if os.path.exists(PARQUET_PADRAO) else CSV_PADRAO
+
+def eh_parquet(caminho: str) -> bool:
+    return os.path.isdir(caminho) or caminho.endswith(".parquet")
+
+def ler_dataset(caminho: str, colunas: Optional[Iterable[str]] = None, anos: Optional[Iterable[int]] = None) -> pd.DataFrame:
+    """
+    Lê o dataset (Parquet ou CSV). `colunas` limita as colunas lidas (as
+    ausentes no arquivo são ignoradas) e `anos` as partições.
+    """
+    colunas = list(colunas) if colunas is not None else None
+    if eh_parquet(caminho):
+        import pyarrow.dataset as ds
+
+        dataset = ds.dataset(caminho, format="parquet", partitioning="hive")
+        if colunas is not None:
+            colunas = [coluna for coluna in colunas if coluna in dataset.schema.names]
+        filtro = ds.field("ano").isin(list(anos)) if anos is not None else None
+        return dataset.to_table(columns=colunas, filter=filtro).to_pandas()
+
+    df = pd.read_csv(
+        caminho,
+        usecols=(lambda coluna: coluna in colunas) if colunas is not None else None,
+        dtype={"id_municipio": str},
+        low_memory=False
+    )
+    if anos is not None:
+        df = df[df["ano"].isin(list(anos))]
+    return df
+
+class EscritorDataset:
+    """
+    Grava o dataset Parquet bloco a bloco (cada bloco vira um arquivo por
+    partição de ano). O diretório de destino é recriado na abertura.
+    """
+
+    def __init__(self, caminho: str = PARQUET_PADRAO):
+        self.caminho = caminho
+        self.blocos = 0
+        if os.path.exists(caminho):
+            shutil.rmtree(caminho)
+
+    def escrever(self, df: pd.DataFrame) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        pq.write_to_dataset(
+            pa.Table.from_pandas(df, preserve_index=False),
+            self.caminho,
+            partition_cols=["ano"],
+            basename_template=f"parte-{self.blocos:05d}-{{i}}.parquet"
+        )
+        self.blocos += 1
+
+def exportar_csv(caminho_parquet: str, caminho_csv: str) -> None:
+    """Exporta o dataset Parquet para CSV (com `ano` como coluna comum)"""
+    df = ler_dataset(caminho_parquet)
+    df.sort_values(["ano", "id_municipio"]).to_csv(caminho_csv, index=False)
@@ -0,0 +1,90 @@
+"""
+Cache das dimensões (municípios e prestadores) compartilhado pelos scripts de ETL.
+
+As tabelas `municipios` e `prestadores_servico` são pequenas (~184 municípios e
+poucos prestadores), então são lidas uma única vez para dicionários em memória;
+as consultas por chave passam a ser O(1) e os membros ausentes são criados em
+uma única inserção em lote. Nenhum método faz commit: a transação é do chamador.
+"""
+
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import insert
+import logging
+
+# Adicionar o diretório pai ao path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app import models
+
+logger = logging.getLogger(__name__)
+
+PRESTADOR_PADRAO = ("NAO_INFORMADO", "Não Informado")
+
+class ResolvedorDimensoes:
+    """Resolve códigos IBGE e siglas de prestadores sem consultar o banco a cada linha"""
+
+    def __init__(self, db):
+        self.db = db
+        self.municipios: Dict[str, models.Municipio] = {
+            municipio.id_municipio: municipio for municipio in db.query(models.Municipio)
+        }
+        self.prestadores: Dict[str, int] = {
+            sigla: prestador_id for prestador_id, sigla in
+            db.query(models.PrestadorServico.id, models.PrestadorServico.sigla)
+        }
+        # Municípios e prestadores inseridos por este resolvedor
+        self.criados = 0
+
+    def municipio(self, id_municipio: str) -> Optional[models.Municipio]:
+        return self.municipios.get(id_municipio)
+
+    def prestador_id(self, sigla: str) -> Optional[int]:
+        return self.prestadores.get(sigla)
+
+    def garantir_municipios(self, registros: Iterable[dict]) -> int:
+        """
+        Cria de uma vez os municípios cujo `id_municipio` ainda não existe
+        (vale o primeiro registro de cada código). Retorna quantos foram criados.
+        """
+        novos = {}
+        for registro in registros:
+            codigo = registro["id_municipio"]
+            if codigo not in self.municipios and codigo not in novos:
+                novos[codigo] = registro
+        if not novos:
+            return 0
+
+        self.db.execute(insert(models.Municipio), list(novos.values()))
+        self.municipios.update({
+            municipio.id_municipio: municipio for municipio in
+            self.db.query(models.Municipio).filter(models.Municipio.id_municipio.in_(list(novos)))
+        })
+        self.criados += len(novos)
+        logger.info(f"Criados {len(novos)} novos municípios")
+        return len(novos)
+
+    def garantir_prestadores(self, registros: Iterable[dict]) -> Dict[str, int]:
+        """
+        Cria de uma vez os prestadores cuja `sigla` ainda não existe, além do
+        prestador padrão. Retorna o mapa sigla -> id de todos os prestadores.
+        """
+        sigla_padrao, nome_padrao = PRESTADOR_PADRAO
+        novos = {}
+        for registro in [*registros, {"sigla": sigla_padrao, "nome": nome_padrao}]:
+            sigla = registro["sigla"]
+            if sigla not in self.prestadores and sigla not in novos:
+                novos[sigla] = registro
+        if novos:
+            linhas = self.db.execute(
+                insert(models.PrestadorServico).returning(
+                    models.PrestadorServico.id, models.PrestadorServico.sigla, sort_by_parameter_order=True
+                ),
+                list(novos.values())
+            ).all()
+            self.prestadores.update({sigla: prestador_id for prestador_id, sigla in linhas})
+            self.criados += len(novos)
+            logger.info(f"Criados {len(novos)} novos prestadores")
+        return self.prestadores
@@ -17,7 +17,10 @@ import logging
 sys.path.append(str(Path(__file__).parent.parent))
 
 from app.database import engine
+from app.versioning import bump_dataset_version_if_changed
 from app import models, crud, schemas
+from dimensoes import ResolvedorDimensoes
+from dataset import caminho_padrao, ler_dataset
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -32,13 +35,15 @@ def enhance_municipios_from_snis():
     
     try:
         # Ler dados do SNIS
-        csv_path = "data/dados_snis_ceara_limpos.csv"
-        if not os.path.exists(csv_path):
-            logger.error(f"Arquivo de dados não encontrado: {csv_path}")
+        caminho = caminho_padrao()
+        if not os.path.exists(caminho):
+            logger.error(f"Arquivo de dados não encontrado: {caminho}")
             return
         
-        logger.info(f"Lendo dados de {csv_path}")
-        df = pd.read_csv(csv_path, low_memory=False)
+        logger.info(f"Lendo dados de {caminho}")
+        df = ler_dataset(caminho, colunas=[
+            'id_municipio', 'quantidade_sede_municipal_agua', 'quantidade_sede_municipal_esgoto'
+        ])
         
         # Agrupar dados por município para obter informações consolidadas
         municipios_snis = df.groupby('id_municipio').agg({
@@ -49,12 +54,13 @@ def enhance_municipios_from_snis():
         logger.info(f"Processando {len(municipios_snis)} municípios do SNIS")
         
         municipios_atualizados = 0
+        dimensoes = ResolvedorDimensoes(db)
         
         for _, row in municipios_snis.iterrows():
             municipio_id = str(int(row['id_municipio'])).zfill(7)
             
             # Buscar município no banco
-            municipio = crud.get_municipio(db, municipio_id)
+            municipio = dimensoes.municipio(municipio_id)
             if not municipio:
                 logger.warning(f"Município {municipio_id} não encontrado no banco")
                 continue
@@ -72,6 +78,7 @@ def enhance_municipios_from_snis():
             if municipios_atualizados % 50 == 0:
                 logger.info(f"Processados {municipios_atualizados} municípios")
         
+        bump_dataset_version_if_changed(db)
         db.commit()
         logger.info(f"Melhoria concluída! Municípios atualizados: {municipios_atualizados}")
         
@@ -103,6 +110,7 @@ def add_population_estimates():
                 db.add(municipio)
                 municipios_atualizados += 1
         
+        bump_dataset_version_if_changed(db)
         db.commit()
         logger.info(f"Estimativas de população urbana adicionadas: {municipios_atualizados} municípios")
         
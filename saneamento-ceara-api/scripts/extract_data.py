@@ -5,6 +5,7 @@ Script para extrair e processar dados do SNIS para o Ceará
 
 import pandas as pd
 import numpy as np
+import argparse
 import os
 import sys
 from pathlib import Path
@@ -12,52 +13,122 @@ from pathlib import Path
 # Adicionar o diretório pai ao path para importar módulos da aplicação
 sys.path.append(str(Path(__file__).parent.parent))
 
-# Mapeamento de colunas do CSV para o modelo
-COLUMN_MAPPING = {
-    'populacao_atentida_esgoto': 'populacao_total_atendida_esgoto',
-    'indice_atendimento_total_agua': 'indice_atendimento_agua',
-    'receita_operacional_direta': 'receita_operacional_total',
-    'despesa_total_servico': 'despesa_total_servicos',
-    'investimento_total_prestador': 'investimento_total'
-}
+from dataset import EscritorDataset, exportar_csv, ler_dataset
+from limpeza import limpar
 
-def processar_csv_snis(csv_path: str, output_dir: str = "../data"):
+# Colunas do CSV do SNIS usadas pelo carregamento (scripts/load_data.py),
+# pelos scripts de municípios e pela análise de limpeza. As demais (~100) não
+# são lidas.
+COLUNAS_TEXTO = ['id_municipio', 'sigla_uf', 'nome_municipio', 'sigla_prestador', 'nome_prestador']
+
+COLUNAS_NUMERICAS = [
+    'populacao_atendida_agua', 'populacao_atentida_esgoto', 'populacao_urbana',
+    'populacao_total_estimada_2022', 'quantidade_sede_municipal_agua', 'quantidade_sede_municipal_esgoto',
+    'extensao_rede_agua', 'extensao_rede_esgoto',
+    'quantidade_ligacao_ativa_agua', 'quantidade_ligacao_ativa_esgoto',
+    'indice_atendimento_total_agua', 'indice_coleta_esgoto', 'indice_tratamento_esgoto',
+    'indice_perda_faturamento', 'volume_agua_produzido', 'volume_agua_consumido',
+    'volume_agua_faturado', 'volume_esgoto_coletado', 'volume_esgoto_tratado',
+    'consumo_eletrico_sistemas_agua', 'receita_operacional_direta', 'despesa_exploracao',
+    'despesa_pessoal', 'despesa_energia', 'despesa_total_servico',
+    'investimento_total_prestador', 'credito_areceber'
+]
+
+# Colunas usadas por gerar_estatisticas
+COLUNAS_ESTATISTICAS = [
+    'ano', 'id_municipio', 'populacao_atendida_agua', 'indice_atendimento_total_agua',
+    'indice_coleta_esgoto', 'indice_tratamento_esgoto'
+]
+
+MOTORES = ('pandas', 'pyarrow')
+
+def _colunas_presentes(csv_path: str) -> list:
+    """Colunas de interesse que existem no cabeçalho do arquivo (na ordem do arquivo)"""
+    cabecalho = pd.read_csv(csv_path, nrows=0).columns
+    interesse = {'ano', *COLUNAS_TEXTO, *COLUNAS_NUMERICAS}
+    return [coluna for coluna in cabecalho if coluna in interesse]
+
+def ler_em_blocos(csv_path: str, colunas: list, chunk_size: int = 100000, motor: str = 'pandas'):
+    """
+    Lê o CSV em blocos apenas com `colunas` e com os tipos definidos acima.
+    Com motor='pyarrow', usa o leitor em streaming do pyarrow (mais rápido
+    para arquivos grandes).
+    """
+    tipos = {coluna: 'float64' for coluna in COLUNAS_NUMERICAS if coluna in colunas}
+    tipos.update({coluna: 'string' for coluna in COLUNAS_TEXTO if coluna in colunas})
+    tipos['ano'] = 'Int64'
+
+    if motor == 'pyarrow':
+        try:
+            import pyarrow as pa
+            from pyarrow import csv as pa_csv
+        except ImportError:
+            raise RuntimeError("O motor 'pyarrow' requer o pacote pyarrow instalado")
+        tipos_arrow = {coluna: pa.float64() for coluna in COLUNAS_NUMERICAS if coluna in colunas}
+        tipos_arrow.update({coluna: pa.string() for coluna in COLUNAS_TEXTO if coluna in colunas})
+        tipos_arrow['ano'] = pa.int64()
+        leitor = pa_csv.open_csv(
+            csv_path,
+            read_options=pa_csv.ReadOptions(block_size=64 * 1024 * 1024),
+            convert_options=pa_csv.ConvertOptions(include_columns=colunas, column_types=tipos_arrow)
+        )
+        for lote in leitor:
+            yield lote.to_pandas().astype(tipos)
+    else:
+        yield from pd.read_csv(csv_path, usecols=colunas, dtype=tipos, chunksize=chunk_size)
+
+def processar_csv_snis(csv_path: str, output_dir: str = "../data", uf: str = 'CE',
+                       motor: str = 'pandas', chunk_size: int = 100000, exportar: bool = False,
+                       aplicar_limpeza: bool = True):
     """
-    Processa o CSV do SNIS e extrai dados do Ceará
+    Processa o CSV do SNIS e extrai dados do Ceará (ou de `uf`).
+
+    O arquivo é lido em blocos, só com as colunas usadas; cada bloco é filtrado
+    pela UF, limpo e gravado no dataset Parquet particionado por ano, de modo
+    que a memória usada não depende do tamanho do CSV nacional. Em seguida o
+    pipeline de limpeza (scripts/limpeza.py) é aplicado ao dataset filtrado,
+    que precisa estar inteiro para os quantis e médias por município. Com
+    `exportar`, o dataset também é exportado para CSV.
     """
     print(f"Processando arquivo: {csv_path}")
     
     # Criar diretório de saída se não existir
     os.makedirs(output_dir, exist_ok=True)
-    
-    # Ler o CSV em chunks para economizar memória
-    chunk_size = 10000
-    chunks = []
-    
-    print("Lendo arquivo CSV...")
-    for chunk in pd.read_csv(csv_path, chunksize=chunk_size, low_memory=False):
-        # Filtrar apenas dados do Ceará
-        chunk_ceara = chunk[chunk['sigla_uf'] == 'CE'].copy()
-        if not chunk_ceara.empty:
-            chunks.append(chunk_ceara)
-    
-    if not chunks:
-        print("Nenhum dado do Ceará encontrado no arquivo!")
+    output_dataset = os.path.join(output_dir, "dados_snis_ceara.parquet")
+    
+    colunas = _colunas_presentes(csv_path)
+    print(f"Lendo {len(colunas)} colunas do arquivo CSV (motor: {motor})...")
+    
+    escritor = EscritorDataset(output_dataset)
+    registros = 0
+    for chunk in ler_em_blocos(csv_path, colunas, chunk_size, motor):
+        # Filtrar apenas dados da UF
+        chunk_uf = limpar_dados(chunk[chunk['sigla_uf'] == uf])
+        if chunk_uf.empty:
+            continue
+        escritor.escrever(chunk_uf)
+        registros += len(chunk_uf)
+    
+    if not registros:
+        print(f"Nenhum dado de {uf} encontrado no arquivo!")
         return None
     
-    # Concatenar todos os chunks
-    df_ceara = pd.concat(chunks, ignore_index=True)
-    print(f"Total de registros do Ceará encontrados: {len(df_ceara)}")
+    print(f"Total de registros de {uf} salvos em {output_dataset}: {registros}")
     
-    # Limpar e processar dados
-    df_ceara = limpar_dados(df_ceara)
+    if aplicar_limpeza:
+        print("Limpando dados...")
+        df_limpo, relatorio = limpar(ler_dataset(output_dataset))
+        EscritorDataset(output_dataset).escrever(df_limpo)
+        print(f"Dados limpos: {relatorio['registros_depois']} registros "
+              f"({sum(relatorio['outliers'].values())} valores winsorizados)")
     
-    # Salvar dados processados
-    output_file = os.path.join(output_dir, "dados_snis_ceara_limpos.csv")
-    df_ceara.to_csv(output_file, index=False)
-    print(f"Dados salvos em: {output_file}")
+    if exportar:
+        output_file = os.path.join(output_dir, "dados_snis_ceara_limpos.csv")
+        exportar_csv(output_dataset, output_file)
+        print(f"Dados exportados para: {output_file}")
     
-    # Gerar estatísticas
+    # O dataset filtrado é pequeno: as estatísticas são calculadas sobre ele
+    df_ceara = ler_dataset(output_dataset, colunas=COLUNAS_ESTATISTICAS)
     gerar_estatisticas(df_ceara, output_dir)
     
     return df_ceara
@@ -66,29 +137,11 @@ def limpar_dados(df: pd.DataFrame) -> pd.DataFrame:
     """
     Limpa e processa os dados do DataFrame
     """
-    print("Limpando dados...")
-    
     # Remover linhas com dados completamente nulos
     df = df.dropna(how='all')
     
-    # Renomear colunas conforme mapeamento
-    df = df.rename(columns=COLUMN_MAPPING)
-    
-    # Converter tipos de dados
-    df['ano'] = pd.to_numeric(df['ano'], errors='coerce')
-    df['id_municipio'] = df['id_municipio'].astype(str).str.zfill(7)
-    
-    # Converter colunas numéricas
-    colunas_numericas = [
-        'populacao_atendida_agua', 'populacao_total_atendida_esgoto',
-        'indice_atendimento_agua', 'indice_coleta_esgoto', 'indice_tratamento_esgoto',
-        'indice_perda_faturamento', 'volume_agua_produzido', 'volume_esgoto_tratado',
-        'receita_operacional_total', 'despesa_total_servicos', 'investimento_total'
-    ]
-    
-    for coluna in colunas_numericas:
-        if coluna in df.columns:
-            df[coluna] = pd.to_numeric(df[coluna], errors='coerce')
+    # Tipos numéricos já vêm da leitura (dtype); falta normalizar o código IBGE
+    df = df.assign(id_municipio=df['id_municipio'].str.zfill(7))
     
     # Remover registros com ano inválido
     df = df[df['ano'].notna() & (df['ano'] >= 2010) & (df['ano'] <= 2023)]
@@ -96,7 +149,6 @@ def limpar_dados(df: pd.DataFrame) -> pd.DataFrame:
     # Remover registros sem município
     df = df[df['id_municipio'].notna()]
     
-    print(f"Dados limpos: {len(df)} registros")
     return df
 
 def gerar_estatisticas(df: pd.DataFrame, output_dir: str):
@@ -145,8 +197,18 @@ def main():
     """
     Função principal
     """
+    parser = argparse.ArgumentParser(description="Extrai os dados do Ceará do CSV nacional do SNIS")
     # Caminho para o CSV do SNIS
-    csv_path = "../../br_mdr_snis_municipio_agua_esgoto.csv"
+    parser.add_argument("--arquivo", default="../../br_mdr_snis_municipio_agua_esgoto.csv", help="CSV nacional do SNIS")
+    parser.add_argument("--saida", default="../data", help="Diretório de saída")
+    parser.add_argument("--uf", default="CE", help="Sigla da UF a extrair")
+    parser.add_argument("--motor", choices=MOTORES, default="pandas", help="Leitor de CSV")
+    parser.add_argument("--csv", action="store_true", help="Exporta também o dataset para CSV")
+    parser.add_argument("--sem-limpeza", action="store_true",
+                        help="Não aplica o pipeline de limpeza (winsorização e preenchimento de nulos)")
+    parser.add_argument("--tamanho-chunk", type=int, default=100000, help="Linhas por bloco no motor pandas")
+    args = parser.parse_args()
+    csv_path = args.arquivo
     
     if not os.path.exists(csv_path):
         print(f"Arquivo não encontrado: {csv_path}")
@@ -154,7 +216,8 @@ def main():
         return
     
     # Processar dados
-    df_ceara = processar_csv_snis(csv_path)
+    df_ceara = processar_csv_snis(csv_path, args.saida, args.uf, args.motor, args.tamanho_chunk, args.csv,
+                                  not args.sem_limpeza)
     
     if df_ceara is not None:
         print("\nProcessamento concluído com sucesso!")
@@ -0,0 +1,93 @@
+"""
+Pipeline de limpeza dos dados do SNIS, vetorizado e reutilizável.
+
+Usado pela extração (scripts/extract_data.py), pelo carregamento
+(scripts/load_data.py --limpar) e pela análise de limpeza
+(scripts/analise_limpeza_dados.py). Todas as etapas operam sobre o DataFrame
+inteiro: uma única chamada a `quantile` para todas as colunas, `clip` com
+limites por coluna e médias por município com `transform('mean')`.
+"""
+
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Campos que não podem ser negativos (negativos viram nulos)
+COLUNAS_POSITIVAS = [
+    'populacao_atendida_agua', 'populacao_atentida_esgoto',
+    'populacao_urbana', 'extensao_rede_agua', 'extensao_rede_esgoto',
+    'quantidade_ligacao_ativa_agua', 'quantidade_ligacao_ativa_esgoto',
+    'volume_agua_produzido', 'volume_agua_consumido'
+]
+
+# Populações: nulos preenchidos com a média do próprio município
+COLUNAS_POPULACAO = ['populacao_atendida_agua', 'populacao_atentida_esgoto', 'populacao_urbana']
+
+# Colunas numéricas que identificam a linha e nunca são winsorizadas
+COLUNAS_IDENTIFICADORAS = ['ano', 'id_municipio']
+
+def remover_negativos(df: pd.DataFrame, colunas: Iterable[str] = COLUNAS_POSITIVAS) -> Tuple[pd.DataFrame, dict]:
+    """Substitui valores negativos por nulos; retorna os dados e a contagem por coluna"""
+    colunas = [coluna for coluna in colunas if coluna in df.columns]
+    negativos = df[colunas].lt(0)
+    df[colunas] = df[colunas].mask(negativos)
+    return df, negativos.sum().to_dict()
+
+def winsorizar(df: pd.DataFrame, colunas: Optional[Iterable[str]] = None,
+               inferior: float = 0.01, superior: float = 0.99) -> Tuple[pd.DataFrame, dict]:
+    """
+    Limita cada coluna aos seus quantis `inferior` e `superior`. Sem `colunas`,
+    usa todas as numéricas exceto as identificadoras.
+    """
+    if colunas is None:
+        colunas = [
+            coluna for coluna in df.select_dtypes(include=np.number).columns
+            if coluna not in COLUNAS_IDENTIFICADORAS
+        ]
+    colunas = list(colunas)
+    valores = df[colunas]
+    quantis = valores.quantile([inferior, superior])
+    minimos, maximos = quantis.iloc[0], quantis.iloc[1]
+    fora = valores.lt(minimos) | valores.gt(maximos)
+    df[colunas] = valores.clip(lower=minimos, upper=maximos, axis=1)
+    return df, fora.sum().to_dict()
+
+def preencher_por_municipio(df: pd.DataFrame, colunas: Iterable[str] = COLUNAS_POPULACAO) -> Tuple[pd.DataFrame, dict]:
+    """Preenche nulos com a média da coluna no mesmo município"""
+    colunas = [coluna for coluna in colunas if coluna in df.columns]
+    nulos_antes = df[colunas].isna().sum()
+    medias = df.groupby('id_municipio')[colunas].transform('mean')
+    df[colunas] = df[colunas].fillna(medias)
+    return df, (nulos_antes - df[colunas].isna().sum()).to_dict()
+
+def remover_linhas_vazias(df: pd.DataFrame, limite_nulos: float = 0.8) -> Tuple[pd.DataFrame, int]:
+    """Remove linhas com mais de `limite_nulos` (fração) das colunas nulas"""
+    vazias = df.isna().mean(axis=1) > limite_nulos
+    return df[~vazias], int(vazias.sum())
+
+def corrigir_populacao_atendida(df: pd.DataFrame) -> Tuple[pd.DataFrame, int]:
+    """Limita a população atendida com água à população urbana"""
+    if 'populacao_atendida_agua' not in df.columns or 'populacao_urbana' not in df.columns:
+        return df, 0
+    inconsistentes = int(df['populacao_atendida_agua'].gt(df['populacao_urbana']).sum())
+    df['populacao_atendida_agua'] = df['populacao_atendida_agua'].clip(upper=df['populacao_urbana'])
+    return df, inconsistentes
+
+def limpar(df: pd.DataFrame, colunas_winsorizar: Optional[Iterable[str]] = None,
+           limite_nulos: float = 0.8) -> Tuple[pd.DataFrame, dict]:
+    """
+    Executa o pipeline completo sobre uma cópia de `df`: negativos -> nulos,
+    winsorização em 1%/99%, preenchimento de populações pela média do
+    município, remoção de linhas quase vazias e correção da população atendida.
+    Retorna os dados limpos e um relatório com as contagens de cada etapa.
+    """
+    df = df.copy()
+    relatorio = {"registros_antes": len(df)}
+    df, relatorio["negativos"] = remover_negativos(df)
+    df, relatorio["outliers"] = winsorizar(df, colunas_winsorizar)
+    df, relatorio["nulos_preenchidos"] = preencher_por_municipio(df)
+    df, relatorio["linhas_removidas"] = remover_linhas_vazias(df, limite_nulos)
+    df, relatorio["inconsistencias_populacao"] = corrigir_populacao_atendida(df)
+    relatorio["registros_depois"] = len(df)
+    return df, relatorio
@@ -1,8 +1,15 @@
 import pandas as pd
 import numpy as np
+import argparse
+import hashlib
+import io
 import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
+from typing import Optional
+from sqlalchemy import delete, text
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import IntegrityError
 import logging
@@ -12,6 +19,10 @@ sys.path.append(str(Path(__file__).parent.parent))
 
 from app.database import engine
 from app import models, crud, schemas
+from app.versioning import bump_dataset_version
+from dimensoes import ResolvedorDimensoes
+from dataset import caminho_padrao, ler_dataset
+from limpeza import limpar
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -34,18 +45,17 @@ def safe_int(value):
     except (ValueError, TypeError, OverflowError): # Lida com números muito grandes
         return None
 
-def get_or_create_prestador(db: sessionmaker, sigla: str, nome: str) -> models.PrestadorServico:
-    prestador = crud.get_prestador_by_sigla(db, sigla)
-    if not prestador:
+def get_or_create_prestador(dimensoes: ResolvedorDimensoes, sigla: str, nome: str) -> int:
+    prestador_id = dimensoes.prestador_id(sigla)
+    if prestador_id is None:
         logger.info(f"Criando novo prestador: {sigla}")
         prestador_schema = schemas.PrestadorServicoCreate(sigla=sigla, nome=nome)
-        prestador = crud.create_prestador(db, prestador_schema)
-    return prestador
+        prestador_id = dimensoes.garantir_prestadores([prestador_schema.dict(include={"sigla", "nome"})])[sigla]
+    return prestador_id
 
-def get_or_create_municipio(db: sessionmaker, row: pd.Series) -> models.Municipio:
+def get_or_create_municipio(dimensoes: ResolvedorDimensoes, row: pd.Series) -> str:
     municipio_id = str(row.get('id_municipio')).zfill(7)
-    municipio = crud.get_municipio(db, municipio_id)
-    if not municipio:
+    if dimensoes.municipio(municipio_id) is None:
         logger.info(f"Criando novo município: {municipio_id}")
         municipio_schema = schemas.MunicipioCreate(
             id_municipio=municipio_id,
@@ -53,94 +63,709 @@ def get_or_create_municipio(db: sessionmaker, row: pd.Series) -> models.Municipi
             sigla_uf=row.get('sigla_uf', 'CE'),
             populacao_total_estimada_2022=safe_int(row.get('populacao_total_estimada_2022'))
         )
-        municipio = crud.create_municipio(db, municipio_schema)
-    return municipio
+        dimensoes.garantir_municipios([municipio_schema.dict()])
+    return municipio_id
+
+# Coluna do modelo -> coluna do CSV do SNIS (com os typos originais)
+COLUNAS_INDICADORES = {
+    "populacao_atendida_agua": "populacao_atendida_agua",
+    "populacao_atendida_esgoto": "populacao_atentida_esgoto",
+    "indice_atendimento_agua": "indice_atendimento_total_agua",
+    "indice_coleta_esgoto": "indice_coleta_esgoto",
+    "indice_tratamento_esgoto": "indice_tratamento_esgoto",
+    "indice_perda_faturamento": "indice_perda_faturamento"
+}
+
+COLUNAS_RECURSOS = {
+    "volume_agua_produzido": "volume_agua_produzido",
+    "volume_agua_consumido": "volume_agua_consumido",
+    "volume_agua_faturado": "volume_agua_faturado",
+    "volume_esgoto_coletado": "volume_esgoto_coletado",
+    "volume_esgoto_tratado": "volume_esgoto_tratado",
+    "consumo_eletrico_sistemas_agua": "consumo_eletrico_sistemas_agua"
+}
+
+COLUNAS_FINANCEIRO = {
+    "receita_operacional_total": "receita_operacional_direta",
+    "despesa_exploracao": "despesa_exploracao",
+    "despesa_pessoal": "despesa_pessoal",
+    "despesa_energia": "despesa_energia",
+    "despesa_total_servicos": "despesa_total_servico",
+    "investimento_total_prestador": "investimento_total_prestador",
+    "credito_a_receber": "credito_areceber"
+}
+
+# Colunas do dataset lidas pelo carregamento (as opcionais podem não existir)
+COLUNAS_ENTRADA = [
+    "ano", "id_municipio", "nome_municipio", "sigla_uf", "sigla_prestador", "nome_prestador",
+    "populacao_total_estimada_2022",
+    *COLUNAS_INDICADORES.values(), *COLUNAS_RECURSOS.values(), *COLUNAS_FINANCEIRO.values()
+]
+
+COLUNAS_INTEIRAS = {"populacao_atendida_agua", "populacao_atendida_esgoto"}
+
+CHAVE = ["ano", "municipio_id", "prestador_id"]
+
+# Colunas cobertas pelo hash de conteúdo de cada linha
+COLUNAS_CONTEUDO = [*COLUNAS_INDICADORES, *COLUNAS_RECURSOS, *COLUNAS_FINANCEIRO]
+
+# Faixas válidas (mínimo, máximo) definidas nos schemas da API
+LIMITES = {
+    "ano": (1900, 2100),
+    "populacao_total_estimada_2022": (0, None),
+    "populacao_atendida_agua": (0, None),
+    "populacao_atendida_esgoto": (0, None),
+    "indice_atendimento_agua": (0, 100),
+    "indice_coleta_esgoto": (0, 100),
+    "indice_tratamento_esgoto": (0, 100),
+    "indice_perda_faturamento": (0, 100),
+    **{coluna: (0, None) for coluna in COLUNAS_RECURSOS},
+    **{coluna: (0, None) for coluna in COLUNAS_FINANCEIRO}
+}
+
+def _coluna_texto(df: pd.DataFrame, coluna: str, padrao: str) -> pd.Series:
+    if coluna not in df:
+        return pd.Series(padrao, index=df.index)
+    return df[coluna].fillna(padrao).astype(str).str.strip()
+
+def transformar_dataframe(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converte o CSV do SNIS para as colunas dos modelos usando operações
+    vetorizadas (equivalente a safe_int/safe_float aplicados linha a linha).
+    """
+    dados = pd.DataFrame(index=df.index)
+    dados["ano"] = pd.to_numeric(df["ano"], errors="coerce").astype("Int64")
+    dados["municipio_id"] = df["id_municipio"].astype(str).str.strip()\
+        .str.replace(r"\.0$", "", regex=True).str.zfill(7)
+    dados["nome_municipio"] = _coluna_texto(df, "nome_municipio", "")
+    dados.loc[dados["nome_municipio"] == "", "nome_municipio"] = "Município " + dados["municipio_id"]
+    dados["sigla_uf"] = _coluna_texto(df, "sigla_uf", "CE")
+    dados["sigla_prestador"] = _coluna_texto(df, "sigla_prestador", "NAO_INFORMADO")
+    dados["nome_prestador"] = _coluna_texto(df, "nome_prestador", "Não Informado")
+    dados["populacao_total_estimada_2022"] = pd.to_numeric(
+        df.get("populacao_total_estimada_2022", pd.Series(np.nan, index=df.index)), errors="coerce"
+    ).replace([np.inf, -np.inf], np.nan).apply(np.trunc).astype("Int64")
+
+    for destino, origem in {**COLUNAS_INDICADORES, **COLUNAS_RECURSOS, **COLUNAS_FINANCEIRO}.items():
+        if origem in df:
+            serie = pd.to_numeric(df[origem], errors="coerce").replace([np.inf, -np.inf], np.nan)
+        else:
+            serie = pd.Series(np.nan, index=df.index)
+        if destino in COLUNAS_INTEIRAS:
+            serie = np.trunc(serie).astype("Int64")
+        dados[destino] = serie
+
+    dados["hash_conteudo"] = calcular_hash_conteudo(dados)
+    return dados
+
+# Representação dos nulos no texto que entra no hash de conteúdo
+NULO_HASH = "\\N"
+
+def _texto_canonico(serie: pd.Series, inteira: bool) -> pd.Series:
+    """
+    Texto de uma coluna independente do dtype inferido na leitura (85 e 85.0
+    geram o mesmo texto): Int64 para as inteiras e float64 com formato fixo
+    para as demais.
+    """
+    if inteira:
+        valores = serie.astype("Int64")
+        texto = valores.astype(str)
+    else:
+        valores = serie.astype("float64")
+        texto = valores.map(lambda valor: format(valor, ".17g"))
+    return texto.mask(valores.isna(), NULO_HASH)
+
+def calcular_hash_conteudo(dados: pd.DataFrame) -> pd.Series:
+    """SHA-256 dos valores já convertidos de cada linha (nulos incluídos)"""
+    textos = [_texto_canonico(dados[coluna], coluna in COLUNAS_INTEIRAS) for coluna in COLUNAS_CONTEUDO]
+    conteudo = textos[0].str.cat(textos[1:], sep="|")
+    return conteudo.map(lambda texto: hashlib.sha256(texto.encode("utf-8")).hexdigest())
+
+def validar_dados(dados: pd.DataFrame):
+    """
+    Aplica as restrições dos schemas da API (faixas, código IBGE com 7 dígitos)
+    como máscaras sobre o DataFrame inteiro. Retorna as linhas válidas e a
+    série de motivos das linhas rejeitadas, indexada como o DataFrame original.
+    """
+    verificacoes = [
+        ("ano ausente", dados["ano"].isna()),
+        ("municipio_id não é um código IBGE de 7 dígitos", ~dados["municipio_id"].str.fullmatch(r"\d{7}"))
+    ]
+    for coluna, (minimo, maximo) in LIMITES.items():
+        serie = dados[coluna]
+        invalidos = pd.Series(False, index=dados.index)
+        if minimo is not None:
+            invalidos |= (serie < minimo).fillna(False)
+        if maximo is not None:
+            invalidos |= (serie > maximo).fillna(False)
+        faixa = f"[{minimo}, {maximo}]" if maximo is not None else f">= {minimo}"
+        verificacoes.append((f"{coluna} fora de {faixa}", invalidos))
+
+    motivos = pd.Series("", index=dados.index)
+    for descricao, invalidos in verificacoes:
+        invalidos = invalidos.astype(bool)
+        if invalidos.any():
+            motivos = motivos.mask(invalidos, motivos + descricao + "; ")
+            logger.warning(f"{int(invalidos.sum())} linhas rejeitadas: {descricao}")
+
+    rejeitadas = motivos != ""
+    return dados[~rejeitadas], motivos[rejeitadas].str.rstrip("; ")
+
+def separar_rejeitados(df: pd.DataFrame, dados: pd.DataFrame, arquivo_rejeitados: Optional[str] = None):
+    """
+    Valida os dados transformados e grava as linhas rejeitadas (com as colunas
+    originais do CSV e os motivos) em `arquivo_rejeitados`. Retorna as linhas
+    válidas e a quantidade de rejeitadas.
+    """
+    validos, motivos = validar_dados(dados)
+    if not motivos.empty and arquivo_rejeitados:
+        df.loc[motivos.index].assign(motivos=motivos).to_csv(arquivo_rejeitados, index=False)
+        logger.warning(f"{len(motivos)} linhas rejeitadas gravadas em {arquivo_rejeitados}")
+    return validos, len(motivos)
+
+def _registros(dados: pd.DataFrame, colunas: list) -> list:
+    """Linhas como dicionários com tipos nativos do Python e None no lugar de NaN/NA"""
+    selecionados = dados[colunas].astype(object)
+    return selecionados.where(dados[colunas].notna(), None).to_dict("records")
+
+def resolver_dimensoes(db, dados: pd.DataFrame):
+    """
+    Cria de uma vez os municípios e prestadores ausentes. Retorna o mapa
+    sigla -> id dos prestadores e quantos municípios/prestadores foram criados.
+    """
+    dimensoes = ResolvedorDimensoes(db)
+    municipios = dados.drop_duplicates("municipio_id")\
+        .rename(columns={"municipio_id": "id_municipio", "nome_municipio": "nome"})
+    dimensoes.garantir_municipios(
+        _registros(municipios, ["id_municipio", "nome", "sigla_uf", "populacao_total_estimada_2022"])
+    )
+    prestadores = dados.drop_duplicates("sigla_prestador")\
+        .rename(columns={"sigla_prestador": "sigla", "nome_prestador": "nome"})
+    mapa = dimensoes.garantir_prestadores(_registros(prestadores, ["sigla", "nome"]))
+    return mapa, dimensoes.criados
+
+def preparar_dados(db, df: pd.DataFrame, arquivo_rejeitados: Optional[str] = None,
+                   transformados: Optional[pd.DataFrame] = None):
+    """
+    Transforma (se `transformados` não for passado) e valida o DataFrame,
+    resolve municípios e prestadores e remove chaves (ano, municipio,
+    prestador) repetidas no arquivo (vale a primeira). Retorna os dados
+    prontos, a quantidade de duplicatas descartadas, a de linhas rejeitadas na
+    validação e a de municípios/prestadores criados.
+    """
+    if transformados is None:
+        transformados = transformar_dataframe(df)
+    dados, rejeitados = separar_rejeitados(df, transformados, arquivo_rejeitados)
+
+    prestadores, dimensoes_criadas = resolver_dimensoes(db, dados)
+    dados["prestador_id"] = dados["sigla_prestador"].map(prestadores)
+
+    duplicados_arquivo = dados.duplicated(CHAVE)
+    return dados[~duplicados_arquivo], int(duplicados_arquivo.sum()), rejeitados, dimensoes_criadas
+
+def confirmar_carga(db, escritas: int) -> None:
+    """
+    Confirma a transação da carga. A versão do dataset (ETags e caches da API)
+    só é incrementada se alguma linha foi gravada.
+    """
+    if not escritas:
+        db.commit()
+        logger.info("Nenhuma alteração; versão do dataset mantida")
+        return
+    versao = bump_dataset_version(db)
+    db.commit()
+    logger.info(f"Versão do dataset atualizada para {versao}")
+
+def inserir_em_lotes(db, dados: pd.DataFrame, tamanho_lote: int, atualizar: bool, atualizar_filhos: Optional[bool] = None) -> int:
+    """
+    Um upsert por lote para indicadores e, com os IDs retornados, para recursos
+    hídricos e financeiro. Não faz commit. Retorna quantos indicadores foram
+    inseridos ou atualizados.
+    """
+    if atualizar_filhos is None:
+        atualizar_filhos = atualizar
+    colunas_indicadores = CHAVE + list(COLUNAS_INDICADORES) + ["hash_conteudo"]
+    afetados = 0
+    for inicio in range(0, len(dados), tamanho_lote):
+        lote = dados.iloc[inicio:inicio + tamanho_lote]
+        linhas = crud.upsert_indicadores_lote(
+            db, _registros(lote, colunas_indicadores), atualizar=atualizar, commit=False
+        )
+        if not linhas:
+            continue
+        ids = pd.DataFrame(linhas).rename(columns={"id": "indicador_id"})\
+            .astype({"ano": "Int64", "prestador_id": lote["prestador_id"].dtype})
+        filhos = lote.merge(ids, on=CHAVE)
+        crud.upsert_recursos_hidricos_lote(
+            db, _registros(filhos, ["indicador_id", *COLUNAS_RECURSOS]), atualizar=atualizar_filhos, commit=False
+        )
+        crud.upsert_financeiro_lote(
+            db, _registros(filhos, ["indicador_id", *COLUNAS_FINANCEIRO]), atualizar=atualizar_filhos, commit=False
+        )
+        afetados += len(linhas)
+        logger.info(f"Processados {min(inicio + tamanho_lote, len(dados))}/{len(dados)} registros")
+    return afetados
+
+def carregar_em_lote(db, df: pd.DataFrame, tamanho_lote: int = 1000, atualizar: bool = False,
+                     arquivo_rejeitados: Optional[str] = None) -> dict:
+    """
+    Carrega o DataFrame inteiro em uma única transação: transformação vetorizada,
+    dimensões resolvidas uma vez e um upsert (INSERT ... ON CONFLICT) por lote
+    para indicadores, recursos hídricos e financeiro. Sem `atualizar`, linhas
+    já existentes são mantidas; com `atualizar`, seus valores são sobrescritos.
+    """
+    dados, _, rejeitados, dimensoes_criadas = preparar_dados(db, df, arquivo_rejeitados)
+    anos = [int(ano) for ano in dados["ano"].unique()]
+
+    afetados = inserir_em_lotes(db, dados, tamanho_lote, atualizar)
+
+    # Rankings pré-calculados e versão do dataset na mesma transação da carga
+    if afetados:
+        for ano in sorted(anos):
+            crud._rebuild_ranking_snapshots(db, ano)
+    confirmar_carga(db, afetados + dimensoes_criadas)
+
+    return {
+        "criados": afetados,
+        "rejeitados": rejeitados,
+        "ignorados": len(df) - afetados - rejeitados
+    }
+
+def _inicializar_worker():
+    # Conexões herdadas do processo pai (fork) não podem ser compartilhadas
+    engine.dispose(close=False)
+
+def _carregar_particao(ano: int, dados_ano: pd.DataFrame, tamanho_lote: int, atualizar: bool) -> dict:
+    """Carrega um ano em um processo separado, com conexão e transação próprias"""
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = SessionLocal()
+    try:
+        afetados = inserir_em_lotes(db, dados_ano, tamanho_lote, atualizar)
+        crud._rebuild_ranking_snapshots(db, ano)
+        db.commit()
+        return {"ano": ano, "linhas": len(dados_ano), "afetados": afetados}
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def verificar_consistencia(db, dados: pd.DataFrame) -> list:
+    """
+    Confere em uma única consulta que toda chave do arquivo existe no banco e
+    tem seus registros de recursos hídricos e financeiro. Retorna os problemas.
+    """
+    anos = [int(ano) for ano in dados["ano"].unique()]
+    banco = pd.DataFrame(
+        db.query(
+            models.IndicadoresDesempenhoAnual.ano,
+            models.IndicadoresDesempenhoAnual.municipio_id,
+            models.IndicadoresDesempenhoAnual.prestador_id,
+            models.RecursosHidricosAnual.id.label("recursos_id"),
+            models.FinanceiroAnual.id.label("financeiro_id")
+        ).outerjoin(models.RecursosHidricosAnual)
+        .outerjoin(models.FinanceiroAnual)
+        .filter(models.IndicadoresDesempenhoAnual.ano.in_(anos)).all(),
+        columns=[*CHAVE, "recursos_id", "financeiro_id"]
+    ).astype({"ano": "Int64", "prestador_id": dados["prestador_id"].dtype})
+
+    comparacao = dados[CHAVE].merge(banco, on=CHAVE, how="left", indicator=True)
+    presentes = comparacao[comparacao["_merge"] == "both"]
+    problemas = []
+    faltando = int((comparacao["_merge"] == "left_only").sum())
+    if faltando:
+        problemas.append(f"{faltando} chaves do arquivo ausentes no banco")
+    sem_recursos = int(presentes["recursos_id"].isna().sum())
+    if sem_recursos:
+        problemas.append(f"{sem_recursos} indicadores sem recursos hídricos")
+    sem_financeiro = int(presentes["financeiro_id"].isna().sum())
+    if sem_financeiro:
+        problemas.append(f"{sem_financeiro} indicadores sem dados financeiros")
+    return problemas
+
+def carregar_em_paralelo(db, df: pd.DataFrame, workers: int, tamanho_lote: int = 1000, atualizar: bool = False,
+                         arquivo_rejeitados: Optional[str] = None) -> dict:
+    """
+    Modo em lote com um processo por partição de ano. As dimensões são
+    resolvidas (e confirmadas) uma única vez antes de distribuir as partições;
+    ao final, uma verificação de consistência cobre todos os anos.
+    """
+    dados, _, rejeitados, dimensoes_criadas = preparar_dados(db, df, arquivo_rejeitados)
+    db.commit()
+
+    # Partições maiores primeiro, para equilibrar a carga entre os processos
+    particoes = sorted(dados.groupby("ano"), key=lambda particao: -len(particao[1]))
+    logger.info(f"Distribuindo {len(particoes)} anos entre {workers} processos")
+
+    afetados = 0
+    falhas = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_inicializar_worker) as executor:
+        futuros = {
+            executor.submit(_carregar_particao, int(ano), grupo, tamanho_lote, atualizar): int(ano)
+            for ano, grupo in particoes
+        }
+        for futuro in as_completed(futuros):
+            ano = futuros[futuro]
+            try:
+                resultado = futuro.result()
+            except Exception as e:
+                falhas.append(ano)
+                logger.error(f"Falha ao carregar o ano {ano}: {e}")
+                continue
+            afetados += resultado["afetados"]
+            logger.info(f"Ano {ano} carregado: {resultado['afetados']}/{resultado['linhas']} registros")
+
+    # Os anos carregados já foram confirmados: a versão muda mesmo se houver falhas
+    confirmar_carga(db, afetados + dimensoes_criadas)
+
+    problemas = verificar_consistencia(db, dados)
+    if falhas or problemas:
+        detalhes = [f"anos com falha: {sorted(falhas)}"] if falhas else []
+        raise RuntimeError("Carga paralela inconsistente: " + "; ".join(detalhes + problemas))
+    logger.info("Verificação de consistência concluída sem problemas")
+
+    return {
+        "criados": afetados,
+        "rejeitados": rejeitados,
+        "ignorados": len(df) - afetados - rejeitados
+    }
+
+def carregar_incremental(db, df: pd.DataFrame, tamanho_lote: int = 1000, remover_ausentes: bool = False,
+                         arquivo_rejeitados: Optional[str] = None) -> dict:
+    """
+    Recarga incremental: compara o hash de conteúdo de cada linha do arquivo com
+    o gravado no banco. Chaves novas são inseridas, linhas com hash diferente
+    são atualizadas e as idênticas não são tocadas. Com `remover_ausentes`,
+    chaves dos anos presentes no arquivo que sumiram dele são removidas.
+    """
+    transformados = transformar_dataframe(df)
+    dados, duplicados_arquivo, rejeitados, dimensoes_criadas = preparar_dados(
+        db, df, arquivo_rejeitados, transformados
+    )
+    anos = [int(ano) for ano in dados["ano"].unique()]
+
+    existentes = pd.DataFrame(
+        db.query(
+            models.IndicadoresDesempenhoAnual.id,
+            models.IndicadoresDesempenhoAnual.ano,
+            models.IndicadoresDesempenhoAnual.municipio_id,
+            models.IndicadoresDesempenhoAnual.prestador_id,
+            models.IndicadoresDesempenhoAnual.hash_conteudo.label("hash_banco"),
+            models.PrestadorServico.sigla.label("sigla_banco")
+        ).join(models.PrestadorServico, models.IndicadoresDesempenhoAnual.prestador_id == models.PrestadorServico.id)
+        .filter(models.IndicadoresDesempenhoAnual.ano.in_(anos)).all(),
+        columns=["id", *CHAVE, "hash_banco", "sigla_banco"]
+    ).astype({"ano": "Int64", "prestador_id": dados["prestador_id"].dtype})
+
+    comparacao = dados.merge(existentes, on=CHAVE, how="outer", indicator=True)
+    novos = comparacao[comparacao["_merge"] == "left_only"]
+    em_ambos = comparacao[comparacao["_merge"] == "both"]
+    alterados = em_ambos[em_ambos["hash_conteudo"] != em_ambos["hash_banco"]]
+    # Ausente é a chave que não está em nenhuma linha do arquivo, inclusive as
+    # rejeitadas na validação: uma linha inválida não apaga o registro do banco
+    no_arquivo = pd.MultiIndex.from_frame(transformados[["ano", "municipio_id", "sigla_prestador"]])
+    fora_do_arquivo = comparacao[comparacao["_merge"] == "right_only"]
+    ausentes = fora_do_arquivo[
+        ~pd.MultiIndex.from_frame(fora_do_arquivo[["ano", "municipio_id", "sigla_banco"]]).isin(no_arquivo)
+    ]
+
+    # Linhas alteradas sobrescrevem também os registros filhos
+    inserir_em_lotes(db, novos.drop(columns=["id"]), tamanho_lote, atualizar=False, atualizar_filhos=True)
+    inserir_em_lotes(db, alterados.drop(columns=["id"]), tamanho_lote, atualizar=True)
+
+    removidos = 0
+    if remover_ausentes and not ausentes.empty:
+        ids_ausentes = [int(i) for i in ausentes["id"]]
+        for inicio in range(0, len(ids_ausentes), tamanho_lote):
+            lote_ids = ids_ausentes[inicio:inicio + tamanho_lote]
+            db.execute(delete(models.RecursosHidricosAnual).where(models.RecursosHidricosAnual.indicador_id.in_(lote_ids)))
+            db.execute(delete(models.FinanceiroAnual).where(models.FinanceiroAnual.indicador_id.in_(lote_ids)))
+            db.execute(delete(models.IndicadoresDesempenhoAnual).where(models.IndicadoresDesempenhoAnual.id.in_(lote_ids)))
+        removidos = len(ids_ausentes)
+
+    logger.info("Resumo da carga incremental:")
+    logger.info(f"  Novos: {len(novos)}")
+    logger.info(f"  Alterados: {len(alterados)}")
+    logger.info(f"  Inalterados: {len(em_ambos) - len(alterados)}")
+    logger.info(f"  Ausentes no arquivo: {len(ausentes)} ({removidos} removidos)")
+    logger.info(f"  Duplicados no arquivo: {duplicados_arquivo}")
+
+    anos_alterados = set(novos["ano"]) | set(alterados["ano"])
+    if removidos:
+        anos_alterados |= set(ausentes["ano"])
+    for ano in sorted(int(ano) for ano in anos_alterados):
+        crud._rebuild_ranking_snapshots(db, ano)
+    confirmar_carga(db, len(novos) + len(alterados) + removidos + dimensoes_criadas)
+
+    return {
+        "criados": len(novos),
+        "atualizados": len(alterados),
+        "removidos": removidos,
+        "rejeitados": rejeitados,
+        "ignorados": len(df) - len(novos) - len(alterados) - rejeitados
+    }
+
+def _tipo_staging(coluna: str) -> str:
+    return "bigint" if coluna in COLUNAS_INTEIRAS else "double precision"
+
+def _acao_conflito(colunas, atualizar: bool) -> str:
+    if not atualizar:
+        return "DO NOTHING"
+    return "DO UPDATE SET " + ", ".join(f"{coluna} = EXCLUDED.{coluna}" for coluna in colunas)
+
+def carregar_via_copy(db, df: pd.DataFrame, atualizar: bool = False, arquivo_rejeitados: Optional[str] = None) -> dict:
+    """
+    Carga para PostgreSQL: o DataFrame transformado é enviado com COPY FROM STDIN
+    para uma tabela de staging UNLOGGED e mesclado nas tabelas finais por uma
+    única cadeia de CTEs (INSERT ... SELECT ... ON CONFLICT DO NOTHING), em que
+    os IDs gerados para os indicadores alimentam recursos hídricos e financeiro.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        raise RuntimeError("O modo COPY requer PostgreSQL")
+
+    dados, rejeitados = separar_rejeitados(df, transformar_dataframe(df), arquivo_rejeitados)
+
+    prestadores, dimensoes_criadas = resolver_dimensoes(db, dados)
+    dados["prestador_id"] = dados["sigla_prestador"].map(prestadores)
+    # Ordem no arquivo, para manter a primeira ocorrência de chaves repetidas
+    dados["linha"] = np.arange(len(dados))
+
+    colunas_filhas = list(COLUNAS_RECURSOS) + list(COLUNAS_FINANCEIRO)
+    colunas = ["linha", "ano", "municipio_id", "prestador_id", "hash_conteudo", *COLUNAS_INDICADORES, *colunas_filhas]
+    staging = f"staging_carga_snis_{os.getpid()}"
+
+    definicoes = ",\n".join(
+        ["linha bigint", "ano integer", "municipio_id varchar(7)", "prestador_id integer", "hash_conteudo varchar(64)"]
+        + [f"{coluna} {_tipo_staging(coluna)}" for coluna in [*COLUNAS_INDICADORES, *colunas_filhas]]
+    )
+    db.execute(text(f"DROP TABLE IF EXISTS {staging}"))
+    db.execute(text(f"CREATE UNLOGGED TABLE {staging} (\n{definicoes}\n)"))
+
+    buffer = io.StringIO()
+    dados[colunas].to_csv(buffer, index=False, header=False, na_rep="")
+    buffer.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {staging} ({', '.join(colunas)}) FROM STDIN WITH (FORMAT csv, NULL '')",
+            buffer
+        )
+    finally:
+        cursor.close()
+    logger.info(f"{len(dados)} linhas copiadas para {staging}")
+
+    colunas_indicadores = ["ano", "municipio_id", "prestador_id", "hash_conteudo", *COLUNAS_INDICADORES]
+    resultado = db.execute(text(f"""
+        WITH fonte AS (
+            SELECT DISTINCT ON (ano, municipio_id, prestador_id) *
+            FROM {staging}
+            ORDER BY ano, municipio_id, prestador_id, linha
+        ),
+        novos AS (
+            INSERT INTO indicadores_desempenho_anuais ({', '.join(colunas_indicadores)})
+            SELECT {', '.join(colunas_indicadores)} FROM fonte
+            ON CONFLICT ON CONSTRAINT uq_ano_municipio_prestador {_acao_conflito([*COLUNAS_INDICADORES, "hash_conteudo"], atualizar)}
+            RETURNING id, ano, municipio_id, prestador_id
+        ),
+        recursos AS (
+            INSERT INTO recursos_hidricos_anuais (indicador_id, {', '.join(COLUNAS_RECURSOS)})
+            SELECT novos.id, {', '.join(f'fonte.{c}' for c in COLUNAS_RECURSOS)}
+            FROM novos JOIN fonte USING (ano, municipio_id, prestador_id)
+            ON CONFLICT (indicador_id) {_acao_conflito(COLUNAS_RECURSOS, atualizar)}
+            RETURNING indicador_id
+        ),
+        financeiro AS (
+            INSERT INTO financeiro_anuais (indicador_id, {', '.join(COLUNAS_FINANCEIRO)})
+            SELECT novos.id, {', '.join(f'fonte.{c}' for c in COLUNAS_FINANCEIRO)}
+            FROM novos JOIN fonte USING (ano, municipio_id, prestador_id)
+            ON CONFLICT (indicador_id) {_acao_conflito(COLUNAS_FINANCEIRO, atualizar)}
+            RETURNING indicador_id
+        )
+        SELECT
+            (SELECT count(*) FROM novos) AS indicadores,
+            (SELECT count(*) FROM recursos) AS recursos,
+            (SELECT count(*) FROM financeiro) AS financeiro,
+            (SELECT array_agg(DISTINCT ano) FROM fonte) AS anos
+    """)).one()
+    db.execute(text(f"DROP TABLE {staging}"))
+    logger.info(
+        f"Mesclados {resultado.indicadores} indicadores, {resultado.recursos} registros de "
+        f"recursos hídricos e {resultado.financeiro} registros financeiros"
+    )
+
+    if resultado.indicadores:
+        for ano in sorted(resultado.anos or []):
+            crud._rebuild_ranking_snapshots(db, ano)
+    confirmar_carga(db, resultado.indicadores + resultado.recursos + resultado.financeiro + dimensoes_criadas)
+
+    return {
+        "criados": resultado.indicadores,
+        "rejeitados": rejeitados,
+        "ignorados": len(dados) - resultado.indicadores
+    }
+
+def carregar_linha_a_linha(db, df: pd.DataFrame, arquivo_rejeitados: Optional[str] = None) -> dict:
+    """
+    Modo original: uma linha por vez, com commit a cada registro criado. Os
+    snapshots de ranking são reconstruídos uma única vez, ao final. Linhas
+    fora das faixas dos schemas são separadas antes, como nos demais modos.
+    """
+    validos, rejeitados = separar_rejeitados(df, transformar_dataframe(df), arquivo_rejeitados)
+    df = df.loc[validos.index]
+
+    dimensoes = ResolvedorDimensoes(db)
+    # Garantir que um prestador padrão exista para casos sem sigla
+    get_or_create_prestador(dimensoes, "NAO_INFORMADO", "Não Informado")
+
+    registros_criados = 0
+    registros_ignorados = 0
+    anos_criados = set()
+    
+    for index, row in df.iterrows():
+        municipio_id = get_or_create_municipio(dimensoes, row)
+        prestador_sigla = row.get('sigla_prestador', 'NAO_INFORMADO').strip()
+        prestador_nome = row.get('nome_prestador', 'Não Informado').strip()
+        prestador_id = get_or_create_prestador(dimensoes, prestador_sigla, prestador_nome)
+
+        ano = int(row['ano'])
+
+        # 1. Indicadores de Desempenho
+        indicador_schema = schemas.IndicadoresDesempenhoCreate(
+            ano=ano,
+            municipio_id=municipio_id,
+            prestador_id=prestador_id,
+            populacao_atendida_agua=safe_int(row.get('populacao_atendida_agua')),
+            populacao_atendida_esgoto=safe_int(row.get('populacao_atentida_esgoto')), # Note o typo do CSV
+            indice_atendimento_agua=safe_float(row.get('indice_atendimento_total_agua')),
+            indice_coleta_esgoto=safe_float(row.get('indice_coleta_esgoto')),
+            indice_tratamento_esgoto=safe_float(row.get('indice_tratamento_esgoto')),
+            indice_perda_faturamento=safe_float(row.get('indice_perda_faturamento'))
+        )
+        # Duplicatas (ano, municipio, prestador) são ignoradas pelo ON CONFLICT DO NOTHING
+        indicador_db = crud.upsert_indicadores(db, indicador_schema, atualizar=False, reconstruir_snapshots=False)
+        if indicador_db is None:
+            registros_ignorados += 1
+            continue
+
+        # 2. Recursos Hídricos
+        recursos_schema = schemas.RecursosHidricosCreate(
+            indicador_id=indicador_db.id,
+            volume_agua_produzido=safe_float(row.get('volume_agua_produzido')),
+            volume_agua_consumido=safe_float(row.get('volume_agua_consumido')),
+            volume_agua_faturado=safe_float(row.get('volume_agua_faturado')),
+            volume_esgoto_coletado=safe_float(row.get('volume_esgoto_coletado')),
+            volume_esgoto_tratado=safe_float(row.get('volume_esgoto_tratado')),
+            consumo_eletrico_sistemas_agua=safe_float(row.get('consumo_eletrico_sistemas_agua'))
+        )
+        crud.create_recursos_hidricos(db, recursos_schema)
+
+        # 3. Financeiro
+        financeiro_schema = schemas.FinanceiroCreate(
+            indicador_id=indicador_db.id,
+            receita_operacional_total=safe_float(row.get('receita_operacional_direta')),
+            despesa_exploracao=safe_float(row.get('despesa_exploracao')),
+            despesa_pessoal=safe_float(row.get('despesa_pessoal')),
+            despesa_energia=safe_float(row.get('despesa_energia')),
+            despesa_total_servicos=safe_float(row.get('despesa_total_servico')),
+            investimento_total_prestador=safe_float(row.get('investimento_total_prestador')),
+            credito_a_receber=safe_float(row.get('credito_areceber')) # Note o typo
+        )
+        crud.create_financeiro(db, financeiro_schema)
+        
+        registros_criados += 1
+        anos_criados.add(ano)
+        if (index + 1) % 100 == 0:
+            logger.info(f"Processado {index + 1}/{len(df)} registros. Criados: {registros_criados}, Ignorados: {registros_ignorados}")
+    
+    db.commit()
+
+    # Recalcular os rankings pré-calculados dos anos que receberam registros
+    if anos_criados:
+        for ano in sorted(anos_criados):
+            crud.rebuild_ranking_snapshots(db, ano)
+        logger.info("Snapshots de ranking atualizados")
+
+    # Sinalizar a carga para a API (ETags e caches de resposta)
+    confirmar_carga(db, registros_criados + dimensoes.criados)
+
+    return {"criados": registros_criados, "rejeitados": rejeitados, "ignorados": registros_ignorados}
 
 def main():
+    parser = argparse.ArgumentParser(description="Carrega os dados do SNIS no banco de dados")
+    parser.add_argument("--arquivo", default=caminho_padrao(),
+                        help="Dataset Parquet (particionado por ano) ou CSV com os dados limpos")
+    modo = parser.add_mutually_exclusive_group()
+    modo.add_argument("--lote", action="store_true",
+                      help="Modo em lote: transformação vetorizada e inserções em lote numa única transação")
+    modo.add_argument("--copy", action="store_true",
+                      help="Modo COPY (PostgreSQL): staging UNLOGGED e merge com INSERT ... ON CONFLICT")
+    modo.add_argument("--incremental", action="store_true",
+                      help="Recarga incremental: insere chaves novas e atualiza apenas linhas com hash de conteúdo diferente")
+    parser.add_argument("--remover-ausentes", action="store_true",
+                        help="No modo incremental, remove chaves dos anos do arquivo que não constam mais nele")
+    parser.add_argument("--limpar", action="store_true",
+                        help="Aplica o pipeline de limpeza (scripts/limpeza.py) antes da validação")
+    parser.add_argument("--rejeitados",
+                        help="CSV para as linhas rejeitadas na validação (padrão: <arquivo>_rejeitados.csv)")
+    parser.add_argument("--tamanho-lote", type=int, default=1000, help="Linhas por inserção no modo em lote")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processos paralelos no modo em lote, um ano por vez em cada processo")
+    parser.add_argument("--atualizar", action="store_true",
+                        help="Nos modos em lote e COPY, sobrescreve registros já existentes em vez de ignorá-los")
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers deve ser pelo menos 1")
+    if args.workers > 1 and (args.copy or args.incremental):
+        parser.error("--workers só é suportado no modo em lote")
+
     logger.info("Iniciando o script de carregamento de dados...")
     
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     db = SessionLocal()
 
-    csv_path = "data/dados_snis_ceara_limpos.csv"
-    if not os.path.exists(csv_path):
-        logger.error(f"Arquivo de dados não encontrado: {csv_path}. Execute 'scripts/extract_data.py' primeiro.")
+    caminho = args.arquivo
+    if not os.path.exists(caminho):
+        logger.error(f"Arquivo de dados não encontrado: {caminho}. Execute 'scripts/extract_data.py' primeiro.")
         return
 
-    logger.info(f"Lendo dados de {csv_path}")
-    df = pd.read_csv(csv_path, low_memory=False)
+    arquivo_rejeitados = args.rejeitados or str(Path(caminho).with_name(f"{Path(caminho).stem}_rejeitados.csv"))
+
+    logger.info(f"Lendo dados de {caminho}")
+    df = ler_dataset(caminho, colunas=COLUNAS_ENTRADA)
+    if args.limpar:
+        df, relatorio = limpar(df)
+        logger.info(
+            f"Limpeza: {sum(relatorio['negativos'].values())} negativos anulados, "
+            f"{sum(relatorio['outliers'].values())} valores winsorizados, "
+            f"{sum(relatorio['nulos_preenchidos'].values())} nulos preenchidos, "
+            f"{relatorio['linhas_removidas']} linhas removidas"
+        )
     
     logger.info(f"Total de {len(df)} registros a serem processados.")
 
     try:
-        # Garantir que um prestador padrão exista para casos sem sigla
-        prestador_padrao = get_or_create_prestador(db, "NAO_INFORMADO", "Não Informado")
+        inicio = time.perf_counter()
+        if args.incremental:
+            resultado = carregar_incremental(db, df, args.tamanho_lote, args.remover_ausentes, arquivo_rejeitados)
+        elif args.copy:
+            resultado = carregar_via_copy(db, df, args.atualizar, arquivo_rejeitados)
+        elif args.workers > 1:
+            resultado = carregar_em_paralelo(db, df, args.workers, args.tamanho_lote, args.atualizar, arquivo_rejeitados)
+        elif args.lote:
+            resultado = carregar_em_lote(db, df, args.tamanho_lote, args.atualizar, arquivo_rejeitados)
+        else:
+            resultado = carregar_linha_a_linha(db, df, arquivo_rejeitados)
+        duracao = time.perf_counter() - inicio
 
-        registros_criados = 0
-        registros_ignorados = 0
-        
-        for index, row in df.iterrows():
-            municipio = get_or_create_municipio(db, row)
-            prestador_sigla = row.get('sigla_prestador', 'NAO_INFORMADO').strip()
-            prestador_nome = row.get('nome_prestador', 'Não Informado').strip()
-            prestador = get_or_create_prestador(db, prestador_sigla, prestador_nome)
-
-            ano = int(row['ano'])
-
-            # Evitar duplicatas (ano, municipio, prestador)
-            if db.query(models.IndicadoresDesempenhoAnual).filter_by(
-                ano=ano, municipio_id=municipio.id_municipio, prestador_id=prestador.id
-            ).first():
-                registros_ignorados += 1
-                continue
-            
-            # 1. Indicadores de Desempenho
-            indicador_schema = schemas.IndicadoresDesempenhoCreate(
-                ano=ano,
-                municipio_id=municipio.id_municipio,
-                prestador_id=prestador.id,
-                populacao_atendida_agua=safe_int(row.get('populacao_atendida_agua')),
-                populacao_atendida_esgoto=safe_int(row.get('populacao_atentida_esgoto')), # Note o typo do CSV
-                indice_atendimento_agua=safe_float(row.get('indice_atendimento_total_agua')),
-                indice_coleta_esgoto=safe_float(row.get('indice_coleta_esgoto')),
-                indice_tratamento_esgoto=safe_float(row.get('indice_tratamento_esgoto')),
-                indice_perda_faturamento=safe_float(row.get('indice_perda_faturamento'))
-            )
-            indicador_db = crud.create_indicadores(db, indicador_schema)
-
-            # 2. Recursos Hídricos
-            recursos_schema = schemas.RecursosHidricosCreate(
-                indicador_id=indicador_db.id,
-                volume_agua_produzido=safe_float(row.get('volume_agua_produzido')),
-                volume_agua_consumido=safe_float(row.get('volume_agua_consumido')),
-                volume_agua_faturado=safe_float(row.get('volume_agua_faturado')),
-                volume_esgoto_coletado=safe_float(row.get('volume_esgoto_coletado')),
-                volume_esgoto_tratado=safe_float(row.get('volume_esgoto_tratado')),
-                consumo_eletrico_sistemas_agua=safe_float(row.get('consumo_eletrico_sistemas_agua'))
-            )
-            crud.create_recursos_hidricos(db, recursos_schema)
-
-            # 3. Financeiro
-            financeiro_schema = schemas.FinanceiroCreate(
-                indicador_id=indicador_db.id,
-                receita_operacional_total=safe_float(row.get('receita_operacional_direta')),
-                despesa_exploracao=safe_float(row.get('despesa_exploracao')),
-                despesa_pessoal=safe_float(row.get('despesa_pessoal')),
-                despesa_energia=safe_float(row.get('despesa_energia')),
-                despesa_total_servicos=safe_float(row.get('despesa_total_servico')),
-                investimento_total_prestador=safe_float(row.get('investimento_total_prestador')),
-                credito_a_receber=safe_float(row.get('credito_areceber')) # Note o typo
-            )
-            crud.create_financeiro(db, financeiro_schema)
-            
-            registros_criados += 1
-            if (index + 1) % 100 == 0:
-                logger.info(f"Processado {index + 1}/{len(df)} registros. Criados: {registros_criados}, Ignorados: {registros_ignorados}")
-        
-        db.commit()
         logger.info("Carregamento de dados concluído com sucesso!")
-        logger.info(f"Total de registros criados: {registros_criados}")
-        logger.info(f"Total de registros ignorados (duplicados): {registros_ignorados}")
+        logger.info(f"Total de registros criados: {resultado['criados']}")
+        if "atualizados" in resultado:
+            logger.info(f"Total de registros atualizados: {resultado['atualizados']}")
+            logger.info(f"Total de registros removidos: {resultado['removidos']}")
+        if "rejeitados" in resultado:
+            logger.info(f"Total de registros rejeitados na validação: {resultado['rejeitados']}")
+        logger.info(f"Total de registros ignorados (duplicados): {resultado['ignorados']}")
+        logger.info(f"{len(df)} registros processados em {duracao:.2f}s ({len(df) / duracao:.1f} registros/s)")
 
     except Exception as e:
         logger.error(f"Ocorreu um erro durante o carregamento: {e}", exc_info=True)
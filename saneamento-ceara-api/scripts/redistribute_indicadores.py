@@ -13,7 +13,9 @@ import logging
 sys.path.append(str(Path(__file__).parent.parent))
 
 from app.database import engine
+from app.versioning import bump_dataset_version_if_changed
 from app import models, crud, schemas
+from dimensoes import ResolvedorDimensoes
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -46,13 +48,12 @@ def redistribute_indicadores():
         logger.info(f"Encontrados {len(indicadores)} indicadores para redistribuir")
         
         updated_count = 0
+        dimensoes = ResolvedorDimensoes(db)
         
         for indicador in indicadores:
             try:
                 # Buscar o município associado
-                municipio = db.query(models.Municipio).filter(
-                    models.Municipio.id_municipio == indicador.municipio_id
-                ).first()
+                municipio = dimensoes.municipio(indicador.municipio_id)
                 
                 if not municipio:
                     logger.warning(f"Município {indicador.municipio_id} não encontrado")
@@ -74,6 +75,7 @@ def redistribute_indicadores():
                 logger.error(f"Erro ao processar indicador {indicador.id}: {e}")
                 continue
         
+        bump_dataset_version_if_changed(db)
         db.commit()
         logger.info(f"Redistribuição concluída! {updated_count} indicadores atualizados")
         
@@ -16,7 +16,9 @@ import logging
 sys.path.append(str(Path(__file__).parent.parent))
 
 from app.database import engine
+from app.versioning import bump_dataset_version_if_changed
 from app import models, crud, schemas
+from dimensoes import ResolvedorDimensoes
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -219,11 +221,12 @@ def update_municipios():
     
     try:
         municipios_atualizados = 0
-        municipios_criados = 0
+        municipios_novos = []
+        dimensoes = ResolvedorDimensoes(db)
         
         for codigo_ibge, dados in MUNICIPIOS_CEARA.items():
             # Verificar se o município já existe
-            municipio = crud.get_municipio(db, codigo_ibge)
+            municipio = dimensoes.municipio(codigo_ibge)
             
             if municipio:
                 # Atualizar município existente
@@ -247,10 +250,12 @@ def update_municipios():
                     quantidade_sedes_esgoto=1,
                     nome_prestador_predominante="CAGECE"
                 )
-                crud.create_municipio(db, municipio_schema)
-                municipios_criados += 1
+                municipios_novos.append(municipio_schema.dict())
                 logger.info(f"Criado: {dados['nome']} ({codigo_ibge})")
         
+        # Municípios novos em uma única inserção
+        municipios_criados = dimensoes.garantir_municipios(municipios_novos)
+        bump_dataset_version_if_changed(db, municipios_criados)
         db.commit()
         logger.info(f"Atualização concluída! Municípios atualizados: {municipios_atualizados}, criados: {municipios_criados}")
         